@@ -0,0 +1,81 @@
+"""
+Measures the throughput of the compressions available to ``IterableResult.to_file``, in MB/s of uncompressed json
+lines, and the size of the compressed output.
+
+Usage:
+    python benchmarks/compression.py [--input dump.json] [--records 200000] [--threads 1 4 8]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from opentargets.export import open_output, zstandard_available
+
+
+def synthetic_lines(n, seed=0):
+    """
+    Json lines shaped as associations returned by the REST API
+    """
+    rnd = random.Random(seed)
+    lines = []
+    for i in range(n):
+        record = {'id': 'ENSG{:011d}-EFO_{:07d}'.format(rnd.randint(0, 60000), rnd.randint(0, 20000)),
+                  'is_direct': rnd.random() > .5,
+                  'target': {'id': 'ENSG{:011d}'.format(i), 'gene_info': {'symbol': 'GENE{}'.format(i % 5000)}},
+                  'disease': {'id': 'EFO_{:07d}'.format(i % 20000),
+                              'efo_info': {'label': 'disease {}'.format(i % 20000),
+                                           'therapeutic_area': {'labels': ['neoplasm', 'genetic disorder']}}},
+                  'association_score': {'overall': rnd.random(),
+                                        'datatypes': {'genetic_association': rnd.random(),
+                                                      'literature': rnd.random(),
+                                                      'known_drug': 0}},
+                  'evidence_count': {'total': rnd.randint(1, 3000)}}
+        lines.append(json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n')
+    return lines
+
+
+def run(lines, compress, level, threads, directory):
+    path = os.path.join(directory, 'output')
+    size = sum(len(i) for i in lines)
+    start = time.time()
+    fh = open_output(path, compress=compress, level=level, threads=threads)
+    for line in lines:
+        fh.write(line)
+    fh.close()
+    elapsed = time.time() - start
+    return size / elapsed / 1e6, os.path.getsize(path) / float(size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', help='uncompressed json lines file, E.g. written by to_file(compress=False)')
+    parser.add_argument('--records', type=int, default=200000, help='number of synthetic records')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+    if args.input:
+        with open(args.input, 'rb') as fh:
+            lines = fh.readlines()
+    else:
+        lines = synthetic_lines(args.records)
+    print('{:.1f} MB of json lines'.format(sum(len(i) for i in lines) / 1e6))
+    cases = [(False, None)] + [('gzip', level) for level in (1, 6, 9)]
+    if zstandard_available:
+        cases += [('zstd', level) for level in (1, 3, 9)]
+    directory = tempfile.mkdtemp()
+    try:
+        print('{:<6} {:>5} {:>7} {:>8} {:>6}'.format('codec', 'level', 'threads', 'MB/s', 'ratio'))
+        for compress, level in cases:
+            for threads in sorted(set(args.threads)) if compress else [1]:
+                speed, ratio = run(lines, compress, level, threads, directory)
+                print('{:<6} {:>5} {:>7} {:>8.1f} {:>6.3f}'.format(compress or 'none', level or '-', threads,
+                                                                  speed, ratio))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
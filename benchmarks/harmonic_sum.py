@@ -0,0 +1,71 @@
+"""
+Measures the time to add scores to a ``HarmonicSumScorer`` and compute its harmonic sum, for buffer sizes from 10 to
+10000, against a pool kept in a plain list as in versions up to 3.1.14.
+
+Usage:
+    python benchmarks/harmonic_sum.py [--scores 100000] [--buffers 10 100 1000 10000]
+"""
+import argparse
+import random
+import time
+
+from opentargets.statistics import HarmonicSumScorer
+
+
+class ListScorer(HarmonicSumScorer):
+    """
+    Pool of values kept in a list, scanned for its minimum after each change
+    """
+
+    def __init__(self, buffer=100):
+        self.buffer = buffer
+        self.data = []
+        self.minimum = 0.
+
+    def add(self, score):
+        score = float(score)
+        if len(self.data) >= self.buffer:
+            if score > self.minimum:
+                self.data[self.data.index(self.minimum)] = score
+                self.minimum = min(self.data)
+        else:
+            self.data.append(score)
+            self.minimum = min(self.data)
+
+    def score(self, *args, **kwargs):
+        return self.harmonic_sum(self.data, *args, **kwargs)
+
+
+def run(scorer_class, buffer, scores, score_every):
+    scorer = scorer_class(buffer=buffer)
+    start = time.time()
+    for i, score in enumerate(scores):
+        scorer.add(score)
+        if score_every and i % score_every == 0:
+            scorer.score()
+    result = scorer.score()
+    return time.time() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scores', type=int, default=100000, help='number of scores added')
+    parser.add_argument('--buffers', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--score-every', type=int, default=1000, help='compute the score every n additions')
+    args = parser.parse_args()
+    rnd = random.Random(0)
+    # increasing scores are the worst case, each one enters the pool
+    cases = [('random', [rnd.random() for _ in range(args.scores)]),
+             ('increasing', [i / float(args.scores) for i in range(args.scores)])]
+    print('{:<11} {:>7} {:>10} {:>10} {:>8}'.format('scores', 'buffer', 'list s', 'heap s', 'speedup'))
+    for name, scores in cases:
+        for buffer in args.buffers:
+            list_time, list_result = run(ListScorer, buffer, scores, args.score_every)
+            heap_time, heap_result = run(HarmonicSumScorer, buffer, scores, args.score_every)
+            assert abs(list_result - heap_result) < 1e-9
+            print('{:<11} {:>7} {:>10.3f} {:>10.3f} {:>7.1f}x'.format(name, buffer, list_time, heap_time,
+                                                                     list_time / heap_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,16 @@
 """
 This module communicate with the Open Targets REST API with a simple client, and requires not knowledge of the API.
 """
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from opentargets.cache import ResolutionCache
 from opentargets.conn import Connection, IterableResult
+from opentargets.partition import Partition, PartitionedResult, make_partitions
 
 import logging
 logging.getLogger('opentargets').addHandler(logging.NullHandler())
@@ -28,17 +37,29 @@ class OpenTargetsClient(object):
     _metrics_endpoint = '/platform/public/utils/metrics'
     _relation_target_endpoint = '/platform/private/relation/target'
     _relation_disease_endpoint = '/platform/private/relation/disease'
+    _disease_id_pattern = re.compile(r'^[A-Za-z]+_[0-9]+$')
 
     def __init__(self,
+                 resolution_cache=True,
+                 conn=None,
                  **kwargs
                  ):
         """
         Init the client and start a connection
 
+        Args:
+            resolution_cache: if True, identifiers resolved from target and disease names are stored in a
+                ``opentargets.cache.ResolutionCache`` in the connection cache directory and reused by other clients.
+                Accepts a ``ResolutionCache`` instance to customise it, False to disable it
+            conn: connection used instead of creating an ``opentargets.conn.Connection``,
+                E.g. an ``opentargets.offline.OfflineConnection``
         Keyword Args:
             **kwargs: all params forwarded to ``opentargets.conn.Connection`` object
         """
-        self.conn = Connection(**kwargs)
+        self.conn = conn if conn is not None else Connection(**kwargs)
+        self._resolved_ids = {}
+        self._resolution_cache = resolution_cache
+        self._resolution_cache_lock = threading.Lock()
 
     def __enter__(self):
         pass
@@ -48,6 +69,134 @@ class OpenTargetsClient(object):
 
     def close(self):
         self.conn.close()
+        if isinstance(self._resolution_cache, ResolutionCache):
+            self._resolution_cache.close()
+
+    def _get_resolution_cache(self):
+        """
+        Open the persistent resolution cache on first use, as it is keyed by the version of the remote REST API
+
+        Returns:
+            ResolutionCache: the cache or None if disabled
+        """
+        with self._resolution_cache_lock:
+            if self._resolution_cache is True:
+                path = os.path.join(self.conn.cache_dir, 'resolution.sqlite')
+                try:
+                    self._resolution_cache = ResolutionCache(path, self.conn.get_remote_version())
+                except (OSError, sqlite3.Error) as e:
+                    logger.warning('cannot open resolution cache at {}: {}'.format(path, e))
+                    self._resolution_cache = None
+        if isinstance(self._resolution_cache, ResolutionCache):
+            return self._resolution_cache
+        return None
+
+    def _resolve_target(self, target):
+        """
+        Return an Ensembl Gene identifier for the target, firing a search if needed.
+        Resolved identifiers are remembered for the lifetime of the client
+
+        Args:
+            target (str): an Ensembl Gene identifier or a string to search for a gene mapping
+        Returns:
+            str: an Ensembl Gene identifier
+        Raises:
+            AttributeError: if target is not a string or no gene is found
+        """
+        if not isinstance(target, str):
+            raise AttributeError('target must be of type str')
+        if target.startswith('ENSG'):
+            return target
+        return self._resolve(target, 'target', 'cannot find an ensembl gene id for target {}')
+
+    def _resolve_disease(self, disease):
+        """
+        Return a disease identifier for a disease label, firing a search if needed.
+        Resolved identifiers are remembered for the lifetime of the client
+
+        Args:
+            disease (str): a string to search for a disease mapping
+        Returns:
+            str: a disease identifier
+        Raises:
+            AttributeError: if disease is not a string or no disease is found
+        """
+        if not isinstance(disease, str):
+            raise AttributeError('disease must be of type str')
+        return self._resolve(disease, 'disease', 'cannot find an disease id for disease {}')
+
+    def _resolve(self, name, entity_type, error_message):
+        key = (entity_type, name)
+        if key not in self._resolved_ids:
+            cache = self._get_resolution_cache()
+            resolved_id = cache.get(entity_type, name) if cache is not None else None
+            if resolved_id is None:
+                search_result = next(self.search(name, size=1, filter=entity_type), None)
+                if not search_result:
+                    raise AttributeError(error_message.format(name))
+                resolved_id = search_result['id']
+                logger.debug('{} resolved to id {}'.format(name, resolved_id))
+                if cache is not None:
+                    cache.set(entity_type, name, resolved_id)
+            self._resolved_ids[key] = resolved_id
+        return self._resolved_ids[key]
+
+    def _resolve_many(self, names, resolver, workers, skip_missing):
+        """
+        Resolve a list of names concurrently, returning a dictionary of name to identifier
+        """
+        names = list(OrderedDict.fromkeys(names))
+        resolved = OrderedDict()
+
+        def resolve(name):
+            try:
+                return resolver(name)
+            except AttributeError:
+                if not skip_missing:
+                    raise
+                logger.warning('{} could not be resolved and is skipped'.format(name))
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for name, resolved_id in zip(names, executor.map(resolve, names)):
+                if resolved_id is not None:
+                    resolved[name] = resolved_id
+        return resolved
+
+    def resolve_targets(self, targets, workers=8, skip_missing=False):
+        """
+        Resolve a list of targets to Ensembl Gene identifiers, firing concurrent searches for the ones that are not
+        already an Ensembl Gene identifier
+
+        Args:
+            targets (list): Ensembl Gene identifiers or strings to search for a gene mapping
+            workers (int): number of searches running at the same time
+            skip_missing (bool): if True targets that cannot be resolved are logged and skipped instead of raising
+        Returns:
+            OrderedDict: target to Ensembl Gene identifier
+        Raises:
+            AttributeError: if a target cannot be resolved and skip_missing is False
+        """
+        return self._resolve_many(targets, self._resolve_target, workers, skip_missing)
+
+    def resolve_diseases(self, diseases, workers=8, skip_missing=False):
+        """
+        Resolve a list of diseases to disease identifiers, firing concurrent searches for the ones that do not look
+        like a disease identifier (E.g. EFO_0000311, Orphanet_558)
+
+        Args:
+            diseases (list): disease identifiers or strings to search for a disease mapping
+            workers (int): number of searches running at the same time
+            skip_missing (bool): if True diseases that cannot be resolved are logged and skipped instead of raising
+        Returns:
+            OrderedDict: disease to disease identifier
+        Raises:
+            AttributeError: if a disease cannot be resolved and skip_missing is False
+        """
+        def resolve_disease(disease):
+            if isinstance(disease, str) and self._disease_id_pattern.match(disease):
+                return disease
+            return self._resolve_disease(disease)
+        return self._resolve_many(diseases, resolve_disease, workers, skip_missing)
 
     def search(self, query,**kwargs):
         """
@@ -84,16 +233,25 @@ class OpenTargetsClient(object):
         result(self._get_associations_endpoint, **kwargs)
         return result
 
-    def filter_associations(self,**kwargs):
+    def filter_associations(self, partition_by=None, partition_values=None, workers=4, **kwargs):
         """
         Retrieve a set of associations by applying a set of filters
 
+        Args:
+            partition_by (str): if set, split the query in partitions on this filter
+                (E.g. 'datatype', 'datasource', 'target', 'therapeutic_area') and fetch them in parallel.
+                See ``OpenTargetsClient.partition``
+            partition_values (list): values of the filter to partition on
+            workers (int): number of partitions fetched at the same time
         Keyword Args:
             **kwargs: are passed as parameters to the /public/association/filterby method of the REST API
 
         Returns:
             IterableResult: Result of the query
         """
+        if partition_by is not None:
+            partitions = self.partition(self._filter_associations_endpoint, partition_by, partition_values, **kwargs)
+            return self.fetch_partitions(partitions, workers=workers)
         result = IterableResult(self.conn)
         result(self._filter_associations_endpoint, **kwargs)
         return result
@@ -110,16 +268,7 @@ class OpenTargetsClient(object):
         Returns:
             IterableResult: Result of the query
         """
-        if not isinstance(target, str):
-            raise AttributeError('target must be of type str')
-        if not target.startswith('ENSG'):
-            search_result = next(self.search(target, size=1, filter='target'))
-            if not search_result:
-                raise AttributeError('cannot find an ensembl gene id for target {}'.format(target))
-            target_id = search_result['id']
-            logger.debug('{} resolved to id {}'.format(target, target_id))
-        else:
-            target_id = target
+        target_id = self._resolve_target(target)
         return self.filter_associations(target=target_id,**kwargs)
 
     def get_associations_for_disease(self, disease, **kwargs):
@@ -138,11 +287,7 @@ class OpenTargetsClient(object):
             raise AttributeError('disease must be of type str')
         results = self.filter_associations(disease=disease)
         if not results:
-            search_result = next(self.search(disease, size=1, filter='disease'))
-            if not search_result:
-                raise AttributeError('cannot find an disease id for disease {}'.format(disease))
-            disease_id = search_result['id']
-            logger.debug('{} resolved to id {}'.format(disease, disease_id))
+            disease_id = self._resolve_disease(disease)
             results = self.filter_associations(disease=disease_id, **kwargs)
         return results
 
@@ -195,16 +340,25 @@ class OpenTargetsClient(object):
         result(self._get_disease + '/' + disease_id, **kwargs)
         return result
 
-    def filter_evidence(self,**kwargs):
+    def filter_evidence(self, partition_by=None, partition_values=None, workers=4, **kwargs):
         """
         Retrieve a set of evidence by applying a set of filters
 
+        Args:
+            partition_by (str): if set, split the query in partitions on this filter
+                (E.g. 'datatype', 'datasource', 'target') and fetch them in parallel.
+                See ``OpenTargetsClient.partition``
+            partition_values (list): values of the filter to partition on
+            workers (int): number of partitions fetched at the same time
         Keyword Args:
             **kwargs: are passed as parameters to the /public/evidence/filterby method of the REST API
 
         Returns:
             IterableResult: Result of the query
         """
+        if partition_by is not None:
+            partitions = self.partition(self._filter_evidence_endpoint, partition_by, partition_values, **kwargs)
+            return self.fetch_partitions(partitions, workers=workers)
         result = IterableResult(self.conn)
         result(self._filter_evidence_endpoint, **kwargs)
         return result
@@ -221,16 +375,7 @@ class OpenTargetsClient(object):
         Returns:
             IterableResult: Result of the query
         """
-        if not isinstance(target, str):
-            raise AttributeError('target must be of type str')
-        if not target.startswith('ENSG'):
-            search_result = next(self.search(target, size=1, filter='target'))
-            if not search_result:
-                raise AttributeError('cannot find an ensembl gene id for target {}'.format(target))
-            target_id = search_result['id']
-            logger.debug('{} resolved to id {}'.format(target, target_id))
-        else:
-            target_id = target
+        target_id = self._resolve_target(target)
         return self.filter_evidence(target=target_id,**kwargs)
 
     def get_evidence_for_disease(self, disease, **kwargs):
@@ -249,11 +394,7 @@ class OpenTargetsClient(object):
             raise AttributeError('disease must be of type str')
         results = self.filter_evidence(disease=disease, **kwargs)
         if not results:
-            search_result = next(self.search(disease, size=1, filter='disease'))
-            if not search_result:
-                raise AttributeError('cannot find an disease id for disease {}'.format(disease))
-            disease_id = search_result['id']
-            logger.debug('{} resolved to id {}'.format(disease, disease_id))
+            disease_id = self._resolve_disease(disease)
             results = self.filter_evidence(disease=disease_id)
         return results
 
@@ -269,17 +410,7 @@ class OpenTargetsClient(object):
         Returns:
             IterableResult: Result of the query
         """
-        if not isinstance(target, str):
-            raise AttributeError('target must be of type str')
-        if not target.startswith('ENSG'):
-            search_result = next(self.search(target, size=1, filter='target'))
-            if not search_result:
-                raise AttributeError('cannot find an ensembl gene id for target {}'.format(target))
-            target_id = search_result['id']
-            logger.debug('{} resolved to id {}'.format(target, target_id))
-        else:
-            target_id = target
-
+        target_id = self._resolve_target(target)
         result = IterableResult(self.conn)
         result(self._relation_target_endpoint+'/'+target_id, **kwargs)
         return result
@@ -301,15 +432,128 @@ class OpenTargetsClient(object):
         result = IterableResult(self.conn)
         result(self._relation_disease_endpoint+'/'+disease, **kwargs)
         if not result:
-            search_result = next(self.search(disease, size=1, filter='disease'))
-            if not search_result:
-                raise AttributeError('cannot find an disease id for disease {}'.format(disease))
-            disease_id = search_result['id']
-            logger.debug('{} resolved to id {}'.format(disease, disease_id))
+            disease_id = self._resolve_disease(disease)
             result = IterableResult(self.conn)
             result(self._relation_disease_endpoint + '/' + disease_id, **kwargs)
         return result
 
+    def get_associations_for_targets(self, targets, workers=4, chunk_size=100, skip_missing=False, **kwargs):
+        """
+        Same as ``OpenTargetsClient.get_associations_for_target`` for a list of targets. Targets are resolved
+        concurrently and associations are fetched with one query per chunk of identifiers
+
+        Args:
+            targets (list): Ensembl Gene identifiers or strings to search for a gene mapping
+            workers (int): number of searches and chunks fetched at the same time
+            chunk_size (int): number of targets filtered in each query
+            skip_missing (bool): if True targets that cannot be resolved are skipped instead of raising
+        Keyword Args:
+            **kwargs: are passed as parameters to the /public/association/filterby method of the REST API
+        Returns:
+            PartitionedResult: Result of the query
+        """
+        target_ids = self.resolve_targets(targets, workers=workers, skip_missing=skip_missing)
+        return self._filter_by_ids(self._filter_associations_endpoint, 'target', target_ids, workers, chunk_size,
+                                   **kwargs)
+
+    def get_evidence_for_targets(self, targets, workers=4, chunk_size=100, skip_missing=False, **kwargs):
+        """
+        Same as ``OpenTargetsClient.get_evidence_for_target`` for a list of targets. Targets are resolved
+        concurrently and evidence is fetched with one query per chunk of identifiers
+
+        Args:
+            targets (list): Ensembl Gene identifiers or strings to search for a gene mapping
+            workers (int): number of searches and chunks fetched at the same time
+            chunk_size (int): number of targets filtered in each query
+            skip_missing (bool): if True targets that cannot be resolved are skipped instead of raising
+        Keyword Args:
+            **kwargs: are passed as parameters to the /public/evidence/filterby method of the REST API
+        Returns:
+            PartitionedResult: Result of the query
+        """
+        target_ids = self.resolve_targets(targets, workers=workers, skip_missing=skip_missing)
+        return self._filter_by_ids(self._filter_evidence_endpoint, 'target', target_ids, workers, chunk_size,
+                                   **kwargs)
+
+    def get_associations_for_diseases(self, diseases, workers=4, chunk_size=100, skip_missing=False, **kwargs):
+        """
+        Same as ``OpenTargetsClient.get_associations_for_disease`` for a list of diseases. Diseases are resolved
+        concurrently and associations are fetched with one query per chunk of identifiers
+
+        Args:
+            diseases (list): disease identifiers or strings to search for a disease mapping
+            workers (int): number of searches and chunks fetched at the same time
+            chunk_size (int): number of diseases filtered in each query
+            skip_missing (bool): if True diseases that cannot be resolved are skipped instead of raising
+        Keyword Args:
+            **kwargs: are passed as parameters to the /public/association/filterby method of the REST API
+        Returns:
+            PartitionedResult: Result of the query
+        """
+        disease_ids = self.resolve_diseases(diseases, workers=workers, skip_missing=skip_missing)
+        return self._filter_by_ids(self._filter_associations_endpoint, 'disease', disease_ids, workers, chunk_size,
+                                   **kwargs)
+
+    def get_evidence_for_diseases(self, diseases, workers=4, chunk_size=100, skip_missing=False, **kwargs):
+        """
+        Same as ``OpenTargetsClient.get_evidence_for_disease`` for a list of diseases. Diseases are resolved
+        concurrently and evidence is fetched with one query per chunk of identifiers
+
+        Args:
+            diseases (list): disease identifiers or strings to search for a disease mapping
+            workers (int): number of searches and chunks fetched at the same time
+            chunk_size (int): number of diseases filtered in each query
+            skip_missing (bool): if True diseases that cannot be resolved are skipped instead of raising
+        Keyword Args:
+            **kwargs: are passed as parameters to the /public/evidence/filterby method of the REST API
+        Returns:
+            PartitionedResult: Result of the query
+        """
+        disease_ids = self.resolve_diseases(diseases, workers=workers, skip_missing=skip_missing)
+        return self._filter_by_ids(self._filter_evidence_endpoint, 'disease', disease_ids, workers, chunk_size,
+                                   **kwargs)
+
+    def _filter_by_ids(self, endpoint, key, resolved_ids, workers, chunk_size, **kwargs):
+        ids = list(OrderedDict.fromkeys(resolved_ids.values()))
+        partitions = self.partition(endpoint, key, ids, chunk_size=chunk_size, **kwargs)
+        return self.fetch_partitions(partitions, workers=workers)
+
+    def partition(self, endpoint, key, values=None, chunk_size=None, **kwargs):
+        """
+        Split a query in independent partitions on a filter key. Partitions can be serialised with
+        ``Partition.to_json`` and fetched on other machines with ``OpenTargetsClient.fetch_partitions``
+
+        Args:
+            endpoint (str): REST API endpoint to call. E.g. ``OpenTargetsClient._filter_evidence_endpoint``
+            key (str): filter to partition the query on. E.g. 'datasource', 'datatype', 'target', 'therapeutic_area'
+            values (list): values of the filter, one partition is created for each of them. If None the values passed
+                for the filter in kwargs are used, or all the datatypes if partitioning on 'datatype'
+            chunk_size (int): if set, each partition filters on a list of up to chunk_size values. Defaults to 100
+                when partitioning on 'target'
+        Keyword Args:
+            **kwargs: other parameters of the query, shared by all the partitions
+        Returns:
+            list: a list of ``opentargets.partition.Partition``
+        """
+        if chunk_size is None and key == 'target':
+            chunk_size = 100
+        return make_partitions(endpoint, key, values=values, chunk_size=chunk_size, **kwargs)
+
+    def fetch_partitions(self, partitions, workers=4, unique=False):
+        """
+        Fetch a set of partitions in parallel and merge them in a single stream of results
+
+        Args:
+            partitions (list): a list of ``opentargets.partition.Partition``
+            workers (int): number of partitions fetched at the same time
+            unique (bool): if True skip results with an id already returned by another partition
+        Returns:
+            PartitionedResult: Result of the query
+        """
+        result = PartitionedResult(self.conn, partitions, workers=workers, unique=unique)
+        result()
+        return result
+
     def get_stats(self, **kwargs):
         """
         Returns statistics about the data served by the REST API
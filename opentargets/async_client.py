@@ -0,0 +1,313 @@
+"""
+Asyncio version of the ``opentargets.OpenTargetsClient``. All the methods are coroutines returning an
+``AsyncIterableResult``, so that thousands of queries can be kept in flight on a single event loop::
+
+    async with AsyncOpenTargetsClient() as ot:
+        results = await ot.get_associations_for_target('BRAF')
+        async for a in results:
+            print(a['id'])
+
+Requires aiohttp and Python 3.5 or higher.
+"""
+import logging
+
+from opentargets import OpenTargetsClient
+from opentargets.async_conn import AsyncConnection, AsyncIterableResult
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+class AsyncOpenTargetsClient(object):
+    """
+    Asyncio client for the Open Targets REST API, exposing the same methods as ``OpenTargetsClient``
+    """
+
+    _search_endpoint = OpenTargetsClient._search_endpoint
+    _filter_associations_endpoint = OpenTargetsClient._filter_associations_endpoint
+    _get_associations_endpoint = OpenTargetsClient._get_associations_endpoint
+    _filter_evidence_endpoint = OpenTargetsClient._filter_evidence_endpoint
+    _get_evidence_endpoint = OpenTargetsClient._get_evidence_endpoint
+    _get_disease = OpenTargetsClient._get_disease
+    _get_target = OpenTargetsClient._get_target
+    _stats_endpoint = OpenTargetsClient._stats_endpoint
+    _metrics_endpoint = OpenTargetsClient._metrics_endpoint
+    _relation_target_endpoint = OpenTargetsClient._relation_target_endpoint
+    _relation_disease_endpoint = OpenTargetsClient._relation_disease_endpoint
+
+    def __init__(self,
+                 **kwargs
+                 ):
+        """
+        Init the client, the connection is opened on first use
+
+        Keyword Args:
+            **kwargs: all params forwarded to ``opentargets.async_conn.AsyncConnection`` object
+        """
+        self.conn = AsyncConnection(**kwargs)
+
+    async def __aenter__(self):
+        await self.conn.open()
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        await self.close()
+
+    async def close(self):
+        await self.conn.close()
+
+    async def _query(self, endpoint, **kwargs):
+        result = AsyncIterableResult(self.conn)
+        return await result(endpoint, **kwargs)
+
+    async def _resolve_target(self, target):
+        """
+        Return an Ensembl Gene identifier for the target, firing a search if needed
+        """
+        if not isinstance(target, str):
+            raise AttributeError('target must be of type str')
+        if target.startswith('ENSG'):
+            return target
+        search_result = await self._first(await self.search(target, size=1, filter='target'))
+        if not search_result:
+            raise AttributeError('cannot find an ensembl gene id for target {}'.format(target))
+        target_id = search_result['id']
+        logger.debug('{} resolved to id {}'.format(target, target_id))
+        return target_id
+
+    async def _resolve_disease(self, disease):
+        """
+        Return a disease identifier for the disease label, firing a search
+        """
+        search_result = await self._first(await self.search(disease, size=1, filter='disease'))
+        if not search_result:
+            raise AttributeError('cannot find an disease id for disease {}'.format(disease))
+        disease_id = search_result['id']
+        logger.debug('{} resolved to id {}'.format(disease, disease_id))
+        return disease_id
+
+    @staticmethod
+    async def _first(result):
+        async for i in result:
+            return i
+
+    async def search(self, query, **kwargs):
+        """
+        Search a string and return a list of objects form the search method of the REST API.
+        E.g. A returned object could be a target or a disease
+
+        Args:
+            query (str): string to search for
+        Keyword Args:
+            **kwargs: are passed as other parameters to the /public/search method of the REST API
+
+        Returns:
+            AsyncIterableResult: Result of the query
+        """
+        kwargs['q'] = query
+        return await self._query(self._search_endpoint, **kwargs)
+
+    async def get_association(self, association_id, **kwargs):
+        """
+        Retrieve a specific Association object from the REST API provided its ID
+
+        Args:
+            association_id (str): Association ID
+        Keyword Args:
+            **kwargs: are passed as other parameters to the /public/association method of the REST API
+
+        Returns:
+             AsyncIterableResult: Result of the query
+        """
+        kwargs['id'] = association_id
+        return await self._query(self._get_associations_endpoint, **kwargs)
+
+    async def filter_associations(self, **kwargs):
+        """
+        Retrieve a set of associations by applying a set of filters
+
+        Keyword Args:
+            **kwargs: are passed as parameters to the /public/association/filterby method of the REST API
+
+        Returns:
+            AsyncIterableResult: Result of the query
+        """
+        return await self._query(self._filter_associations_endpoint, **kwargs)
+
+    async def get_associations_for_target(self, target, **kwargs):
+        """
+        Same as ``AsyncOpenTargetsClient.filter_associations`` but accept any string as `target` parameter and fires
+        a search if it is not an Ensembl Gene identifier
+
+        Args:
+            target (str): an Ensembl Gene identifier or a string to search for a gene mapping
+        Keyword Args:
+            **kwargs: are passed as parameters to the /public/association/filterby method of the REST API
+        Returns:
+            AsyncIterableResult: Result of the query
+        """
+        target_id = await self._resolve_target(target)
+        return await self.filter_associations(target=target_id, **kwargs)
+
+    async def get_associations_for_disease(self, disease, **kwargs):
+        """
+        Same as ``AsyncOpenTargetsClient.filter_associations`` but accept any string as `disease` parameter and
+        fires a search if it is not a valid disease identifier
+
+        Args:
+            disease (str): a disease identifier or a string to search for a disease mapping
+        Keyword Args:
+            **kwargs: are passed as parameters to the /public/association/filterby method of the REST API
+        Returns:
+            AsyncIterableResult: Result of the query
+        """
+        if not isinstance(disease, str):
+            raise AttributeError('disease must be of type str')
+        results = await self.filter_associations(disease=disease, **kwargs)
+        if not results:
+            disease_id = await self._resolve_disease(disease)
+            results = await self.filter_associations(disease=disease_id, **kwargs)
+        return results
+
+    async def get_evidence(self, evidence_id, **kwargs):
+        """
+        Retrieve a specific Evidence object from the REST API provided its ID
+
+        Args:
+            evidence_id:
+        Keyword Args:
+            **kwargs: are passed as other parameters to the /public/evidence method of the REST API
+
+        Returns:
+             AsyncIterableResult: Result of the query
+        """
+        kwargs['id'] = evidence_id
+        return await self._query(self._get_evidence_endpoint, **kwargs)
+
+    async def get_target(self, target_id, **kwargs):
+        """
+        Retrieve a specific target object from the REST API provided its ID
+
+        Args:
+            target_id: Ensembl ID
+        Keyword Args:
+            **kwargs: are passed as other parameters to the /private/target method of the REST API
+
+        Returns:
+             AsyncIterableResult: Result of the query
+        """
+        return await self._query(self._get_target + '/' + target_id, **kwargs)
+
+    async def get_disease(self, disease_id, **kwargs):
+        """
+        Retrieve a specific disease object from the REST API provided its ID
+
+        Args:
+            disease_id: OT disease ID (EFO, Orphanet, ...)
+        Keyword Args:
+            **kwargs: are passed as other parameters to the /private/disease method of the REST API
+
+        Returns:
+             AsyncIterableResult: Result of the query
+        """
+        return await self._query(self._get_disease + '/' + disease_id, **kwargs)
+
+    async def filter_evidence(self, **kwargs):
+        """
+        Retrieve a set of evidence by applying a set of filters
+
+        Keyword Args:
+            **kwargs: are passed as parameters to the /public/evidence/filterby method of the REST API
+
+        Returns:
+            AsyncIterableResult: Result of the query
+        """
+        return await self._query(self._filter_evidence_endpoint, **kwargs)
+
+    async def get_evidence_for_target(self, target, **kwargs):
+        """
+        Same as ``AsyncOpenTargetsClient.filter_evidence`` but accept any string as `target` parameter and fires a
+        search if it is not an Ensembl Gene identifier
+
+        Args:
+            target (str): an Ensembl Gene identifier or a string to search for a gene mapping
+        Keyword Args:
+            **kwargs: are passed as parameters to the /public/evidence/filterby method of the REST API
+        Returns:
+            AsyncIterableResult: Result of the query
+        """
+        target_id = await self._resolve_target(target)
+        return await self.filter_evidence(target=target_id, **kwargs)
+
+    async def get_evidence_for_disease(self, disease, **kwargs):
+        """
+        Same as ``AsyncOpenTargetsClient.filter_evidence`` but accept any string as `disease` parameter and
+        fires a search if it is not a valid disease identifier
+
+        Args:
+            disease (str): a disease identifier or a string to search for a disease mapping
+        Keyword Args:
+            **kwargs: are passed as parameters to the /public/evidence/filterby method of the REST API
+        Returns:
+            AsyncIterableResult: Result of the query
+        """
+        if not isinstance(disease, str):
+            raise AttributeError('disease must be of type str')
+        results = await self.filter_evidence(disease=disease, **kwargs)
+        if not results:
+            disease_id = await self._resolve_disease(disease)
+            results = await self.filter_evidence(disease=disease_id, **kwargs)
+        return results
+
+    async def get_similar_target(self, target, **kwargs):
+        """
+        Return targets sharing a similar patter nof association to diseases
+        Accepts any string as `target` parameter and fires a search if it is not an Ensembl Gene identifier
+
+        Args:
+            target (str): an Ensembl Gene identifier or a string to search for a gene mapping
+        Keyword Args:
+            **kwargs: are passed as parameters to the /private/relation/target method of the REST API
+        Returns:
+            AsyncIterableResult: Result of the query
+        """
+        target_id = await self._resolve_target(target)
+        return await self._query(self._relation_target_endpoint + '/' + target_id, **kwargs)
+
+    async def get_similar_disease(self, disease, **kwargs):
+        """
+        Return targets sharing a similar patter nof association to diseases
+        Accepts any string as `disease` parameter and fires a search if nothing is retireved on a first attempt
+
+        Args:
+            disease (str): a disease identifier or a string to search for a disease mapping
+        Keyword Args:
+            **kwargs: are passed as parameters to the /private/relation/disease method of the REST API
+        Returns:
+            AsyncIterableResult: Result of the query
+        """
+        if not isinstance(disease, str):
+            raise AttributeError('disease must be of type str')
+        result = await self._query(self._relation_disease_endpoint + '/' + disease, **kwargs)
+        if not result:
+            disease_id = await self._resolve_disease(disease)
+            result = await self._query(self._relation_disease_endpoint + '/' + disease_id, **kwargs)
+        return result
+
+    async def get_stats(self, **kwargs):
+        """
+        Returns statistics about the data served by the REST API
+
+        Returns:
+            AsyncIterableResult: Result of the query
+        """
+        return await self._query(self._stats_endpoint)
+
+    async def get_metrics(self, **kwargs):
+        """
+        Returns metrics about the data served by the REST API
+
+        Returns:
+            AsyncIterableResult: Result of the query
+        """
+        return await self._query(self._metrics_endpoint)
@@ -0,0 +1,409 @@
+"""
+This module provides an asyncio version of ``opentargets.conn``. A single event loop can keep many requests in
+flight against the Open Targets REST API, instead of one request per thread.
+Requires aiohttp and Python 3.5 or higher.
+"""
+import asyncio
+import logging
+import ssl
+
+from opentargets.conn import BufferedResponse, Connection, HTTPMethods, Response, API_MAJOR_VERSION, \
+    canonical_params, parse_api_specs
+from opentargets.export import open_output
+from opentargets.json_backend import get_json_backend
+from opentargets.version import __version__
+
+try:
+    import aiohttp
+    aiohttp_available = True
+except ImportError:
+    aiohttp_available = False
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.WARNING)
+
+
+class AsyncConnection(object):
+    """
+    Asyncio handler for connection and calls to the Open Targets Validation Platform REST API
+    """
+
+    _retry_status_codes = (500, 502, 504)
+
+    def __init__(self,
+                 host='https://platform-api.opentargets.io',
+                 port=443,
+                 api_version='v3',
+                 verify=True,
+                 proxy=None,
+                 auth=None,
+                 limit=100,
+                 retries=10,
+                 backoff_factor=.5,
+                 json_backend='auto'
+                 ):
+        """
+        Args:
+            host (str): host serving the API
+            port (int): port to use for connection to the API
+            api_version (str): api version to point to, default to 'latest'
+            verify (bool): sets SSL verification, accepts True, False or a path to a certificate
+            proxy (str): url of an HTTP proxy to use for all the requests
+            auth (aiohttp.BasicAuth): authentication to use for requests made to the API
+            limit (int): maximum number of simultaneous connections to the API
+            retries (int): number of times a request is retried on connection errors or server side errors
+            backoff_factor (float): backoff factor applied between retries, as in ``urllib3.Retry``
+            json_backend (str): library used to decode responses and encode results, 'orjson', 'stdlib' or 'auto'
+                to use the fastest available, or a backend instance, E.g. ``OrjsonBackend(compact=True)`` to write
+                compact json. See ``opentargets.json_backend``
+        Raises:
+            ImportError: if aiohttp is not available
+        """
+        if not aiohttp_available:
+            raise ImportError('aiohttp library is not installed but is required to use an AsyncConnection')
+        self._logger = logging.getLogger(__name__)
+        self.host = host
+        self.port = str(port)
+        self.api_version = api_version
+        self.verify = verify
+        self.proxy = proxy
+        self.auth = auth
+        self.limit = limit
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.json_backend = get_json_backend(json_backend)
+        self.session = None
+        self.api_specs = None
+        self.endpoint_validation_data = None
+
+    _build_url = Connection._build_url
+    _auto_detect_post = staticmethod(Connection._auto_detect_post)
+    validate_parameter = Connection.validate_parameter
+    api_endpoint_docs = Connection.api_endpoint_docs
+    get_api_endpoints = Connection.get_api_endpoints
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        await self.close()
+
+    def _get_session(self):
+        """
+        Create the aiohttp session lazily, as it has to be created inside a running event loop
+        """
+        if self.session is None or self.session.closed:
+            if self.verify is True:
+                ssl_context = None
+            elif self.verify is False:
+                ssl_context = False
+            else:
+                ssl_context = ssl.create_default_context(cafile=self.verify)
+            connector = aiohttp.TCPConnector(limit=self.limit, ssl=ssl_context)
+            self.session = aiohttp.ClientSession(connector=connector,
+                                                 auth=self.auth,
+                                                 headers={'User-agent': 'Open Targets Python Client/%s' % str(__version__)})
+        return self.session
+
+    async def open(self):
+        """
+        Fetch the REST API documentation needed to validate parameters. It is called automatically when the
+        connection is used as an async context manager
+        """
+        if self.api_specs is None:
+            await self._get_remote_api_specs()
+
+    async def get(self, endpoint, params=None):
+        """
+        makes a GET request
+        Args:
+            endpoint (str): REST API endpoint to call
+            params (dict): request payload
+
+        Returns:
+            Response: request response
+        """
+        if self._auto_detect_post(params):
+            self._logger.debug('switching to POST due to big size of params')
+            return await self.post(endpoint, data=params)
+        return Response(await self._make_request(endpoint,
+                                                 params=params,
+                                                 method=HTTPMethods.GET),
+                        json_backend=self.json_backend)
+
+    async def post(self, endpoint, data=None):
+        """
+        makes a POST request
+        Args:
+            endpoint (str): REST API endpoint to call
+            data (dict): request payload
+
+        Returns:
+            Response: request response
+        """
+        return Response(await self._make_request(endpoint,
+                                                 data=data,
+                                                 method=HTTPMethods.POST),
+                        json_backend=self.json_backend)
+
+    async def _make_request(self,
+                            endpoint,
+                            params=None,
+                            data=None,
+                            method=HTTPMethods.GET,
+                            headers=None,
+                            **kwargs):
+        """
+        Makes a request to the REST API, retrying on connection errors and server side errors
+        Args:
+            endpoint (str): endpoint of the REST API
+            params (dict): payload for GET request
+            data (dict): payload for POST request
+            method (HTTPMethods): request method, either HTTPMethods.GET or HTTPMethods.POST. Defaults to HTTPMethods.GET
+            headers (dict): HTTP headers for the request
+        Keyword Args:
+            **kwargs: forwarded to aiohttp
+
+        Returns:
+            BufferedResponse: the response with its body already read
+        """
+        return await self._request(self._build_url(endpoint),
+                                   params=self._encode_params(params),
+                                   json=canonical_params(data) if isinstance(data, dict) else data,
+                                   method=method,
+                                   headers=headers,
+                                   **kwargs)
+
+    async def _request(self, url, method=HTTPMethods.GET, **kwargs):
+        session = self._get_session()
+        attempt = 0
+        while True:
+            try:
+                async with session.request(method.upper(), url, proxy=self.proxy, **kwargs) as response:
+                    if response.status in self._retry_status_codes and attempt < self.retries:
+                        raise aiohttp.ClientResponseError(response.request_info,
+                                                          response.history,
+                                                          status=response.status)
+                    response.raise_for_status()
+                    content = await response.read()
+                    return BufferedResponse(content,
+                                            headers=response.headers,
+                                            status_code=response.status,
+                                            encoding=response.get_encoding())
+            except (aiohttp.ClientConnectionError, aiohttp.ClientResponseError, asyncio.TimeoutError) as e:
+                if isinstance(e, aiohttp.ClientResponseError) and e.status not in self._retry_status_codes:
+                    raise
+                if attempt >= self.retries:
+                    raise
+                attempt += 1
+                backoff = self.backoff_factor * (2 ** (attempt - 1))
+                self._logger.debug('retrying %s in %.1fs after error: %s', url, backoff, e)
+                await asyncio.sleep(backoff)
+
+    @staticmethod
+    def _encode_params(params):
+        """
+        Turn params into a sorted list of tuples, which aiohttp accepts also for multi valued parameters.
+        """
+        if not params:
+            return None
+        encoded = []
+        for k, v in sorted(canonical_params(params, encode_booleans=True).items()):
+            values = v if isinstance(v, (list, tuple)) else [v]
+            for i in values:
+                encoded.append((k, str(i)))
+        return encoded
+
+    async def _get_remote_api_specs(self):
+        """
+        Fetch and parse REST API documentation
+        """
+        r = await self._request(self.host + ':' + self.port + '/v%s/platform/swagger' % API_MAJOR_VERSION)
+        self.swagger_yaml = r.text
+        self.api_specs, self.endpoint_validation_data = parse_api_specs(self.swagger_yaml)
+        remote_version = (await self.get('/platform/public/utils/version')).data
+        if not str(remote_version).startswith(API_MAJOR_VERSION):
+            self._logger.warning('The remote server is running the API with version {}, but the client expected this major version {}. They may not be compatible.'.format(remote_version, API_MAJOR_VERSION))
+
+    async def close(self):
+        """
+        Close connection to the REST API
+        """
+        if self.session is not None:
+            await self.session.close()
+
+    async def ping(self):
+        """
+        Pings the API as a live check
+        Returns:
+            bool: True if pinging the raw response as a ``str`` if the API has a non standard name
+        """
+        response = await self.get('/platform/public/utils/ping')
+        if response.data == 'pong':
+            return True
+        elif response.data:
+            return response.data
+        return False
+
+
+class AsyncIterableResult(object):
+    '''
+    Asyncio version of ``opentargets.conn.IterableResult``, to be consumed with ``async for``.
+    It will automatically handle making multiple calls for pagination if needed.
+    '''
+
+    def __init__(self, conn, method=HTTPMethods.GET):
+        """
+        Requires an AsyncConnection
+        Args:
+            conn (AsyncConnection): an AsyncConnection instance
+            method (HTTPMethods): HTTP method to use for the calls
+        """
+        self.conn = conn
+        self.method = method
+        self._search_after_last = None
+
+    async def __call__(self, *args, **kwargs):
+        """
+        Allows to set parameters for calls to the REST API and fetches the first page of results
+        Args:
+            *args: stored internally
+        Keyword Args:
+            **kwargs: stored internally
+
+        Returns:
+            AsyncIterableResult: returns itself
+        """
+        self._args = args
+        self._kwargs = kwargs
+        response = await self._make_call()
+        self.info = response.info
+        self._data = response.data
+        self._cursor = 0
+        if 'next_' in response.info:
+            self._search_after_last = response.info.next_
+        self.current = 0
+        try:
+            self.total = int(self.info.total)
+            if 'size' in self.info and 'size' not in self._kwargs:
+                self._kwargs['size'] = 1000
+        except:
+            self.total = len(self._data)
+        return self
+
+    async def filter(self, **kwargs):
+        """
+        Applies a set of filters to the current query
+        Keyword Args
+            **kwargs: passed to the REST API
+        Returns:
+            AsyncIterableResult: an AsyncIterableResult with applied filters
+        """
+        if kwargs:
+            await self.conn.open()
+            for filter_type, filter_value in kwargs.items():
+                self.conn.validate_parameter(self._args[0], filter_type, filter_value)
+                self._kwargs[filter_type] = filter_value
+            await self.__call__(*self._args, **self._kwargs)
+        return self
+
+    async def _make_call(self):
+        """
+        makes calls to the REST API
+        Returns:
+            Response: response for a call
+        Raises:
+            AttributeError: if HTTP method is not supported
+        """
+        if self.method == HTTPMethods.GET:
+            return await self.conn.get(*(self._args), params=self._kwargs)
+        elif self.method == HTTPMethods.POST:
+            return await self.conn.post(*self._args, data=self._kwargs)
+        else:
+            raise AttributeError("HTTP method {} is not supported".format(self.method))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.current < self.total:
+            if self._cursor >= len(self._data):
+                if self._search_after_last:
+                    self._kwargs['from'] = 0
+                    self._kwargs['next'] = self._search_after_last
+                else:
+                    self._kwargs['from'] = self.current
+                self._kwargs['no_cache'] = 'true'
+                self._kwargs['size'] = 1000
+                call_output = await self._make_call()
+                if not call_output.data:
+                    raise StopAsyncIteration
+                if 'next_' in call_output.info:
+                    self._search_after_last = call_output.info.next_
+                self._data = call_output.data
+                self._cursor = 0
+            d = self._data[self._cursor]
+            self._cursor += 1
+            self.current += 1
+            return d
+        else:
+            raise StopAsyncIteration
+
+    def __len__(self):
+        try:
+            return self.total
+        except:
+            return 0
+
+    def __bool__(self):
+        return self.__len__() > 0
+
+    def __str__(self):
+        try:
+            return_str = '{} Results found'.format(self.total)
+            if self._kwargs:
+                return_str += ' | parameters: {}'.format(self._kwargs)
+            return return_str
+        except:
+            data = str(self._data)
+            return data[:100] + (data[100:] and '...')
+
+    def __repr__(self):
+        return self.__str__()
+
+    async def to_list(self):
+        """
+        Fetch all the results
+
+        Returns:
+            list: all the results of the query
+        """
+        return [i async for i in self]
+
+    async def to_json(self):
+        """
+        Yield a json string for each result, converting them as they are fetched from the api
+
+        Returns:
+            an async iterator of json strings
+        """
+        async for i in self:
+            yield self.conn.json_backend.dumps(i)
+
+    async def to_file(self, filename, compress=True, level=None, threads=1):
+        """
+        Save all the results to a file with a json object per line
+
+        Args:
+            filename (str): path of the output file
+            compress: False to write uncompressed data, 'gzip' (or True) or 'zstd'
+            level (int): compression level. Defaults to 9 for gzip and 3 for zstd
+            threads (int): number of threads compressing data
+        """
+        fh = open_output(filename, compress=compress, level=level, threads=threads)
+        try:
+            async for datapoint in self:
+                fh.write(self.conn.json_backend.dumpb(datapoint) + b'\n')
+        finally:
+            fh.close()
@@ -0,0 +1,354 @@
+"""
+This module provides persistent caches stored on the local disk, shared by clients running in different processes.
+"""
+import calendar
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from cachecontrol.cache import BaseCache
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.WARNING)
+
+
+def default_cache_dir():
+    """
+    Returns the directory used to store the caches, from the ``OPENTARGETS_CACHE_DIR`` environment variable if set,
+    otherwise ``opentargets`` in the user cache directory
+
+    Returns:
+        str: path of the cache directory
+    """
+    if os.environ.get('OPENTARGETS_CACHE_DIR'):
+        return os.environ['OPENTARGETS_CACHE_DIR']
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'opentargets')
+
+
+class JSONFileCache(object):
+    """
+    Stores json serialisable objects in files, one per key. Files are replaced atomically so that readers in other
+    processes never see a partially written file
+    """
+
+    _suffix = '.json'
+    _decode_errors = (ValueError,)
+
+    def __init__(self, directory):
+        """
+        Args:
+            directory (str): directory storing the files, created if needed
+        """
+        self.directory = directory
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + self._suffix)
+
+    def _dumps(self, value):
+        return json.dumps(value, default=str).encode('utf-8')
+
+    def _loads(self, data):
+        return json.loads(data.decode('utf-8'))
+
+    def get(self, key):
+        """
+        Args:
+            key (str): key of the object
+        Returns:
+            the stored object or None if not available
+        """
+        try:
+            with open(self._path(key), 'rb') as fh:
+                return self._loads(fh.read())
+        except (IOError, OSError) + self._decode_errors:
+            return None
+
+    def set(self, key, value):
+        """
+        Args:
+            key (str): key of the object
+            value: an object the cache can serialise
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(self._dumps(value))
+            os.rename(tmp_path, self._path(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+
+class PickleFileCache(JSONFileCache):
+    """
+    Stores python objects in pickle files, one per key, keeping the types json changes, E.g. integer dictionary keys
+    or dates.
+    Loading a pickle can run code, the directory must be writable only by the user running the client
+    """
+
+    _suffix = '.pickle'
+    _decode_errors = (ValueError, EOFError, AttributeError, ImportError, pickle.UnpicklingError)
+
+    def _dumps(self, value):
+        return pickle.dumps(value, protocol=2)
+
+    def _loads(self, data):
+        return pickle.loads(data)
+
+
+class SQLiteStore(object):
+    """
+    Base class for caches stored in a SQLite database. The connection is shared by all the threads of a process and
+    guarded by a lock, while SQLite locking makes the database safe to share with other processes
+    """
+
+    _schema = ()
+
+    def __init__(self, path, timeout=30):
+        """
+        Args:
+            path (str): path of the SQLite database, parent directories are created if needed
+            timeout (float): seconds to wait for a lock held by another process
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.path = path
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, timeout=timeout, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        with self._lock:
+            for statement in self._schema:
+                self._db.execute(statement)
+
+    def _execute(self, statement, params=()):
+        with self._lock:
+            return self._db.execute(statement, params).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class ResolutionCache(SQLiteStore):
+    """
+    Persistent cache of the identifiers that target and disease names resolve to.
+    Entries are stored per REST API version, expire after a time to live and the least recently used are evicted
+    when the cache grows over its maximum size.
+    """
+
+    _schema = ('CREATE TABLE IF NOT EXISTS resolution ('
+               'api_version TEXT NOT NULL, '
+               'entity_type TEXT NOT NULL, '
+               'name TEXT NOT NULL, '
+               'resolved_id TEXT NOT NULL, '
+               'created REAL NOT NULL, '
+               'accessed REAL NOT NULL, '
+               'PRIMARY KEY (api_version, entity_type, name))',
+               'CREATE INDEX IF NOT EXISTS resolution_accessed ON resolution (accessed)')
+
+    def __init__(self, path, api_version, ttl=30 * 24 * 3600, max_entries=100000, **kwargs):
+        """
+        Args:
+            path (str): path of the SQLite database
+            api_version (str): version of the REST API the identifiers are valid for
+            ttl (float): seconds after which an entry expires. None to never expire entries
+            max_entries (int): maximum number of entries kept in the cache
+        Keyword Args:
+            **kwargs: forwarded to ``SQLiteStore``
+        """
+        super(ResolutionCache, self).__init__(path, **kwargs)
+        self.api_version = str(api_version)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._writes = 0
+
+    def get(self, entity_type, name):
+        """
+        Args:
+            entity_type (str): 'target' or 'disease'
+            name (str): name that was resolved
+        Returns:
+            str: the resolved identifier or None if not cached or expired
+        """
+        now = time.time()
+        rows = self._execute('SELECT resolved_id, created FROM resolution '
+                             'WHERE api_version=? AND entity_type=? AND name=?',
+                             (self.api_version, entity_type, name))
+        if not rows:
+            return None
+        resolved_id, created = rows[0]
+        if self.ttl is not None and now - created > self.ttl:
+            self._execute('DELETE FROM resolution WHERE api_version=? AND entity_type=? AND name=?',
+                          (self.api_version, entity_type, name))
+            return None
+        self._execute('UPDATE resolution SET accessed=? WHERE api_version=? AND entity_type=? AND name=?',
+                      (now, self.api_version, entity_type, name))
+        return resolved_id
+
+    def set(self, entity_type, name, resolved_id):
+        """
+        Args:
+            entity_type (str): 'target' or 'disease'
+            name (str): name that was resolved
+            resolved_id (str): identifier the name resolves to
+        """
+        now = time.time()
+        self._execute('INSERT OR REPLACE INTO resolution VALUES (?, ?, ?, ?, ?, ?)',
+                      (self.api_version, entity_type, name, resolved_id, now, now))
+        self._writes += 1
+        if self._writes % 100 == 1:
+            self.evict()
+
+    def evict(self):
+        """
+        Remove expired entries and the least recently used entries over the maximum size
+        """
+        with self._lock:
+            if self.ttl is not None:
+                self._execute('DELETE FROM resolution WHERE created<?', (time.time() - self.ttl,))
+            count = self._execute('SELECT COUNT(*) FROM resolution')[0][0]
+            if count > self.max_entries:
+                self._execute('DELETE FROM resolution WHERE rowid IN '
+                              '(SELECT rowid FROM resolution ORDER BY accessed LIMIT ?)',
+                              (count - self.max_entries,))
+
+    def clear(self):
+        """
+        Remove all the entries
+        """
+        self._execute('DELETE FROM resolution')
+
+    def __len__(self):
+        return self._execute('SELECT COUNT(*) FROM resolution WHERE api_version=?', (self.api_version,))[0][0]
+
+
+class SQLiteHTTPCache(SQLiteStore, BaseCache):
+    """
+    Persistent cache backend for CacheControl, bounded in size.
+    The least recently used responses are evicted when the total size of the stored responses exceeds the limit.
+    The total size is kept up to date by triggers in a single row table, so that it is shared by all the processes
+    using the cache without summing the size of every response.
+    Cached responses carrying an ETag are revalidated by CacheControl with If-None-Match requests.
+    """
+
+    _schema = ('CREATE TABLE IF NOT EXISTS http_cache ('
+               'key TEXT PRIMARY KEY, '
+               'value BLOB NOT NULL, '
+               'size INTEGER NOT NULL, '
+               'expires REAL, '
+               'accessed REAL NOT NULL)',
+               'CREATE INDEX IF NOT EXISTS http_cache_accessed ON http_cache (accessed)',
+               'CREATE INDEX IF NOT EXISTS http_cache_expires ON http_cache (expires)',
+               'CREATE TABLE IF NOT EXISTS http_cache_size ('
+               'id INTEGER PRIMARY KEY CHECK (id=0), '
+               'total INTEGER NOT NULL)',
+               'INSERT OR IGNORE INTO http_cache_size VALUES (0, (SELECT COALESCE(SUM(size), 0) FROM http_cache))',
+               'CREATE TRIGGER IF NOT EXISTS http_cache_inserted AFTER INSERT ON http_cache BEGIN '
+               'UPDATE http_cache_size SET total=total+NEW.size WHERE id=0; END',
+               'CREATE TRIGGER IF NOT EXISTS http_cache_deleted AFTER DELETE ON http_cache BEGIN '
+               'UPDATE http_cache_size SET total=total-OLD.size WHERE id=0; END',
+               'CREATE TRIGGER IF NOT EXISTS http_cache_updated AFTER UPDATE OF size ON http_cache BEGIN '
+               'UPDATE http_cache_size SET total=total+NEW.size-OLD.size WHERE id=0; END')
+
+    _expire_every = 100
+    _evict_batch = 100
+
+    def __init__(self, path, max_bytes=512 * 1024 * 1024, **kwargs):
+        """
+        Args:
+            path (str): path of the SQLite database
+            max_bytes (int): maximum total size of the stored responses
+        Keyword Args:
+            **kwargs: forwarded to ``SQLiteStore``
+        """
+        super(SQLiteHTTPCache, self).__init__(path, **kwargs)
+        self.max_bytes = max_bytes
+        self._writes = 0
+
+    def get(self, key):
+        now = time.time()
+        rows = self._execute('SELECT value, expires FROM http_cache WHERE key=?', (key,))
+        if not rows:
+            return None
+        value, expires = rows[0]
+        if expires is not None and expires < now:
+            self.delete(key)
+            return None
+        self._execute('UPDATE http_cache SET accessed=? WHERE key=?', (now, key))
+        return bytes(value)
+
+    def set(self, key, value, expires=None):
+        now = time.time()
+        if isinstance(expires, datetime):
+            # CacheControl passes naive datetimes in UTC
+            expires = calendar.timegm(expires.utctimetuple())
+        elif expires is not None:
+            expires = now + expires
+        with self._lock:
+            # a replaced row must be deleted explicitly for the size triggers to run
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                self._db.execute('DELETE FROM http_cache WHERE key=?', (key,))
+                self._db.execute('INSERT INTO http_cache VALUES (?, ?, ?, ?, ?)',
+                                 (key, sqlite3.Binary(value), len(value), expires, now))
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._writes += 1
+            if self._writes % self._expire_every == 1:
+                self.remove_expired()
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def delete(self, key):
+        self._execute('DELETE FROM http_cache WHERE key=?', (key,))
+
+    def remove_expired(self):
+        """
+        Remove expired responses
+        """
+        self._execute('DELETE FROM http_cache WHERE expires<?', (time.time(),))
+
+    def evict(self):
+        """
+        Remove expired responses and the least recently used responses over the size limit
+        """
+        with self._lock:
+            self.remove_expired()
+            while self.size > self.max_bytes:
+                to_free = self.size - self.max_bytes
+                rows = self._execute('SELECT key, size FROM http_cache ORDER BY accessed LIMIT ?',
+                                     (self._evict_batch,))
+                if not rows:
+                    break
+                for key, size in rows:
+                    if to_free <= 0:
+                        break
+                    self.delete(key)
+                    to_free -= size
+
+    def clear(self):
+        """
+        Remove all the stored responses
+        """
+        self._execute('DELETE FROM http_cache')
+
+    @property
+    def size(self):
+        """
+        Returns:
+            int: total size in bytes of the stored responses
+        """
+        return self._execute('SELECT total FROM http_cache_size WHERE id=0')[0][0]
@@ -2,21 +2,34 @@
 This module abstracts the connection to the Open Targets REST API to simplify its usage.
 Can be used directly but requires some knowledge of the API.
 """
-import gzip
+import codecs
+import hashlib
 import json
 import logging
-from collections import namedtuple
+import os
+import queue
+import threading
+import traceback
+import weakref
+from collections import namedtuple, deque, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
 from itertools import islice
 from json import JSONEncoder
-import collections
+try:
+    from collections.abc import MutableMapping, Sequence
+except ImportError:
+    from collections import MutableMapping, Sequence
 
 import addict
 import requests
-from cachecontrol import CacheControl
+from cachecontrol import CacheControlAdapter
 from future.utils import implements_iterator
 import yaml
-from requests.adapters import HTTPAdapter
 from urllib3 import Retry
+from opentargets.cache import default_cache_dir, PickleFileCache, SQLiteHTTPCache
+from opentargets.json_backend import get_json_backend
+from opentargets.raw import split_records
 from opentargets.version import __version__, __api_major_version__
 
 try:
@@ -37,6 +50,11 @@ try:
 except ImportError:
     tqdm_available = False
 
+try:
+    from yaml import CSafeLoader as YAMLLoader
+except ImportError:
+    from yaml import SafeLoader as YAMLLoader
+
 API_MAJOR_VERSION = __api_major_version__
 
 logger = logging.getLogger(__name__)
@@ -57,7 +75,7 @@ def flatten(d, parent_key='', separator='.'):
     flat_fields = []
     for k, v in d.items():
         flat_key = parent_key + separator + k if parent_key else k
-        if isinstance(v, collections.MutableMapping):
+        if isinstance(v, MutableMapping):
             flat_fields.extend(flatten(v, flat_key, separator=separator).items())
         else:
             flat_fields.append((flat_key, v))
@@ -74,7 +92,7 @@ def compress_list_values(d, sep='|'):
     """
     for k, v in d.items():
         if not isinstance(v, (str, int, float)):
-            if isinstance(v, collections.Sequence):
+            if isinstance(v, Sequence):
                 safe_values = []
                 for i in v:
                     if isinstance(i, (str, int, float)):
@@ -86,40 +104,148 @@ def compress_list_values(d, sep='|'):
 
 
 
+def parse_api_specs(swagger_yaml):
+    """
+    Parse the swagger YAML documentation of the REST API and build the tables used to validate parameters
+
+    Args:
+        swagger_yaml (str): swagger documentation in YAML format
+
+    Returns:
+        tuple: the parsed specs and a dictionary of accepted parameters and types per endpoint and method
+    """
+    api_specs = yaml.load(swagger_yaml, Loader=YAMLLoader)
+    endpoint_validation_data = {}
+    for p, data in api_specs['paths'].items():
+        p = p.split('{')[0]
+        if p[-1] == '/':
+            p = p[:-1]
+        endpoint_validation_data[p] = {}
+        endpoint_validation_data['/platform' + p] = {}
+        for method, method_data in data.items():
+            if 'parameters' in method_data:
+                params = {}
+                for par in method_data['parameters']:
+                    par_type = par.get('type', 'string')
+                    params[par['name']] = par_type
+                endpoint_validation_data[p][method] = params
+                endpoint_validation_data['/platform' + p][method] = params
+    return api_specs, endpoint_validation_data
+
+
+ORDER_SENSITIVE_PARAMS = ('sort', 'next')
+
+
+def canonical_params(params, encode_booleans=False):
+    """
+    Normalise the parameters of a query so that equivalent queries are sent in the same way: list values are
+    sorted and deduplicated (except for order sensitive parameters like `sort` and `next`) and single element lists
+    are sent as a single value
+
+    Args:
+        params (dict): parameters of the query
+        encode_booleans (bool): if True send booleans as 'true' or 'false', as needed for query strings
+
+    Returns:
+        dict: normalised parameters
+    """
+    if not params:
+        return params
+    canonical = {}
+    for k, v in params.items():
+        if isinstance(v, (list, tuple, set, frozenset)):
+            v = list(v)
+            if k not in ORDER_SENSITIVE_PARAMS:
+                unique_values = OrderedDict((_canonical_value(i), i) for i in v)
+                v = [unique_values[i] for i in sorted(unique_values)]
+                if len(v) == 1:
+                    v = v[0]
+        if encode_booleans:
+            if isinstance(v, bool):
+                v = _canonical_value(v)
+            elif isinstance(v, list):
+                v = [_canonical_value(i) if isinstance(i, bool) else i for i in v]
+        canonical[k] = v
+    return canonical
+
+
+def _canonical_value(v):
+    if isinstance(v, bool):
+        return 'true' if v else 'false'
+    return str(v)
+
+
+def request_key(endpoint, params=None):
+    """
+    Compute a key identifying a query independently of the way it is spelled and of the HTTP method used to send it
+
+    Args:
+        endpoint (str): REST API endpoint
+        params (dict): parameters of the query, sent as query string or as body
+
+    Returns:
+        str: a hash of the canonical query
+    """
+    canonical = {}
+    for k, v in (canonical_params(params) or {}).items():
+        if isinstance(v, list):
+            canonical[k] = [_canonical_value(i) for i in v]
+        else:
+            canonical[k] = _canonical_value(v)
+    serialised = json.dumps([endpoint, canonical], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(serialised.encode('utf-8')).hexdigest()
+
+
 class HTTPMethods(object):
     GET='get'
     POST='post'
 
 
+def response_info(metadata):
+    """
+    Wrap the metadata of a response in an addict Dictionary, renaming the keys that are python keywords
+
+    Args:
+        metadata (dict): the fields of a response other than `data`
+
+    Returns:
+        addict.Dict: metadata of the response
+    """
+    if 'from' in metadata:
+        metadata['from_'] = metadata['from']
+        del metadata['from']
+    if 'next' in metadata:
+        metadata['next_'] = metadata['next']
+        del metadata['next']
+    return addict.Dict(metadata)
+
+
 class Response(object):
     """
     Handler for responses coming from the api
     """
 
-    def __init__(self, response):
+    def __init__(self, response, json_backend=None):
         """
 
         Args:
             response: a response coming from a requests call
-            content_type (str): content type of the response
+            json_backend (StdlibJSONBackend): backend used to decode the response.
+                Defaults to the fastest available
         """
         self._logger = logging.getLogger(__name__)
+        if json_backend is None:
+            json_backend = get_json_backend()
         try:
             # TODO parse from json just if content type allows it
-            parsed_response = response.json()
+            parsed_response = json_backend.loads(response.content)
             if isinstance(parsed_response, dict):
                 if 'data' in parsed_response:
                     self.data = parsed_response['data']
                     del parsed_response['data']
                 else:
                     self.data = [parsed_response]
-                if 'from' in parsed_response:
-                    parsed_response['from_'] = parsed_response['from']
-                    del parsed_response['from']
-                if 'next' in parsed_response:
-                    parsed_response['next_'] = parsed_response['next']
-                    del parsed_response['next']
-                self.info = addict.Dict(parsed_response)
+                self.info = response_info(parsed_response)
 
             else:
                 # TODO because content type wasnt checked a string
@@ -148,6 +274,294 @@ class Response(object):
             return len(self.data)
 
 
+class StreamingResponse(object):
+    """
+    Handler for responses coming from the api, parsed incrementally while the body is downloaded.
+    Records in `data` are yielded one by one by ``StreamingResponse.iter_data``, so that only the record being
+    parsed is held in memory.
+
+    Notes:
+        the metadata in `info` is complete only after all the records have been read. If it is accessed before, the
+        remaining records are parsed and buffered in memory.
+    """
+
+    _whitespace = ' \t\n\r'
+    _number_chars = '-+.eE0123456789'
+
+    def __init__(self, response, chunk_size=64 * 1024):
+        """
+        Args:
+            response: a response coming from a requests call made with `stream=True`
+            chunk_size (int): number of bytes read from the body at a time
+        """
+        self._logger = logging.getLogger(__name__)
+        self._response = response
+        self._headers = response.headers
+        self._chunks = response.iter_content(chunk_size)
+        self._text_decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')()
+        self._json_decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self._metadata = {}
+        self._has_data = False
+        self._pending = deque()
+        self._records = self._parse()
+        self.count = 0
+
+    def _read(self):
+        """
+        Read a chunk of the body in the buffer, dropping the text already parsed
+
+        Returns:
+            bool: False if the body has been read completely
+        """
+        if self._eof:
+            return False
+        chunk = next(self._chunks, None)
+        if self._pos:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        if chunk is None:
+            self._buffer += self._text_decoder.decode(b'', True)
+            self._eof = True
+            self._response.close()
+            return False
+        self._buffer += self._text_decoder.decode(chunk)
+        return True
+
+    def _peek(self):
+        """
+        Skip whitespace and return the next character to parse
+
+        Raises:
+            ValueError: if the body ends unexpectedly
+        """
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in self._whitespace:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._read():
+                raise ValueError('unexpected end of json response')
+
+    def _value(self):
+        """
+        Parse the next json value, reading more of the body until the value is complete
+        """
+        self._peek()
+        while True:
+            if self._buffer[self._pos] in self._number_chars:
+                # a number ending with the buffer could be truncated
+                end = self._pos
+                while end < len(self._buffer) and self._buffer[end] in self._number_chars:
+                    end += 1
+                if end == len(self._buffer) and self._read():
+                    continue
+            try:
+                value, end = self._json_decoder.raw_decode(self._buffer, self._pos)
+                self._pos = end
+                return value
+            except ValueError:
+                if not self._read():
+                    raise
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError('invalid json response, expected {} at {}'.format(char, self._buffer[self._pos:][:50]))
+        self._pos += 1
+
+    def _parse(self):
+        """
+        Parse the body, yielding the records in `data` and storing the other fields as metadata
+        """
+        if self._peek() != '{':
+            value = self._value()
+            for record in (value if isinstance(value, list) else [value]):
+                self.count += 1
+                yield record
+            return
+        self._pos += 1
+        while True:
+            char = self._peek()
+            if char == '}':
+                self._pos += 1
+                break
+            if char == ',':
+                self._pos += 1
+                continue
+            key = self._value()
+            self._expect(':')
+            if key == 'data' and self._peek() == '[':
+                self._has_data = True
+                self._pos += 1
+                while True:
+                    char = self._peek()
+                    if char == ']':
+                        self._pos += 1
+                        break
+                    if char == ',':
+                        self._pos += 1
+                        continue
+                    record = self._value()
+                    self.count += 1
+                    yield record
+            else:
+                self._metadata[key] = self._value()
+        if not self._has_data:
+            self.count += 1
+            yield dict(self._metadata)
+        while self._read():
+            pass
+
+    def iter_data(self):
+        """
+        Yield the records in `data` as they are parsed
+
+        Returns:
+            iterator: the records of the response
+        """
+        while True:
+            if self._pending:
+                yield self._pending.popleft()
+                continue
+            record = next(self._records, None)
+            if record is None:
+                return
+            yield record
+
+    @property
+    def data(self):
+        """
+        Returns:
+            list: all the records not yet read with ``StreamingResponse.iter_data``
+        """
+        return list(self.iter_data())
+
+    @property
+    def info(self):
+        """
+        Returns:
+            addict.Dict: metadata of the response
+        """
+        for record in self._records:
+            self._pending.append(record)
+        return response_info(dict(self._metadata))
+
+    def close(self):
+        """
+        Stop reading the response
+        """
+        self._response.close()
+
+    def __len__(self):
+        try:
+            return self.info.total
+        except:
+            return self.count + len(self._pending)
+
+
+class RawResponse(Response):
+    """
+    Handler for responses coming from the api, keeping each result as the json bytes it is encoded with in the
+    response body. Only the metadata of the response is decoded.
+    """
+
+    def __init__(self, response, json_backend=None):
+        """
+
+        Args:
+            response: a response coming from a requests call
+            json_backend (StdlibJSONBackend): backend used to decode the metadata.
+                Defaults to the fastest available
+        """
+        if json_backend is None:
+            json_backend = get_json_backend()
+        split = split_records(response.content)
+        if split is None:
+            super(RawResponse, self).__init__(response, json_backend=json_backend)
+            if isinstance(self.data, list):
+                self.data = [json_backend.dumpb(i) for i in self.data]
+            return
+        self._logger = logging.getLogger(__name__)
+        self.data, metadata = split
+        metadata = json_backend.loads(metadata)
+        del metadata['data']
+        self.info = response_info(metadata)
+        self._headers = response.headers
+
+
+class BufferedResponse(object):
+    """
+    Minimal stand-in for a ``requests`` response whose body has already been read, so that it can be wrapped in a
+    ``Response`` object
+    """
+
+    def __init__(self, content, headers=None, status_code=200, encoding='utf-8'):
+        """
+        Args:
+            content (bytes): body of the response
+            headers (dict): HTTP headers of the response
+            status_code (int): HTTP status code of the response
+            encoding (str): encoding used to decode the body
+        """
+        self.content = content
+        self.headers = headers or {}
+        self.status_code = status_code
+        self.encoding = encoding
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or 'utf-8')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class SingleFlight(object):
+    """
+    Runs a function once for concurrent calls with the same key: the first caller runs it, while the others wait
+    and get the same result, or the same exception
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, function, *args, **kwargs):
+        """
+        Args:
+            key: hashable key identifying the call
+            function: function to call
+            *args: forwarded to the function
+        Keyword Args:
+            **kwargs: forwarded to the function
+
+        Returns:
+            the result of the function, shared with the concurrent calls with the same key
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            running = future is not None
+            if not running:
+                future = self._calls[key] = Future()
+        if running:
+            return future.result()
+        try:
+            result = function(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def __len__(self):
+        return len(self._calls)
+
+
 class Connection(object):
     """
     Handler for connection and calls to the Open Targets Validation Platform REST API
@@ -158,7 +572,14 @@ class Connection(object):
                  api_version='v3',
                  verify = True,
                  proxies = {},
-                 auth = None
+                 auth = None,
+                 pool_maxsize = 10,
+                 cache_dir = None,
+                 cache_api_specs = True,
+                 http_cache = None,
+                 response_cache_size = 0,
+                 json_backend = 'auto',
+                 coalesce_requests = False
                  ):
         """
         Args:
@@ -167,11 +588,42 @@ class Connection(object):
             api_version (str): api version to point to, default to 'latest'
             verify (bool): sets SSL verification for Request session, accepts True, False or a path to a certificate
             auth (AuthBase): sets the custom authentication object to use for requests made to the API. Should be one of the built in options provided by the reqests package, or a subclass of requests.auth.AuthBase.
+            pool_maxsize (int): maximum number of connections to the API kept open in the pool. Should be at least
+                as big as the number of threads fetching results in parallel
+            cache_dir (str): directory for the caches stored on disk.
+                Defaults to ``opentargets.cache.default_cache_dir()``
+            cache_api_specs (bool): if True the parsed REST API documentation is stored in the cache directory,
+                keyed by host and remote version. The documentation is loaded only when first needed
+            http_cache: backend used to cache HTTP responses following the cache headers set by the REST API.
+                None keeps responses in memory for the lifetime of the connection, True stores them in a
+                ``opentargets.cache.SQLiteHTTPCache`` in the cache directory, shared with other processes and
+                bounded in size. Accepts any ``cachecontrol.cache.BaseCache`` instance
+            response_cache_size (int): number of responses kept in a client side cache keyed by the canonical form
+                of the query (see ``request_key``), so that identical queries sent with a different spelling or
+                HTTP method reuse the same response. 0 disables it
+            json_backend (str): library used to decode responses and encode results, 'orjson', 'stdlib' or 'auto'
+                to use the fastest available, or a backend instance, E.g. ``OrjsonBackend(compact=True)`` to write
+                compact json. See ``opentargets.json_backend``
+            coalesce_requests (bool): if True, identical queries made at the same time by many threads share a
+                single request and the same ``Response``, so the callers must not modify its results. Queries are
+                identical if they have the same HTTP method, URL and canonical parameters (see ``request_key``).
+                Disabled by default
         """
         self._logger = logging.getLogger(__name__)
         self.host = host
         self.port = str(port)
         self.api_version = api_version
+        self.cache_dir = cache_dir or default_cache_dir()
+        self._remote_version = None
+        self.cache_api_specs = cache_api_specs
+        self._api_specs = None
+        self._api_specs_lock = threading.Lock()
+        self.response_cache_size = response_cache_size
+        self.json_backend = get_json_backend(json_backend)
+        self._response_cache = OrderedDict()
+        self._response_cache_lock = threading.Lock()
+        self.coalesce_requests = coalesce_requests
+        self._in_flight = SingleFlight()
         session= requests.Session()
         session.verify = verify
         session.proxies = proxies
@@ -181,10 +633,13 @@ class Connection(object):
                                connect=10,
                                backoff_factor=.5,
                                status_forcelist=(500, 502, 504),)
-        http_retry = HTTPAdapter(max_retries=retry_policies)
-        session.mount(host, http_retry)
-        self.session = CacheControl(session)
-        self._get_remote_api_specs()
+        if http_cache is True:
+            http_cache = SQLiteHTTPCache(os.path.join(self.cache_dir, 'http_cache.sqlite'))
+        http_adapter = CacheControlAdapter(cache=http_cache,
+                                           max_retries=retry_policies,
+                                           pool_maxsize=pool_maxsize)
+        session.mount(host, http_adapter)
+        self.session = session
 
 
 
@@ -214,36 +669,109 @@ class Connection(object):
                         return True
         return False
 
-    def get(self, endpoint, params=None):
+    def get(self, endpoint, params=None, stream=False, raw=False):
         """
         makes a GET request
         Args:
             endpoint (str): REST API endpoint to call
             params (dict): request payload
+            stream (bool): if True parse the response incrementally while it is downloaded
+            raw (bool): if True keep the results as json bytes, decoding only the metadata
 
         Returns:
-            Response: request response
+            Response: request response, a StreamingResponse if stream is True or a RawResponse if raw is True
         """
         if self._auto_detect_post(params):
             self._logger.debug('switching to POST due to big size of params')
-            return self.post(endpoint, data=params)
-        return Response(self._make_request(endpoint,
-                              params=params,
-                              method='GET'))
-
-    def post(self, endpoint, data=None):
+            return self.post(endpoint, data=params, stream=stream, raw=raw)
+        if stream:
+            return StreamingResponse(self._make_request(endpoint,
+                                                        params=params,
+                                                        method=HTTPMethods.GET,
+                                                        stream=True))
+        response_class = RawResponse if raw else Response
+        return self._coalesced_request(response_class, endpoint, params=params, method=HTTPMethods.GET)
+
+    def post(self, endpoint, data=None, stream=False, raw=False):
         """
         makes a POST request
         Args:
             endpoint (str): REST API endpoint to call
             data (dict): request payload
+            stream (bool): if True parse the response incrementally while it is downloaded
+            raw (bool): if True keep the results as json bytes, decoding only the metadata
 
         Returns:
-            Response: request response
+            Response: request response, a StreamingResponse if stream is True or a RawResponse if raw is True
         """
-        return Response(self._make_request(endpoint,
-                               data=data,
-                               method='POST'))
+        if stream:
+            return StreamingResponse(self._make_request(endpoint,
+                                                        data=data,
+                                                        method=HTTPMethods.POST,
+                                                        stream=True))
+        response_class = RawResponse if raw else Response
+        return self._coalesced_request(response_class, endpoint, data=data, method=HTTPMethods.POST)
+
+    def _coalesced_request(self, response_class, endpoint, params=None, data=None, method=HTTPMethods.GET):
+        """
+        Makes a request to the REST API and parses its response, sharing them with identical queries made at the
+        same time if `coalesce_requests` is enabled
+
+        Args:
+            response_class: class parsing the response, Response or RawResponse
+            endpoint (str): endpoint of the REST API
+            params (dict): payload for GET request
+            data (dict): payload for POST request
+            method (HTTPMethods): request method, either HTTPMethods.GET or HTTPMethods.POST. Defaults to HTTPMethods.GET
+
+        Returns:
+            Response: the parsed response
+        """
+        def request():
+            return response_class(self._cached_request(endpoint, params=params, data=data, method=method),
+                                  json_backend=self.json_backend)
+
+        payload = params if params is not None else data
+        if not self.coalesce_requests or not isinstance(payload, (dict, type(None))):
+            return request()
+        key = (method, self._build_url(endpoint), request_key(endpoint, payload), response_class)
+        return self._in_flight.do(key, request)
+
+    def _cached_request(self, endpoint, params=None, data=None, method=HTTPMethods.GET):
+        """
+        Makes a request to the REST API, reusing the response of a logically identical query if available in the
+        client side response cache. Queries asking for `no_cache` are never cached.
+
+        Args:
+            endpoint (str): endpoint of the REST API
+            params (dict): payload for GET request
+            data (dict): payload for POST request
+            method (HTTPMethods): request method, either HTTPMethods.GET or HTTPMethods.POST. Defaults to HTTPMethods.GET
+
+        Returns:
+            a response from requests or a BufferedResponse
+        """
+        payload = params if params is not None else data
+        if not self.response_cache_size or \
+                not isinstance(payload, (dict, type(None))) or \
+                'no_cache' in (payload or {}):
+            return self._make_request(endpoint, params=params, data=data, method=method)
+        key = request_key(endpoint, payload)
+        with self._response_cache_lock:
+            cached = self._response_cache.pop(key, None)
+            if cached is not None:
+                self._response_cache[key] = cached
+                return cached
+        response = self._make_request(endpoint, params=params, data=data, method=method)
+        buffered = BufferedResponse(response.content,
+                                    headers=response.headers,
+                                    status_code=response.status_code,
+                                    encoding=response.encoding)
+        with self._response_cache_lock:
+            self._response_cache[key] = buffered
+            while len(self._response_cache) > self.response_cache_size:
+                self._response_cache.popitem(last=False)
+        return buffered
 
     def _make_request(self,
                       endpoint,
@@ -271,12 +799,14 @@ class Connection(object):
         """
 
 
-        'order params to allow efficient caching'
+        'normalise and order params to allow efficient caching'
         if params:
             if isinstance(params, dict):
-                params = sorted(params.items())
+                params = sorted(canonical_params(params, encode_booleans=True).items())
             else:
                 params = sorted(params)
+        if isinstance(data, dict):
+            data = canonical_params(data)
 
         headers['User-agent'] = 'Open Targets Python Client/%s' % str(__version__)
         response = self.session.request(method,
@@ -291,33 +821,69 @@ class Connection(object):
 
     def _get_remote_api_specs(self):
         """
-        Fetch and parse REST API documentation
+        Fetch and parse REST API documentation, using the copy stored in the cache directory when available
         """
+        remote_version = self.get_remote_version()
+        if not remote_version.startswith(API_MAJOR_VERSION):
+            self._logger.warning('The remote server is running the API with version {}, but the client expected this major version {}. They may not be compatible.'.format(remote_version, API_MAJOR_VERSION))
+
+        # pickled, as json would turn the integer keys of the YAML, E.g. response codes, into strings
+        specs_cache = PickleFileCache(os.path.join(self.cache_dir, 'api_specs'))
+        cache_key = '{}:{}|{}'.format(self.host, self.port, remote_version)
+        cached_specs = specs_cache.get(cache_key) if self.cache_api_specs else None
+        if cached_specs is not None:
+            return cached_specs
+
         r= self.session.get(self.host+':'+self.port+'/v%s/platform/swagger'%API_MAJOR_VERSION)
         r.raise_for_status()
-        self.swagger_yaml = r.text
-        self.api_specs = yaml.load(self.swagger_yaml)
-        self.endpoint_validation_data={}
-        for p, data in self.api_specs['paths'].items():
-            p=p.split('{')[0]
-            if p[-1]== '/':
-                p=p[:-1]
-            self.endpoint_validation_data[p] = {}
-            self.endpoint_validation_data['/platform' + p] = {}
-            for method, method_data in data.items():
-                if 'parameters' in method_data:
-                    params = {}
-                    for par in method_data['parameters']:
-                        par_type = par.get('type', 'string')
-                        params[par['name']]=par_type
-                    self.endpoint_validation_data[p][method] = params
-                    self.endpoint_validation_data['/platform' + p][method] = params
-
-        remote_version = self.get('/platform/public/utils/version').data
-        # TODO because content type wasnt checked proerly a float
-        # was returned instead a proper version string
-        if not str(remote_version).startswith(API_MAJOR_VERSION):
-            self._logger.warning('The remote server is running the API with version {}, but the client expected this major version {}. They may not be compatible.'.format(remote_version, API_MAJOR_VERSION))
+        api_specs, endpoint_validation_data = parse_api_specs(r.text)
+        specs = dict(swagger_yaml=r.text,
+                     api_specs=api_specs,
+                     endpoint_validation_data=endpoint_validation_data)
+        if self.cache_api_specs:
+            try:
+                specs_cache.set(cache_key, specs)
+            except (IOError, OSError) as e:
+                self._logger.warning('cannot store REST API documentation in cache: {}'.format(e))
+        return specs
+
+    def _load_api_specs(self):
+        """
+        Load the REST API documentation on first use
+
+        Returns:
+            dict: the swagger YAML, the parsed specs and the parameter validation tables
+        """
+        if self._api_specs is None:
+            with self._api_specs_lock:
+                if self._api_specs is None:
+                    self._api_specs = self._get_remote_api_specs()
+        return self._api_specs
+
+    @property
+    def swagger_yaml(self):
+        return self._load_api_specs()['swagger_yaml']
+
+    @property
+    def api_specs(self):
+        return self._load_api_specs()['api_specs']
+
+    @property
+    def endpoint_validation_data(self):
+        return self._load_api_specs()['endpoint_validation_data']
+
+    def get_remote_version(self):
+        """
+        Get the version of the REST API running on the remote server
+
+        Returns:
+            str: the remote version
+        """
+        if self._remote_version is None:
+            # TODO because content type wasnt checked proerly a float
+            # was returned instead a proper version string
+            self._remote_version = str(self.get('/platform/public/utils/version').data)
+        return self._remote_version
 
     def validate_parameter(self, endpoint, filter_type, value, method=HTTPMethods.GET):
         """
@@ -384,6 +950,127 @@ class Connection(object):
             return response.data
         return False
 
+@implements_iterator
+class PagePrefetcher(object):
+    """
+    Consumes an iterator of pages in a background thread, keeping a bounded buffer of pages ready to be used.
+    The background thread waits when the buffer is full, so a slow consumer applies backpressure on the fetching.
+    Errors raised while fetching are raised again to the consumer.
+    """
+
+    _end = object()
+
+    def __init__(self, pages, size=2):
+        """
+        Args:
+            pages (iterator): iterator of pages to consume in the background
+            size (int): maximum number of pages kept in the buffer
+        """
+        self._pages = pages
+        self._buffer = queue.Queue(maxsize=size)
+        self._stop = threading.Event()
+        # held while a page is fetched, the pages are closed by whichever thread stops the fetching
+        self._fetching = threading.Lock()
+        self._done = False
+        # the thread refers to the prefetcher weakly, so that a prefetcher abandoned by its consumer is collected
+        # and the thread stops
+        self._thread = threading.Thread(target=PagePrefetcher._run, args=(weakref.ref(self),))
+        self._thread.daemon = True
+        self._thread.start()
+
+    @staticmethod
+    def _run(ref):
+        while True:
+            prefetcher = ref()
+            if prefetcher is None or prefetcher._stop.is_set():
+                return
+            pages, buffer, stop, fetching = (prefetcher._pages, prefetcher._buffer, prefetcher._stop,
+                                             prefetcher._fetching)
+            del prefetcher
+            with fetching:
+                if stop.is_set():
+                    PagePrefetcher._close_pages(pages)
+                    return
+                try:
+                    item = (next(pages), None)
+                except StopIteration:
+                    item = (PagePrefetcher._end, None)
+                except Exception as e:
+                    # the frames of the traceback would keep the consumer of the pages alive
+                    traceback.clear_frames(e.__traceback__)
+                    item = (None, e)
+            del pages
+            if PagePrefetcher._put(ref, buffer, stop, item) and (item[0] is None or item[0] is PagePrefetcher._end):
+                return
+
+    @staticmethod
+    def _put(ref, buffer, stop, item):
+        while not stop.is_set() and ref() is not None:
+            try:
+                buffer.put(item, timeout=.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._done:
+            raise StopIteration
+        page, error = self._buffer.get()
+        if error is not None:
+            self._done = True
+            raise error
+        if page is self._end:
+            self._done = True
+            raise StopIteration
+        return page
+
+    def close(self):
+        """
+        Stop fetching pages in the background and close the iterator of pages, E.g. to stop its threads.
+        If a page is being fetched the iterator is closed by the background thread once it is fetched
+        """
+        self._stop.set()
+        self._done = True
+        if self._fetching.acquire(False):
+            try:
+                self._close_pages(self._pages)
+            finally:
+                self._fetching.release()
+
+    @staticmethod
+    def _close_pages(pages):
+        if hasattr(pages, 'close'):
+            pages.close()
+
+
+@implements_iterator
+class _StreamedRecords(object):
+    """
+    Iterator over the records of a StreamingResponse, exposing the response metadata once it is exhausted
+    """
+
+    def __init__(self, response):
+        self._response = response
+        self._records = response.iter_data()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._records)
+
+    @property
+    def info(self):
+        return self._response.info
+
+    def close(self):
+        self._response.close()
+
+
 @implements_iterator
 class IterableResult(object):
     '''
@@ -400,6 +1087,16 @@ class IterableResult(object):
         self.conn = conn
         self.method = method
         self._search_after_last = None
+        self._prefetch = 0
+        self._parallel = 0
+        self._ordered = True
+        self._stream = False
+        self._raw = False
+        self._pages = None
+        self._records = None
+        self._boundary = None
+
+    _resumable = True
 
     def __call__(self, *args, **kwargs):
         """
@@ -414,9 +1111,13 @@ class IterableResult(object):
         """
         self._args = args
         self._kwargs = kwargs
-        response = self._make_call()
+        self._close_pages()
+        self._records = None
+        self._boundary = None
+        response = self._make_call(raw=self._raw)
         self.info = response.info
         self._data = response.data
+        self._cursor = 0
         if 'next_' in response.info:
             self._search_after_last = response.info.next_
         self.current = 0
@@ -429,6 +1130,23 @@ class IterableResult(object):
         finally:
             return self
 
+    def prefetch(self, pages=2):
+        """
+        Fetch the next pages of results in a background thread while the current one is consumed, so that network
+        time and processing time overlap.
+
+        Args:
+            pages (int): maximum number of pages to keep buffered. When the buffer is full the background fetching
+                waits for the consumer. 0 disables prefetching.
+        Returns:
+            IterableResult: returns itself
+        """
+        if pages < 0:
+            raise AttributeError('number of pages to prefetch cannot be negative')
+        self._close_pages()
+        self._prefetch = pages
+        return self
+
     def filter(self, **kwargs):
         """
         Applies a set of filters to the current query
@@ -445,44 +1163,256 @@ class IterableResult(object):
         return self
 
 
-    def _make_call(self):
+    def parallel(self, workers=4, ordered=True):
+        """
+        Fetch the remaining pages of results concurrently, splitting the results in offset ranges.
+        Applies only when the total number of results is known and the REST API did not return a search after
+        token, otherwise pages are fetched one after the other.
+
+        Args:
+            workers (int): number of pages fetched at the same time. The connection ``pool_maxsize`` should be at
+                least as big to reuse the connections
+            ordered (bool): if True results are returned in the same order as a sequential iteration. If False
+                pages are returned as soon as they are fetched
+        Returns:
+            IterableResult: returns itself
+        """
+        if workers < 0:
+            raise AttributeError('number of parallel workers cannot be negative')
+        self._close_pages()
+        self._parallel = workers
+        self._ordered = ordered
+        return self
+
+    def stream(self, enabled=True):
+        """
+        Parse the next pages of results incrementally while they are downloaded, keeping in memory only the record
+        being returned instead of a full page. Prefetching and parallel fetching are not used when streaming.
+
+        Args:
+            enabled (bool): if False pages are parsed as a whole
+        Returns:
+            IterableResult: returns itself
+        """
+        if enabled:
+            self.raw(False)
+        self._close_pages()
+        self._stream = enabled
+        return self
+
+    def raw(self, enabled=True):
+        """
+        Return each result as the json bytes it is encoded with in the REST API response, without decoding it.
+        Only the metadata of each page is decoded, which makes saving results as json lines much cheaper.
+        Streaming is not used for raw results.
+
+        Args:
+            enabled (bool): if False results are decoded
+        Returns:
+            IterableResult: returns itself
+        """
+        self._close_pages()
+        if enabled != self._raw and isinstance(getattr(self, '_data', None), list):
+            backend = self._json_backend
+            if enabled:
+                self._data = [backend.dumpb(i) for i in self._data]
+            else:
+                self._data = [backend.loads(i) for i in self._data]
+        self._raw = enabled
+        if enabled:
+            self._stream = False
+        return self
+
+    def _make_call(self, params=None, stream=False, raw=False):
         """
         makes calls to the REST API
+        Args:
+            params (dict): parameters for the call. Defaults to the parameters of the query
+            stream (bool): if True return a StreamingResponse
+            raw (bool): if True return a RawResponse
         Returns:
             Response: response for a call
         Raises:
             AttributeError: if HTTP method is not supported
         """
+        if params is None:
+            params = self._kwargs
+        call_kwargs = {}
+        if stream:
+            call_kwargs['stream'] = True
+        if raw:
+            call_kwargs['raw'] = True
         if self.method == HTTPMethods.GET:
-            return self.conn.get(*(self._args), params=self._kwargs)
+            return self.conn.get(*(self._args), params=params, **call_kwargs)
         elif self.method == HTTPMethods.POST:
-            return self.conn.post(*self._args, data=self._kwargs)
+            return self.conn.post(*self._args, data=params, **call_kwargs)
         else:
             raise AttributeError("HTTP method {} is not supported".format(self.method))
 
+    def _position(self):
+        """
+        Returns:
+            tuple: the number of results already fetched, including those not consumed yet, and the search after
+                token of the last page fetched
+        """
+        return self.current + len(self._data) - self._cursor, self._search_after_last
+
+    def _fetch_pages(self, position):
+        """
+        Fetch the pages following the one already loaded, using the search after token when available and the
+        offset otherwise. When streaming, a page must be read completely before asking for the next one.
+
+        Args:
+            position (tuple): the position to start from, see ``IterableResult._position``. It is taken by the
+                consumer, as the pages can be fetched by another thread while the results are consumed
+        Returns:
+            iterator: an iterator of Response objects
+        """
+        params = dict(self._kwargs)
+        params['no_cache'] = 'true'
+        params['size'] = 1000
+        fetched, search_after = position
+        while fetched < self.total:
+            if search_after:
+                params['from'] = 0
+                params['next'] = search_after
+            else:
+                params['from'] = fetched
+            call_output = self._make_call(params, stream=self._stream, raw=self._raw)
+            if self._stream:
+                yield call_output
+                page_size = call_output.count
+            else:
+                page_size = len(call_output.data)
+                if page_size:
+                    yield call_output
+            if not page_size:
+                return
+            if 'next_' in call_output.info:
+                search_after = call_output.info.next_
+            fetched += page_size
+
+    def _fetch_pages_parallel(self, position):
+        """
+        Fetch the pages following the one already loaded by offset, with a pool of threads.
+        At most two pages per worker are requested ahead of the consumer.
+
+        Args:
+            position (tuple): the position to start from, see ``IterableResult._position``
+        Returns:
+            iterator: an iterator of Response objects
+        """
+        params = dict(self._kwargs)
+        params['no_cache'] = 'true'
+        params['size'] = 1000
+        offsets = iter(range(position[0], self.total, params['size']))
+
+        def fetch_page(offset):
+            page_params = dict(params)
+            page_params['from'] = offset
+            return self._make_call(page_params, raw=self._raw)
+
+        executor = ThreadPoolExecutor(max_workers=self._parallel)
+        pending = deque()
+        try:
+            for offset in islice(offsets, self._parallel * 2):
+                pending.append(executor.submit(fetch_page, offset))
+            while pending:
+                if self._ordered:
+                    future = pending.popleft()
+                    call_output = future.result()
+                    if not call_output.data:
+                        return
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    future = done.pop()
+                    pending.remove(future)
+                    call_output = future.result()
+                for offset in islice(offsets, 1):
+                    pending.append(executor.submit(fetch_page, offset))
+                if call_output.data:
+                    yield call_output
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def _seek(self, current, search_after=None):
+        """
+        Continue the query from a position previously reached, without fetching the results before it
+
+        Args:
+            current (int): number of results already consumed
+            search_after: search after token returned with the page ending at the position, if any
+        """
+        self._close_pages()
+        self._data = []
+        self._cursor = 0
+        self.current = current
+        self._search_after_last = search_after
+        self._boundary = (current, search_after)
+
+    def close(self):
+        """
+        Stop fetching results, E.g. when the iteration is abandoned before the end. Pages fetched in the background
+        are discarded
+        """
+        self._close_pages()
+
+    def __del__(self):
+        if getattr(self, '_pages', None) is not None or getattr(self, '_records', None) is not None:
+            self._close_pages()
+
+    def _close_pages(self):
+        if self._pages is not None:
+            self._pages.close()
+        self._pages = None
+        if self._records is not None:
+            self._records.close()
+        self._records = None
+
     def __iter__(self):
         return self
 
     def __next__(self):
         if self.current < self.total:
-            if not self._data:
-                if self._search_after_last:
-                    self._kwargs['from'] = 0
-                    self._kwargs['next'] = self._search_after_last
+            if self._pages is None:
+                position = self._position()
+                if self._stream:
+                    self._pages = self._fetch_pages(position)
+                elif self._parallel and not self._search_after_last:
+                    self._pages = self._fetch_pages_parallel(position)
                 else:
-                    self._kwargs['from'] = self.current
-                self._kwargs['no_cache']='true'
-                self._kwargs['size'] = 1000
-                call_output = self._make_call()
-                if not call_output.data:
+                    self._pages = self._fetch_pages(position)
+                if self._prefetch and not self._stream:
+                    self._pages = PagePrefetcher(self._pages, self._prefetch)
+            while self._cursor >= len(self._data):
+                if self._records is not None:
+                    d = next(self._records, None)
+                    if d is not None:
+                        self.current += 1
+                        return d
+                    if 'next_' in self._records.info:
+                        self._search_after_last = self._records.info.next_
+                    self._records = None
+                self._boundary = (self.current, self._search_after_last)
+                call_output = next(self._pages, None)
+                if call_output is None:
+                    self._close_pages()
                     raise StopIteration
+                if isinstance(call_output, StreamingResponse):
+                    self._records = _StreamedRecords(call_output)
+                    continue
                 if 'next_' in call_output.info:
                     self._search_after_last = call_output.info.next_
                 self._data = call_output.data
-            d = self._data.pop(0)
+                self._cursor = 0
+            d = self._data[self._cursor]
+            self._cursor += 1
             self.current+=1
             return d
         else:
+            self._close_pages()
             raise StopIteration()
 
     def __len__(self):
@@ -529,6 +1459,10 @@ class IterableResult(object):
         """
         self.conn.validate_parameter(self._args[0], filter_type, value)
 
+    @property
+    def _json_backend(self):
+        return getattr(self.conn, 'json_backend', None) or get_json_backend()
+
     def to_json(self,iterable=True, **kwargs):
         """
 
@@ -542,16 +1476,19 @@ class IterableResult(object):
             an iterator of json strings or a single json string
         """
         if iterable:
-            return (json.dumps(i) for i in self)
+            return (self._json_backend.dumps(i) for i in self)
         return IterableResultSimpleJSONEncoder(**kwargs).encode(self)
 
 
-    def to_dataframe(self, compress_lists = False,**kwargs):
+    def to_dataframe(self, compress_lists = False, chunk_size = 10000, **kwargs):
         """
         Create a Pandas dataframe from a flattened version of the response.
+        Values are added to per column buffers as they are fetched, and turned into a dataframe every chunk_size
+        rows, so that only the final dataframe and one chunk of python objects are held in memory.
 
         Args:
             compress_lists: if a value is a list, serialise it to a string with '|' as separator
+            chunk_size (int): number of rows buffered before being converted to a dataframe
         Keyword Args:
             **kwargs: forwarded to pandas.DataFrame.from_dict
 
@@ -564,14 +1501,38 @@ class IterableResult(object):
 
         """
         if pandas_available:
-            data = [flatten(i) for i in self]
-            if compress_lists:
-                data = [compress_list_values(i) for i in data]
-
-            return pandas.DataFrame.from_dict(data,  **kwargs)
+            from opentargets.export import DataFrameBuilder
+            builder = DataFrameBuilder(chunk_size=chunk_size, compress_lists=compress_lists, **kwargs)
+            for i in self:
+                builder.add(i)
+            return builder.to_dataframe()
         else:
             raise ImportError('Pandas library is not installed but is required to create a dataframe')
 
+    def iter_dataframes(self, compress_lists = False, chunk_size = 10000, **kwargs):
+        """
+        Yield Pandas dataframes of chunk_size rows from a flattened version of the response, to process results
+        bigger than the available memory.
+
+        Args:
+            compress_lists: if a value is a list, serialise it to a string with '|' as separator
+            chunk_size (int): number of rows in each dataframe
+        Keyword Args:
+            **kwargs: forwarded to pandas.DataFrame.from_dict
+
+        Returns:
+            iterator: an iterator of pandas.DataFrame
+        Notes:
+            Requires Pandas to be installed.
+        Raises:
+            ImportError: if Pandas is not available
+        """
+        if not pandas_available:
+            raise ImportError('Pandas library is not installed but is required to create a dataframe')
+        from opentargets.export import DataFrameBuilder
+        builder = DataFrameBuilder(chunk_size=chunk_size, compress_lists=compress_lists, **kwargs)
+        return builder.iter_dataframes(self)
+
     def to_csv(self, **kwargs):
         """
         Create a csv file from a flattened version of the response.
@@ -608,6 +1569,73 @@ class IterableResult(object):
         else:
             raise ImportError('xlwt library is not installed but is required to create an excel file')
 
+    def to_parquet(self, path, row_group_size=10000, schema=None, **kwargs):
+        """
+        Save all the results to a parquet file, writing a row group at a time as results are fetched.
+        Nested fields, E.g. association_score.datatypes, are stored as typed struct and list columns.
+
+        Args:
+            path (str): path of the parquet file
+            row_group_size (int): number of rows in each row group
+            schema (pyarrow.Schema): schema of the file. If None it is inferred from the results, see
+                ``opentargets.export.ArrowTableBuilder``
+        Keyword Args:
+            **kwargs: forwarded to ``opentargets.export.write_parquet`` and pyarrow.parquet.ParquetWriter.
+                E.g. infer_rows, compression
+        Returns:
+            int: number of rows written
+        Notes:
+            Requires pyarrow to be installed.
+        Raises:
+            ImportError: if pyarrow is not available
+            ValueError: if results do not fit the schema
+        """
+        from opentargets.export import write_parquet
+        return write_parquet(self, path, row_group_size=row_group_size, schema=schema, **kwargs)
+
+    def to_ipc(self, path, batch_size=10000, schema=None, stream=False, **kwargs):
+        """
+        Save all the results to an Arrow IPC (feather) file, writing a record batch at a time as results are fetched.
+        Nested fields are stored as typed struct and list columns.
+
+        Args:
+            path (str): path of the arrow file
+            batch_size (int): number of rows in each record batch
+            schema (pyarrow.Schema): schema of the file. If None it is inferred from the results, see
+                ``opentargets.export.ArrowTableBuilder``
+            stream (bool): if True use the IPC streaming format instead of the random access file format
+        Keyword Args:
+            **kwargs: forwarded to ``opentargets.export.write_ipc`` and pyarrow.ipc.IpcWriteOptions.
+                E.g. infer_rows, compression
+        Returns:
+            int: number of rows written
+        Notes:
+            Requires pyarrow to be installed.
+        Raises:
+            ImportError: if pyarrow is not available
+            ValueError: if results do not fit the schema
+        """
+        from opentargets.export import write_ipc
+        return write_ipc(self, path, batch_size=batch_size, schema=schema, stream=stream, **kwargs)
+
+    def to_score_matrix(self, directory, datatypes=None):
+        """
+        Save association scores to a sparse target x disease matrix, memory mapped when read.
+        See ``opentargets.matrix.ScoreMatrix``
+
+        Args:
+            directory (str): directory the matrix is written to
+            datatypes (list): datatypes stored as layers. If None a layer is added for every datatype found
+        Returns:
+            ScoreMatrix: the matrix written
+        Notes:
+            Requires numpy to be installed.
+        Raises:
+            ImportError: if numpy is not available
+        """
+        from opentargets.matrix import build_score_matrix
+        return build_score_matrix(self, directory, datatypes=datatypes)
+
     def to_object(self):
         """
         Converts dictionary in the data to an addict object. Useful for interactive data exploration on IPython
@@ -617,21 +1645,143 @@ class IterableResult(object):
         """
         return (addict.Dict(i) for i in self)
 
-    def to_file(self, filename, compress=True, progress_bar = False):
-        if compress:
-            fh = gzip.open(filename, 'wb')
-        else:
-            fh = open(filename, 'wb')
-        if tqdm_available and progress_bar:
-            progress = tqdm(desc='Saving entries to file %s'%filename,
-                       total=len(self),
-                       unit_scale=True)
-        for datapoint in self:
-            line = json.dumps(datapoint)+'\n'
-            fh.write(line.encode('utf-8'))
+    def to_file(self, filename, compress=True, progress_bar = False, level=None, threads=1, resume=False,
+                checkpoint=None, raw=False):
+        """
+        Save all the results to a file with a json object per line
+
+        Args:
+            filename (str): path of the output file
+            compress: False to write uncompressed data, 'gzip' (or True) or 'zstd'
+            progress_bar (bool): if True display a progress bar, requires tqdm
+            level (int): compression level. Defaults to 9 for gzip and 3 for zstd
+            threads (int): number of threads compressing data
+            resume (bool): if True record the position of the query and of the output file in a checkpoint after
+                each page, and continue from the last checkpoint of an interrupted call with the same query. The
+                checkpoint is removed when all the results are saved
+            checkpoint (str): path of the checkpoint file. Defaults to the output path with a .checkpoint suffix
+            raw (bool): if True save the results as encoded by the REST API, without decoding them. See ``raw``
+        Notes:
+            zstd compression requires zstandard to be installed.
+            Gzip files compressed with many threads or resumable are made of many gzip members, read by gunzip and
+            ``gzip.open`` as a single stream
+        Raises:
+            AttributeError: if resume is requested for results not fetched in order
+        """
+        from opentargets.export import Checkpoint, open_output
+        with self._raw_export(raw):
+            encode = self._encoder()
+            if resume:
+                if not self._resumable or (self._parallel and not self._ordered):
+                    raise AttributeError('only results fetched in order can be resumed')
+                checkpoint = Checkpoint(checkpoint or filename + '.checkpoint')
+                query = self._query_key()
+                state = checkpoint.load()
+                position = None
+                if state is not None:
+                    if state.get('query') == query and os.path.exists(filename) and \
+                            state['position'] <= os.path.getsize(filename):
+                        self._seek(state['current'], state['next'])
+                        position = state['position']
+                        logger.info('resuming %s from result %i', filename, self.current)
+                    else:
+                        logger.warning('checkpoint %s does not match the query or the output file, saving from the '
+                                       'first result', checkpoint.path)
+                if position is None and (self.current or self._cursor):
+                    self._seek(0)
+                fh = open_output(filename, compress=compress, level=level, threads=threads, position=position,
+                                 resumable=True)
+                if position is None:
+                    checkpoint.save(dict(query=query, current=0, next=None, position=0))
+            else:
+                fh = open_output(filename, compress=compress, level=level, threads=threads)
             if tqdm_available and progress_bar:
-                progress.update()
-        fh.close()
+                progress = tqdm(desc='Saving entries to file %s'%filename,
+                           total=len(self),
+                           initial=self.current,
+                           unit_scale=True)
+            boundary = self._boundary
+            try:
+                for datapoint in self:
+                    if resume and self._boundary is not boundary:
+                        boundary = self._boundary
+                        checkpoint.save(dict(query=query, current=boundary[0], next=boundary[1], position=fh.sync()))
+                    fh.write(encode(datapoint) + b'\n')
+                    if tqdm_available and progress_bar:
+                        progress.update()
+            finally:
+                fh.close()
+            if resume:
+                checkpoint.remove()
+
+    def to_shards(self, directory, max_records=None, max_bytes=64 * 1024 * 1024, compress=True, level=None,
+                  workers=2, prefix='part', raw=False):
+        """
+        Save all the results in many files with a json object per line, rolling to a new file every max_records
+        results or max_bytes bytes. Files are compressed in parallel and listed in a manifest.json file with their
+        number of results and sha256 checksum as soon as they are complete, so that they can be processed while the
+        others are downloaded. See ``opentargets.export.ShardedWriter``
+
+        Args:
+            directory (str): directory storing the files and the manifest
+            max_records (int): maximum number of results in a file
+            max_bytes (int): maximum size of the uncompressed data in a file
+            compress: False to write uncompressed data, 'gzip' (or True) or 'zstd'
+            level (int): compression level. Defaults to 9 for gzip and 3 for zstd
+            workers (int): number of files compressed at the same time
+            prefix (str): prefix of the file names
+            raw (bool): if True save the results as encoded by the REST API, without decoding them. See ``raw``
+        Returns:
+            dict: the manifest
+        """
+        from opentargets.export import ShardedWriter
+        with self._raw_export(raw):
+            encode = self._encoder()
+            writer = ShardedWriter(directory, max_records=max_records, max_bytes=max_bytes, compress=compress,
+                                   level=level, workers=workers, prefix=prefix, metadata=dict(total=len(self)))
+            complete = False
+            try:
+                for datapoint in self:
+                    writer.write(encode(datapoint) + b'\n')
+                complete = True
+            finally:
+                writer.close(complete=complete)
+            return writer.manifest
+
+    @contextmanager
+    def _raw_export(self, raw):
+        """
+        Save raw results during an export if requested, then restore the previous mode of the results
+        """
+        previous = self._raw, self._stream
+        if raw:
+            self.raw()
+        try:
+            yield
+        finally:
+            if raw and (self._raw, self._stream) != previous:
+                if previous[1]:
+                    self.stream()
+                else:
+                    self.raw(previous[0])
+
+    def _encoder(self):
+        """
+        Returns:
+            function: encoding a result to json bytes. Raw results are returned unchanged
+        """
+        dumpb = self._json_backend.dumpb
+        if not self._raw:
+            return dumpb
+        return lambda datapoint: datapoint if isinstance(datapoint, bytes) else dumpb(datapoint)
+
+    def _query_key(self):
+        """
+        Returns:
+            str: a key identifying the query, independent of the position reached
+        """
+        params = dict((k, v) for k, v in self._kwargs.items() if k not in ('from', 'next', 'no_cache'))
+        return '{}:{}'.format(self.method, request_key(self._args[0] if self._args else '', params))
 
 
 class IterableResultSimpleJSONEncoder(JSONEncoder):
@@ -0,0 +1,915 @@
+"""
+This module contains helpers to export results from the REST API to other formats while they are fetched, without
+holding all the results in memory.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from opentargets.conn import flatten, compress_list_values
+
+try:
+    import pandas
+    pandas_available = True
+except ImportError:
+    pandas_available = False
+
+try:
+    import zstandard
+    zstandard_available = True
+except ImportError:
+    zstandard_available = False
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+    pyarrow_available = True
+except ImportError:
+    pyarrow_available = False
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.WARNING)
+
+MISSING = float('nan')
+
+_replace = getattr(os, 'replace', os.rename)
+
+
+class _LayoutMismatch(Exception):
+    """
+    Raised by a compiled extractor when a record has keys or nested dictionaries not in the layout
+    """
+
+
+class _LayoutNode(object):
+    """
+    A key of the layout of the records. mapping is True if the value was found to be a dictionary
+    """
+
+    __slots__ = ('children', 'mapping')
+
+    def __init__(self):
+        self.children = OrderedDict()
+        self.mapping = False
+
+
+class Flattener(object):
+    """
+    Flattens nested dictionaries as ``opentargets.conn.flatten``, for records sharing the same layout of keys.
+    The layout is learnt from the records and compiled in a function extracting all the values without recursion
+    and without building key strings. Records with keys not seen before are flattened by
+    ``opentargets.conn.flatten`` and their keys added to the layout, which is compiled again.
+
+    Notes:
+        only ``dict`` values are flattened, other mappings are treated as values
+    """
+
+    def __init__(self, separator='.', max_paths=10000):
+        """
+        Args:
+            separator (str): separator between nested keys
+            max_paths (int): maximum number of keys in the layout. Records are flattened by
+                ``opentargets.conn.flatten`` once the layout grows bigger, E.g. if keys are identifiers
+        """
+        self.separator = separator
+        self.max_paths = max_paths
+        self._root = _LayoutNode()
+        self._root.mapping = True
+        self._paths = 0
+        self._extract = None
+        self.compilations = 0
+
+    def flatten(self, record):
+        """
+        Args:
+            record (dict): dictionary
+        Returns:
+            dict: a flattened dictionary
+        """
+        if self._extract is not None:
+            try:
+                return self._extract(record)
+            except _LayoutMismatch:
+                pass
+        if self._paths <= self.max_paths:
+            self._learn(self._root, record)
+            if self._paths <= self.max_paths:
+                self._compile()
+            else:
+                self._extract = None
+        return flatten(record, separator=self.separator)
+
+    __call__ = flatten
+
+    def _learn(self, node, d):
+        node.mapping = True
+        for k, v in d.items():
+            child = node.children.get(k)
+            if child is None:
+                child = node.children[k] = _LayoutNode()
+                self._paths += 1
+            if isinstance(v, dict):
+                self._learn(child, v)
+
+    def _compile(self):
+        lines = ['def extract(d0):',
+                 '    out = {}']
+        self._emit(self._root, 0, '', lines, 1)
+        lines.append('    return out')
+        namespace = {'M': _MISSING_KEY, '_LayoutMismatch': _LayoutMismatch}
+        try:
+            exec(compile('\n'.join(lines), '<flattener>', 'exec'), namespace)
+        except (SyntaxError, RecursionError, MemoryError):
+            logger.debug('layout too deep to compile, using generic flattening')
+            self._extract = None
+            self._paths = self.max_paths + 1
+            return
+        self._extract = namespace['extract']
+        self.compilations += 1
+
+    def _emit(self, node, depth, prefix, lines, indent):
+        """
+        Write the code extracting the values of a dictionary in variable d<depth>. Keys found in the dictionary
+        are counted, so that keys not in the layout are detected comparing the count with the dictionary size
+        """
+        pad = '    ' * indent
+        d, v, n = 'd{}'.format(depth), 'd{}'.format(depth + 1), 'n{}'.format(depth)
+        lines.append('{}{} = 0'.format(pad, n))
+        for key, child in node.children.items():
+            flat_key = prefix + self.separator + key if prefix else key
+            lines.append('{}{} = {}.get({!r}, M)'.format(pad, v, d, key))
+            lines.append('{}if {} is not M:'.format(pad, v))
+            lines.append('{}    {} += 1'.format(pad, n))
+            if child.mapping:
+                lines.append('{}    if isinstance({}, dict):'.format(pad, v))
+                self._emit(child, depth + 1, flat_key, lines, indent + 2)
+                lines.append('{}    else:'.format(pad))
+                lines.append('{}        out[{!r}] = {}'.format(pad, flat_key, v))
+            else:
+                lines.append('{}    if isinstance({}, dict):'.format(pad, v))
+                lines.append('{}        raise _LayoutMismatch'.format(pad))
+                lines.append('{}    out[{!r}] = {}'.format(pad, flat_key, v))
+        lines.append('{}if {} != len({}):'.format(pad, n, d))
+        lines.append('{}    raise _LayoutMismatch'.format(pad))
+
+
+_MISSING_KEY = object()
+
+
+class DataFrameBuilder(object):
+    """
+    Builds a Pandas dataframe from a stream of records. Each record is flattened and its values appended to per
+    column buffers, that are converted to a dataframe every chunk_size rows.
+    Records can have different fields, missing values are set to NaN as in ``pandas.DataFrame.from_dict``.
+    """
+
+    def __init__(self, chunk_size=10000, compress_lists=False, **kwargs):
+        """
+        Args:
+            chunk_size (int): number of rows buffered before being converted to a dataframe
+            compress_lists (bool): if a value is a list, serialise it to a string with '|' as separator
+        Keyword Args:
+            **kwargs: forwarded to pandas.DataFrame.from_dict
+        Raises:
+            ImportError: if Pandas is not available
+        """
+        if not pandas_available:
+            raise ImportError('Pandas library is not installed but is required to create a dataframe')
+        self.chunk_size = chunk_size
+        self.compress_lists = compress_lists
+        self._kwargs = kwargs
+        self._flatten = Flattener()
+        self._columns = {}
+        self._column_order = []
+        self._rows = 0
+        self._chunks = []
+
+    def add(self, record):
+        """
+        Add a record to the dataframe
+
+        Args:
+            record (dict): a nested dictionary, flattened with a ``Flattener``
+        """
+        flat = self._flatten(record)
+        if self.compress_lists:
+            flat = compress_list_values(flat)
+        for k, v in flat.items():
+            column = self._columns.get(k)
+            if column is None:
+                column = self._columns[k] = []
+                self._column_order.append(k)
+            if len(column) < self._rows:
+                column.extend([MISSING] * (self._rows - len(column)))
+            column.append(v)
+        self._rows += 1
+        if self._rows >= self.chunk_size:
+            self._chunks.append(self._flush())
+
+    def _flush(self):
+        """
+        Convert the buffered rows to a dataframe and empty the buffers
+
+        Returns:
+            pandas.DataFrame: the buffered rows
+        """
+        for column in self._columns.values():
+            if len(column) < self._rows:
+                column.extend([MISSING] * (self._rows - len(column)))
+        chunk = pandas.DataFrame.from_dict(dict((k, self._columns[k]) for k in self._column_order), **self._kwargs)
+        self._columns = {}
+        self._column_order = []
+        self._rows = 0
+        return chunk
+
+    def iter_dataframes(self, records):
+        """
+        Add records and yield a dataframe every chunk_size rows
+
+        Args:
+            records (iterator): records to add
+
+        Returns:
+            iterator: an iterator of pandas.DataFrame
+        """
+        for record in records:
+            self.add(record)
+            while self._chunks:
+                yield self._chunks.pop(0)
+        if self._rows:
+            yield self._flush()
+
+    def to_dataframe(self):
+        """
+        Returns:
+            pandas.DataFrame: a dataframe with all the records added
+        """
+        if self._rows or not self._chunks:
+            self._chunks.append(self._flush())
+        chunks, self._chunks = self._chunks, []
+        if len(chunks) == 1:
+            return chunks[0]
+        return pandas.concat(chunks, ignore_index=True, sort=False)
+
+
+def _has_null_type(data_type):
+    """
+    Returns:
+        bool: True if a type is null or has null nested types, so that its type is not known yet
+    """
+    if pyarrow.types.is_null(data_type):
+        return True
+    if pyarrow.types.is_struct(data_type):
+        return any(_has_null_type(data_type.field(i).type) for i in range(data_type.num_fields))
+    if pyarrow.types.is_list(data_type) or pyarrow.types.is_large_list(data_type):
+        return _has_null_type(data_type.value_type)
+    return False
+
+
+def _extends(data_type, other):
+    """
+    Returns:
+        bool: True if other has the same values of a type, adding struct fields or giving a type to null types
+    """
+    if data_type.equals(other) or pyarrow.types.is_null(data_type):
+        return True
+    if pyarrow.types.is_struct(data_type) and pyarrow.types.is_struct(other):
+        names = [other.field(i).name for i in range(other.num_fields)]
+        return all(data_type.field(i).name in names and
+                   _extends(data_type.field(i).type, other.field(other.get_field_index(data_type.field(i).name)).type)
+                   for i in range(data_type.num_fields))
+    if pyarrow.types.is_list(data_type) and pyarrow.types.is_list(other):
+        return _extends(data_type.value_type, other.value_type)
+    return False
+
+
+def _conform(table, schema):
+    """
+    Convert a table to a schema extending its own
+    """
+    if table.schema.equals(schema):
+        return table
+    return pyarrow.Table.from_pylist(table.to_pylist(), schema=schema)
+
+
+class ArrowTableBuilder(object):
+    """
+    Converts a stream of records to pyarrow tables of batch_size rows, keeping nested dictionaries and lists as
+    struct and list columns.
+    The schema can be given, then all the tables share it, or is inferred from the records. An inferred schema is
+    extended when fields missing or only null so far are found, and the tables built afterwards have the extended
+    schema. Tables are held back while fields are only null, up to infer_rows rows, so that the schema is rarely
+    extended after the first tables.
+    """
+
+    def __init__(self, batch_size=10000, schema=None, infer_rows=100000):
+        """
+        Args:
+            batch_size (int): number of rows in each table
+            schema (pyarrow.Schema): schema of the tables. If None it is inferred from the records
+            infer_rows (int): maximum number of rows held back while fields are only null
+        Raises:
+            ImportError: if pyarrow is not available
+        """
+        if not pyarrow_available:
+            raise ImportError('pyarrow library is not installed but is required to export to parquet or arrow')
+        self.batch_size = batch_size
+        self.schema = schema
+        self.infer_rows = infer_rows
+        self._fixed = schema is not None
+
+    def _to_table(self, records):
+        """
+        Convert records to a table with the builder schema, extending it if it is inferred
+
+        Raises:
+            ValueError: if records have fields or types not in the schema
+        """
+        try:
+            table = pyarrow.Table.from_pylist(records)
+            if self.schema is None:
+                self.schema = table.schema
+                return table
+            if table.schema.equals(self.schema):
+                return table
+            unified = pyarrow.unify_schemas([self.schema, table.schema], promote_options='permissive')
+        except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError) as e:
+            raise ValueError('records cannot be converted to the export schema: {}'.format(e))
+        if not unified.equals(self.schema):
+            if self._fixed or not all(_extends(i.type, unified.field(i.name).type) for i in self.schema):
+                raise ValueError('records have fields or types not in the schema of the previous rows, pass a schema '
+                                 'including them. A schema fitting all the rows so far is:\n{}'.format(unified))
+            self.schema = unified
+        return pyarrow.Table.from_pylist(records, schema=self.schema)
+
+    def iter_tables(self, records):
+        """
+        Args:
+            records (iterator): records to convert
+
+        Returns:
+            iterator: an iterator of pyarrow.Table
+        """
+        held = []
+        held_rows = 0
+        inferring = not self._fixed
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) < self.batch_size:
+                continue
+            table = self._to_table(batch)
+            batch = []
+            if not inferring:
+                yield table
+                continue
+            held.append(table)
+            held_rows += table.num_rows
+            if held_rows >= self.infer_rows or not any(_has_null_type(i.type) for i in self.schema):
+                inferring = False
+                for table in held:
+                    yield _conform(table, self.schema)
+                held = []
+        if batch:
+            held.append(self._to_table(batch))
+        for table in held:
+            yield _conform(table, self.schema)
+
+
+class _ArrowFileWriter(object):
+    """
+    Writes tables to a temporary file, which replaces the file at path when closed.
+    When the schema of the tables is extended the tables already written are written again with the new schema.
+    """
+
+    def __init__(self, path, new_writer, read_tables, **kwargs):
+        """
+        Args:
+            path (str): path of the file
+            new_writer: function of a path and a schema, returning a writer with write_table and close methods
+            read_tables: function of a path, yielding the tables written to it
+        Keyword Args:
+            **kwargs: forwarded to the write_table method of the writer
+        """
+        self.path = path
+        self.schema = None
+        self._new_writer = new_writer
+        self._read_tables = read_tables
+        self._kwargs = kwargs
+        self._writer = None
+        self._tmp_path = None
+
+    def _open(self, schema):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix='.tmp')
+        os.close(fd)
+        try:
+            writer = self._new_writer(tmp_path, schema)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return writer, tmp_path
+
+    def write_table(self, table):
+        if self._writer is None:
+            self._writer, self._tmp_path = self._open(table.schema)
+        elif not table.schema.equals(self.schema):
+            logger.debug('export schema extended, rewriting %s', self.path)
+            self._writer.close()
+            writer, tmp_path = self._open(table.schema)
+            try:
+                for written in self._read_tables(self._tmp_path):
+                    writer.write_table(_conform(written, table.schema), **self._kwargs)
+            except BaseException:
+                writer.close()
+                os.remove(tmp_path)
+                raise
+            finally:
+                os.remove(self._tmp_path)
+            self._writer, self._tmp_path = writer, tmp_path
+        self.schema = table.schema
+        self._writer.write_table(table, **self._kwargs)
+
+    def close(self, schema=None):
+        """
+        Close the file and move it to path
+
+        Args:
+            schema (pyarrow.Schema): schema of the file if no table was written
+        """
+        if self._writer is None:
+            self._writer, self._tmp_path = self._open(schema or pyarrow.schema([]))
+        self._writer.close()
+        _replace(self._tmp_path, self.path)
+        self._writer = None
+
+    def abort(self):
+        """
+        Close and remove the temporary file
+        """
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            finally:
+                os.remove(self._tmp_path)
+                self._writer = None
+
+
+def _write_tables(builder, records, writer):
+    rows = 0
+    try:
+        for table in builder.iter_tables(records):
+            writer.write_table(table)
+            rows += table.num_rows
+        writer.close(builder.schema)
+    except BaseException:
+        writer.abort()
+        raise
+    return rows
+
+
+def write_parquet(records, path, row_group_size=10000, schema=None, infer_rows=100000, **kwargs):
+    """
+    Write records to a parquet file, a row group at a time.
+    The file is written to a temporary file moved to path once complete
+
+    Args:
+        records (iterator): records to write
+        path (str): path of the parquet file
+        row_group_size (int): number of rows in each row group
+        schema (pyarrow.Schema): schema of the file. If None it is inferred from the records, see
+            ``ArrowTableBuilder``
+        infer_rows (int): maximum number of rows held in memory while fields are only null
+    Keyword Args:
+        **kwargs: forwarded to pyarrow.parquet.ParquetWriter
+    Returns:
+        int: number of rows written
+    Raises:
+        ImportError: if pyarrow is not available
+        ValueError: if records do not fit the schema
+    """
+    builder = ArrowTableBuilder(batch_size=row_group_size, schema=schema, infer_rows=infer_rows)
+
+    def new_writer(tmp_path, file_schema):
+        return pyarrow.parquet.ParquetWriter(tmp_path, file_schema, **kwargs)
+
+    def read_tables(tmp_path):
+        with open(tmp_path, 'rb') as fh:
+            parquet_file = pyarrow.parquet.ParquetFile(fh)
+            for i in range(parquet_file.num_row_groups):
+                yield parquet_file.read_row_group(i)
+
+    writer = _ArrowFileWriter(path, new_writer, read_tables, row_group_size=row_group_size)
+    return _write_tables(builder, records, writer)
+
+
+def write_ipc(records, path, batch_size=10000, schema=None, stream=False, infer_rows=100000, **kwargs):
+    """
+    Write records to an Arrow IPC file, a record batch at a time.
+    The file is written to a temporary file moved to path once complete
+
+    Args:
+        records (iterator): records to write
+        path (str): path of the arrow file
+        batch_size (int): number of rows in each record batch
+        schema (pyarrow.Schema): schema of the file. If None it is inferred from the records, see
+            ``ArrowTableBuilder``
+        stream (bool): if True use the IPC streaming format instead of the random access file format
+        infer_rows (int): maximum number of rows held in memory while fields are only null
+    Keyword Args:
+        **kwargs: forwarded to pyarrow.ipc.IpcWriteOptions
+    Returns:
+        int: number of rows written
+    Raises:
+        ImportError: if pyarrow is not available
+        ValueError: if records do not fit the schema
+    """
+    import pyarrow.ipc
+    builder = ArrowTableBuilder(batch_size=batch_size, schema=schema, infer_rows=infer_rows)
+    options = pyarrow.ipc.IpcWriteOptions(**kwargs)
+
+    def new_writer(tmp_path, file_schema):
+        return (pyarrow.ipc.new_stream if stream else pyarrow.ipc.new_file)(tmp_path, file_schema, options=options)
+
+    def read_tables(tmp_path):
+        with pyarrow.OSFile(tmp_path, 'rb') as source:
+            if stream:
+                batches = pyarrow.ipc.open_stream(source)
+            else:
+                reader = pyarrow.ipc.open_file(source)
+                batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+            for batch in batches:
+                yield pyarrow.Table.from_batches([batch])
+
+    writer = _ArrowFileWriter(path, new_writer, read_tables, max_chunksize=batch_size)
+    return _write_tables(builder, records, writer)
+
+
+COMPRESSIONS = ('gzip', 'zstd')
+
+
+class ParallelGzipWriter(object):
+    """
+    Writes a gzip file compressing blocks of data in a pool of threads.
+    Each block is an independent gzip member, the concatenation of the members is a valid gzip file that gunzip and
+    ``gzip.open`` read as a single stream.
+    """
+
+    def __init__(self, fileobj, level=6, threads=4, block_size=1024 * 1024):
+        """
+        Args:
+            fileobj: binary file object the compressed data is written to, closed with the writer
+            level (int): compression level, from 1 (fastest) to 9 (smallest)
+            threads (int): number of blocks compressed at the same time
+            block_size (int): size in bytes of the uncompressed blocks
+        """
+        self.fileobj = fileobj
+        self.level = level
+        self.threads = threads
+        self.block_size = block_size
+        self._buffer = bytearray()
+        self._pending = deque()
+        self._executor = ThreadPoolExecutor(max_workers=threads)
+        self.closed = False
+
+    def write(self, data):
+        self._buffer += data
+        if len(self._buffer) >= self.block_size:
+            self._submit()
+        return len(data)
+
+    def _submit(self):
+        block, self._buffer = bytes(self._buffer), bytearray()
+        self._pending.append(self._executor.submit(gzip.compress, block, self.level))
+        while len(self._pending) > self.threads * 2:
+            self.fileobj.write(self._pending.popleft().result())
+
+    def flush(self):
+        """
+        Compress and write all the buffered data
+        """
+        if self._buffer:
+            self._submit()
+        while self._pending:
+            self.fileobj.write(self._pending.popleft().result())
+        self.fileobj.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self.closed = True
+            self._executor.shutdown()
+            self.fileobj.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+
+class OutputFile(object):
+    """
+    A binary output file, optionally compressed. ``sync`` flushes all the data written so far to the disk, ending
+    the current gzip member or zstd frame when resumable, so that the file can be truncated at the returned position
+    and new data appended to it.
+    """
+
+    def __init__(self, filename, compress=True, level=None, threads=1, position=None, resumable=False):
+        """
+        Args:
+            filename (str): path of the file
+            compress: False to write uncompressed data, 'gzip' (or True) or 'zstd'
+            level (int): compression level. Defaults to 9 for gzip, as ``gzip.open``, and 3 for zstd
+            threads (int): number of threads compressing data
+            position (int): if set, the existing file is truncated at this position and written from there
+            resumable (bool): if True gzip data is written in independent members, to be able to resume writing
+                after any ``sync``. Implied by position
+        Raises:
+            AttributeError: if the compression is not supported
+            ImportError: if zstd compression is requested but zstandard is not available
+        """
+        if compress is True:
+            compress = 'gzip'
+        if compress and compress not in COMPRESSIONS:
+            raise AttributeError('compression {} is not supported, use one of {}'.format(compress, COMPRESSIONS))
+        if compress == 'zstd' and not zstandard_available:
+            raise ImportError('zstandard library is not installed but is required for zstd compression')
+        if position is None:
+            self.raw = open(filename, 'wb')
+        else:
+            self.raw = open(filename, 'r+b')
+            self.raw.seek(position)
+            self.raw.truncate()
+            resumable = True
+        self.compress = compress
+        if not compress:
+            self._writer = self.raw
+        elif compress == 'gzip':
+            level = 9 if level is None else level
+            if threads > 1 or resumable:
+                self._writer = ParallelGzipWriter(self.raw, level=level, threads=threads)
+            else:
+                self._writer = gzip.GzipFile(fileobj=self.raw, mode='wb', compresslevel=level)
+        else:
+            compressor = zstandard.ZstdCompressor(level=3 if level is None else level,
+                                                  threads=threads if threads > 1 else 0)
+            self._writer = compressor.stream_writer(self.raw)
+        self.write = self._writer.write
+
+    def sync(self):
+        """
+        Write all the buffered data to the disk
+
+        Returns:
+            int: position in the file after the data written so far
+        """
+        if self.compress == 'zstd':
+            self._writer.flush(zstandard.FLUSH_FRAME)
+        else:
+            self._writer.flush()
+        self.raw.flush()
+        os.fsync(self.raw.fileno())
+        return self.raw.tell()
+
+    def close(self):
+        try:
+            self._writer.close()
+        finally:
+            self.raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+
+def open_output(filename, compress=True, level=None, threads=1, position=None, resumable=False):
+    """
+    Open a file for writing binary data, optionally compressed. See ``OutputFile``
+
+    Args:
+        filename (str): path of the file
+        compress: False to write uncompressed data, 'gzip' (or True) or 'zstd'
+        level (int): compression level. Defaults to 9 for gzip, as ``gzip.open``, and 3 for zstd
+        threads (int): number of threads compressing data. Parallel gzip files are made of many gzip members
+        position (int): if set, the existing file is truncated at this position and written from there
+        resumable (bool): if True the file can be truncated and appended to after any ``OutputFile.sync``
+    Returns:
+        OutputFile: the output file
+    Raises:
+        AttributeError: if the compression is not supported
+        ImportError: if zstd compression is requested but zstandard is not available
+    """
+    return OutputFile(filename, compress=compress, level=level, threads=threads, position=position,
+                      resumable=resumable)
+
+
+
+
+class Checkpoint(object):
+    """
+    Progress of an export, stored in a json file replaced atomically at each update
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): path of the checkpoint file
+        """
+        self.path = path
+
+    def load(self):
+        """
+        Returns:
+            dict: the saved progress, or None if not available
+        """
+        try:
+            with open(self.path, 'rb') as fh:
+                return json.loads(fh.read().decode('utf-8'))
+        except (IOError, OSError, ValueError):
+            return None
+
+    def save(self, state):
+        """
+        Args:
+            state (dict): a json serialisable progress
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(json.dumps(state).encode('utf-8'))
+                fh.flush()
+                os.fsync(fh.fileno())
+            _replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class ShardedWriter(object):
+    """
+    Writes json lines in many files (shards), rolling to a new shard every max_records records or max_bytes bytes.
+    Full shards are compressed and written in a pool of threads while the next one is filled. Each shard is renamed
+    to its final name when complete and added to a json manifest with its number of records, size and sha256
+    checksum, so that readers can process finished shards while the others are being written.
+    """
+
+    extensions = {None: '.json', 'gzip': '.json.gz', 'zstd': '.json.zst'}
+
+    def __init__(self, directory, max_records=None, max_bytes=64 * 1024 * 1024, compress=True, level=None,
+                 workers=2, prefix='part', manifest='manifest.json', metadata=None):
+        """
+        Args:
+            directory (str): directory storing the shards and the manifest, created if needed
+            max_records (int): maximum number of records in a shard
+            max_bytes (int): maximum size of the uncompressed data in a shard. Shards are held in memory until
+                written, up to workers + 1 shards at a time
+            compress: False to write uncompressed data, 'gzip' (or True) or 'zstd'
+            level (int): compression level. Defaults to 9 for gzip and 3 for zstd
+            workers (int): number of shards compressed at the same time
+            prefix (str): prefix of the shard file names
+            manifest (str): file name of the manifest in the directory
+            metadata (dict): other information stored in the manifest
+        Raises:
+            AttributeError: if the compression is not supported or no shard size is given
+            ImportError: if zstd compression is requested but zstandard is not available
+        """
+        if compress is True:
+            compress = 'gzip'
+        compress = compress or None
+        if compress not in self.extensions:
+            raise AttributeError('compression {} is not supported, use one of {}'.format(compress, COMPRESSIONS))
+        if compress == 'zstd' and not zstandard_available:
+            raise ImportError('zstandard library is not installed but is required for zstd compression')
+        if not max_records and not max_bytes:
+            raise AttributeError('a maximum number of records or bytes per shard is required')
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.level = level
+        self.workers = workers
+        self.prefix = prefix
+        self._manifest = Checkpoint(os.path.join(directory, manifest))
+        self._metadata = dict(metadata or {})
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._shards = {}
+        self._index = 0
+        self._chunks = []
+        self._records = 0
+        self._bytes = 0
+        self.closed = False
+        self._write_manifest(complete=False)
+
+    def write(self, data, records=1):
+        """
+        Args:
+            data (bytes): json lines
+            records (int): number of records in data
+        """
+        self._chunks.append(data)
+        self._records += records
+        self._bytes += len(data)
+        if (self.max_records and self._records >= self.max_records) or \
+                (self.max_bytes and self._bytes >= self.max_bytes):
+            self._roll()
+
+    def _roll(self):
+        if not self._records:
+            return
+        name = '{}-{:05d}{}'.format(self.prefix, self._index, self.extensions[self.compress])
+        self._pending.append(self._executor.submit(self._write_shard, self._index, name, self._chunks, self._records))
+        self._index += 1
+        self._chunks, self._records, self._bytes = [], 0, 0
+        while len(self._pending) > self.workers:
+            self._pending.popleft().result()
+
+    def _compress(self, data):
+        if self.compress == 'gzip':
+            return gzip.compress(data, 9 if self.level is None else self.level)
+        elif self.compress == 'zstd':
+            return zstandard.ZstdCompressor(level=3 if self.level is None else self.level).compress(data)
+        return data
+
+    def _write_shard(self, index, name, chunks, records):
+        data = b''.join(chunks)
+        uncompressed_bytes = len(data)
+        data = self._compress(data)
+        path = os.path.join(self.directory, name)
+        with open(path + '.tmp', 'wb') as fh:
+            fh.write(data)
+            fh.flush()
+            os.fsync(fh.fileno())
+        _replace(path + '.tmp', path)
+        with self._lock:
+            self._shards[index] = dict(path=name,
+                                       records=records,
+                                       bytes=len(data),
+                                       uncompressed_bytes=uncompressed_bytes,
+                                       sha256=hashlib.sha256(data).hexdigest())
+            self._write_manifest(complete=False)
+
+    def _write_manifest(self, complete):
+        shards = [self._shards[i] for i in sorted(self._shards)]
+        manifest = dict(self._metadata)
+        manifest.update(shards=shards,
+                        records=sum(i['records'] for i in shards),
+                        compression=self.compress,
+                        complete=complete)
+        self._manifest.save(manifest)
+
+    @property
+    def manifest(self):
+        """
+        Returns:
+            dict: the manifest as last written
+        """
+        return self._manifest.load()
+
+    def close(self, complete=True):
+        """
+        Write the last shard and wait for all the shards to be written
+
+        Args:
+            complete (bool): if True the manifest is marked as complete. Use False when the export failed, the
+                last shard is then not written
+        """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if complete:
+                self._roll()
+            while self._pending:
+                self._pending.popleft().result()
+        finally:
+            self._executor.shutdown()
+        with self._lock:
+            self._write_manifest(complete=complete)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close(complete=type is None)
@@ -0,0 +1,149 @@
+"""
+This module selects the library used to decode and encode json. A fast library (orjson) is used when installed,
+otherwise the python standard library.
+
+Both backends encode json in the same form, so that the output does not depend on the backend. By default it is the
+output of ``json.dumps``. Backends created with compact=True write no spaces after separators and non ascii
+characters as utf-8, which is smaller and lets orjson encode most records.
+"""
+import json
+import logging
+import re
+
+try:
+    import orjson
+    orjson_available = True
+except ImportError:
+    orjson_available = False
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.WARNING)
+
+# floats that orjson writes in a different form than the standard library: with an exponent, or below 1e-4 written
+# without one. Strings can match too, they are encoded by the standard library as well
+_ORJSON_FLOAT_DIFFERENCES = re.compile(br'[0-9]e|0\.0000')
+
+
+class StdlibJSONBackend(object):
+    """
+    json backend using the python standard library
+    """
+
+    name = 'stdlib'
+
+    def __init__(self, compact=False):
+        """
+        Args:
+            compact (bool): if True encode without spaces after separators and with non ascii characters written as
+                utf-8. Otherwise the output is the same as ``json.dumps``
+        """
+        self.compact = compact
+        if compact:
+            self._encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False)
+        else:
+            self._encoder = json.JSONEncoder()
+
+    def loads(self, s):
+        """
+        Args:
+            s (bytes or str): json document
+
+        Returns:
+            the decoded object
+        Raises:
+            ValueError: if the document is not valid json
+        """
+        if isinstance(s, bytes):
+            s = s.decode('utf-8')
+        return json.loads(s)
+
+    def dumps(self, obj):
+        """
+        Args:
+            obj: object to encode
+
+        Returns:
+            str: the json document
+        """
+        return self._encoder.encode(obj)
+
+    def dumpb(self, obj):
+        """
+        Args:
+            obj: object to encode
+
+        Returns:
+            bytes: the json document encoded as utf-8
+        """
+        return self.dumps(obj).encode('utf-8')
+
+
+class OrjsonBackend(StdlibJSONBackend):
+    """
+    json backend using orjson.
+
+    Notes:
+        orjson always encodes in compact form, the output of ``json.dumps`` is encoded by the standard library.
+        In compact form objects that orjson would encode differently are encoded by the standard library: objects
+        with non finite floats, which orjson writes as null, floats that orjson writes in another form, E.g. 1e-05
+        as 0.00001, integers over 64 bits and keys that are not strings
+    """
+
+    name = 'orjson'
+
+    def __init__(self, compact=False):
+        """
+        Args:
+            compact (bool): if True encode without spaces after separators and with non ascii characters written as
+                utf-8. Otherwise the output is the same as ``json.dumps``
+        """
+        if not orjson_available:
+            raise ImportError('orjson library is not installed but is required by the orjson json backend')
+        super(OrjsonBackend, self).__init__(compact=compact)
+
+    def loads(self, s):
+        return orjson.loads(s)
+
+    def dumps(self, obj):
+        if not self.compact:
+            return self._encoder.encode(obj)
+        return self.dumpb(obj).decode('utf-8')
+
+    def dumpb(self, obj):
+        if self.compact:
+            try:
+                encoded = orjson.dumps(obj)
+            except TypeError:
+                pass
+            else:
+                if b'null' not in encoded and _ORJSON_FLOAT_DIFFERENCES.search(encoded) is None:
+                    return encoded
+        return self._encoder.encode(obj).encode('utf-8')
+
+
+JSON_BACKENDS = {StdlibJSONBackend.name: StdlibJSONBackend,
+                 OrjsonBackend.name: OrjsonBackend}
+
+
+def get_json_backend(backend='auto', compact=False):
+    """
+    Get a json backend by name
+
+    Args:
+        backend (str): 'orjson', 'stdlib' or 'auto' to use the fastest available. Backend instances are returned
+            unchanged
+        compact (bool): if True the backend encodes json in compact form, see ``StdlibJSONBackend``
+
+    Returns:
+        StdlibJSONBackend: the json backend
+    Raises:
+        AttributeError: if the backend is unknown
+    """
+    if not isinstance(backend, str):
+        return backend
+    if backend == 'auto':
+        backend = OrjsonBackend.name if orjson_available else StdlibJSONBackend.name
+    if backend not in JSON_BACKENDS:
+        raise AttributeError('json backend {} is not supported, use one of {}'.format(backend,
+                                                                                      sorted(JSON_BACKENDS)))
+    return JSON_BACKENDS[backend](compact=compact)
@@ -0,0 +1,359 @@
+"""
+This module stores association scores in a sparse target x disease matrix saved as numpy files, which are memory
+mapped when read. Many processes can open the same matrix instantly and share its pages in the OS page cache.
+
+The matrix has a layer for the overall score and one for each datatype score. Entries are sorted by target and
+disease index, so that a point lookup is a binary search within a row and rows and columns are read as slices.
+
+Each build writes its arrays to new files, named with a prefix unique to the build, and then replaces the metadata
+pointing to them. Writing a matrix over an existing one never changes files already memory mapped by readers.
+"""
+import json
+import logging
+import os
+import tempfile
+import uuid
+from array import array
+from collections import OrderedDict
+
+try:
+    import numpy
+    numpy_available = True
+except ImportError:
+    numpy_available = False
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.WARNING)
+
+OVERALL = 'overall'
+FORMAT_VERSION = 1
+METADATA = 'metadata.json'
+ARRAYS = ('keys.npy', 'indptr.npy', 'column_order.npy', 'column_indptr.npy')
+
+_replace = getattr(os, 'replace', os.rename)
+
+
+def _layer_file(layer):
+    return 'layer-{}.npy'.format(layer)
+
+
+def _array_file(prefix, name):
+    return '{}.{}'.format(prefix, name)
+
+
+def _read_metadata(directory):
+    with open(os.path.join(directory, METADATA)) as fh:
+        return json.load(fh)
+
+
+class ScoreMatrixBuilder(object):
+    """
+    Collects associations and writes them as a ``ScoreMatrix``.
+    Scores are kept in compact arrays until the matrix is written, using 4 bytes per association and layer.
+    """
+
+    def __init__(self, directory, datatypes=None):
+        """
+        Args:
+            directory (str): directory the matrix is written to, created if needed
+            datatypes (list): datatypes stored as layers. If None a layer is added for every datatype found
+        Raises:
+            ImportError: if numpy is not available
+        """
+        if not numpy_available:
+            raise ImportError('numpy library is not installed but is required to build a score matrix, '
+                              'install opentargets[numpy]')
+        self.directory = directory
+        self._discover = datatypes is None
+        self._targets = OrderedDict()
+        self._diseases = OrderedDict()
+        self._rows = array('i')
+        self._columns = array('i')
+        self._layers = OrderedDict((i, array('f')) for i in [OVERALL] + list(datatypes or []))
+
+    def add(self, association):
+        """
+        Add an association. An association added again for the same target and disease replaces the previous one
+
+        Args:
+            association (dict): an association as returned by ``OpenTargetsClient.filter_associations``
+        """
+        row = self._targets.setdefault(association['target']['id'], len(self._targets))
+        column = self._diseases.setdefault(association['disease']['id'], len(self._diseases))
+        scores = association.get('association_score') or {}
+        datatypes = scores.get('datatypes') or {}
+        if self._discover:
+            for datatype in datatypes:
+                if datatype not in self._layers:
+                    self._layers[datatype] = array('f', [0.]) * len(self._rows)
+        self._rows.append(row)
+        self._columns.append(column)
+        for layer, values in self._layers.items():
+            score = scores.get(OVERALL) if layer == OVERALL else datatypes.get(layer)
+            values.append(score or 0.)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if type is None:
+            self.close()
+
+    def close(self):
+        """
+        Write the matrix. Arrays are written to new files and the metadata pointing to them is replaced last, so that
+        readers never open a partially written matrix, and readers of a matrix written over keep their data
+
+        Returns:
+            ScoreMatrix: the matrix written
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        targets = sorted(self._targets)
+        diseases = sorted(self._diseases)
+        target_remap = numpy.empty(len(targets), dtype=numpy.int64)
+        target_remap[list(self._targets.values())] = numpy.argsort(numpy.argsort(list(self._targets)))
+        disease_remap = numpy.empty(len(diseases), dtype=numpy.int64)
+        disease_remap[list(self._diseases.values())] = numpy.argsort(numpy.argsort(list(self._diseases)))
+        n_diseases = max(len(diseases), 1)
+        keys = target_remap[numpy.frombuffer(self._rows, dtype=numpy.int32)] * n_diseases + \
+            disease_remap[numpy.frombuffer(self._columns, dtype=numpy.int32)]
+        order = numpy.argsort(keys, kind='stable')
+        keys = keys[order]
+        # keep the last association added for each target and disease
+        last = numpy.ones(len(keys), dtype=bool)
+        last[:-1] = keys[:-1] != keys[1:]
+        order = order[last]
+        keys = keys[last]
+        prefix = uuid.uuid4().hex
+        arrays = [(ARRAYS[0], keys),
+                  (ARRAYS[1], numpy.searchsorted(keys, numpy.arange(len(targets) + 1,
+                                                                        dtype=numpy.int64) * n_diseases))]
+        columns = keys % n_diseases
+        column_order = numpy.argsort(columns, kind='stable')
+        arrays.append((ARRAYS[2], column_order))
+        arrays.append((ARRAYS[3], numpy.searchsorted(columns[column_order],
+                                                               numpy.arange(len(diseases) + 1))))
+        for name, values in arrays:
+            numpy.save(os.path.join(self.directory, _array_file(prefix, name)), values)
+        for layer, values in self._layers.items():
+            numpy.save(os.path.join(self.directory, _array_file(prefix, _layer_file(layer))),
+                       numpy.frombuffer(values, dtype=numpy.float32)[order])
+        metadata = {'format': FORMAT_VERSION,
+                    'prefix': prefix,
+                    'nnz': len(keys),
+                    'layers': list(self._layers),
+                    'targets': targets,
+                    'diseases': diseases}
+        try:
+            previous = _read_metadata(self.directory)
+        except (IOError, OSError, ValueError):
+            previous = None
+        fd, path = tempfile.mkstemp(prefix='.metadata-', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'w') as fh:
+                json.dump(metadata, fh)
+            _replace(path, os.path.join(self.directory, METADATA))
+        except BaseException:
+            os.remove(path)
+            raise
+        if previous is not None and previous.get('prefix'):
+            self._remove_build(previous)
+        logger.debug('score matrix with %i associations written to %s', len(keys), self.directory)
+        return ScoreMatrix(self.directory)
+
+    def _remove_build(self, metadata):
+        """
+        Remove the arrays listed in the metadata of the build replaced. Readers that mapped them keep reading them
+        until they are closed. Other files in the directory are left untouched
+        """
+        names = list(ARRAYS) + [_layer_file(i) for i in metadata.get('layers', [])]
+        for name in names:
+            filename = _array_file(metadata['prefix'], name)
+            try:
+                os.remove(os.path.join(self.directory, filename))
+            except OSError as e:
+                logger.warning('cannot remove %s of a previous score matrix: %s', filename, e)
+
+
+def build_score_matrix(associations, directory, datatypes=None):
+    """
+    Write a ``ScoreMatrix`` from associations
+
+    Args:
+        associations: an iterable of associations, E.g. the result of ``OpenTargetsClient.filter_associations``
+        directory (str): directory the matrix is written to
+        datatypes (list): datatypes stored as layers. If None a layer is added for every datatype found
+    Returns:
+        ScoreMatrix: the matrix written
+    """
+    builder = ScoreMatrixBuilder(directory, datatypes=datatypes)
+    for association in associations:
+        builder.add(association)
+    return builder.close()
+
+
+class ScoreMatrix(object):
+    """
+    Sparse target x disease matrix of association scores, memory mapped from the files written by
+    ``ScoreMatrixBuilder``. Scores of associations not in the matrix are 0.
+
+    Attributes:
+        targets (list): target identifiers, sorted, in the order of the matrix rows
+        diseases (list): disease identifiers, sorted, in the order of the matrix columns
+        target_index (dict): row of each target identifier
+        disease_index (dict): column of each disease identifier
+        layers (list): names of the layers, 'overall' and the datatypes
+    """
+
+    def __init__(self, directory):
+        """
+        Args:
+            directory (str): directory of the matrix
+        Raises:
+            ImportError: if numpy is not available
+            ValueError: if the directory does not contain a supported matrix
+        """
+        if not numpy_available:
+            raise ImportError('numpy library is not installed but is required to read a score matrix, '
+                              'install opentargets[numpy]')
+        self.directory = directory
+        for attempt in range(self._open_attempts):
+            try:
+                self._open()
+                break
+            except (IOError, OSError) as e:
+                # the matrix was written over between reading its metadata and its arrays
+                if attempt == self._open_attempts - 1 or not os.path.exists(os.path.join(directory, METADATA)):
+                    raise
+                logger.debug('reopening score matrix in %s: %s', directory, e)
+
+    _open_attempts = 3
+
+    def _open(self):
+        metadata = _read_metadata(self.directory)
+        if metadata.get('format') != FORMAT_VERSION:
+            raise ValueError('{} contains a score matrix with unsupported format {}'.format(self.directory,
+                                                                                           metadata.get('format')))
+        self._prefix = metadata['prefix']
+        self._keys, self._indptr, self._column_order, self._column_indptr = [self._load(i) for i in ARRAYS]
+        self._values = dict((i, self._load(_layer_file(i))) for i in metadata['layers'])
+        self.targets = metadata['targets']
+        self.diseases = metadata['diseases']
+        self.layers = metadata['layers']
+        self.target_index = dict((v, i) for i, v in enumerate(self.targets))
+        self.disease_index = dict((v, i) for i, v in enumerate(self.diseases))
+        self._n_diseases = max(len(self.diseases), 1)
+
+    def _load(self, filename):
+        return numpy.load(os.path.join(self.directory, _array_file(self._prefix, filename)), mmap_mode='r')
+
+    @property
+    def shape(self):
+        return len(self.targets), len(self.diseases)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __str__(self):
+        return '{} x {} score matrix with {} associations | layers: {}'.format(len(self.targets), len(self.diseases),
+                                                                              len(self), ', '.join(self.layers))
+
+    def __repr__(self):
+        return self.__str__()
+
+    def layer(self, layer=OVERALL):
+        """
+        Args:
+            layer (str): 'overall' or a datatype
+        Returns:
+            numpy.ndarray: the memory mapped scores of a layer, in the order of the entries of the matrix
+        Raises:
+            AttributeError: if the matrix has no such layer
+        """
+        if layer not in self._values:
+            raise AttributeError('layer {} is not in the matrix, use one of {}'.format(layer, self.layers))
+        return self._values[layer]
+
+    def score(self, target, disease, layer=OVERALL):
+        """
+        Get the score of an association
+
+        Args:
+            target (str): target identifier
+            disease (str): disease identifier
+            layer (str): 'overall' or a datatype
+        Returns:
+            float: the score, 0 if the association is not in the matrix
+        """
+        values = self.layer(layer)
+        row = self.target_index.get(target)
+        column = self.disease_index.get(disease)
+        if row is None or column is None:
+            return 0.
+        start, end = int(self._indptr[row]), int(self._indptr[row + 1])
+        key = row * self._n_diseases + column
+        i = start + int(numpy.searchsorted(self._keys[start:end], key))
+        if i < end and self._keys[i] == key:
+            return float(values[i])
+        return 0.
+
+    def scores(self, targets, diseases, layer=OVERALL):
+        """
+        Get the scores of many associations at once
+
+        Args:
+            targets (list): target identifiers
+            diseases (list): disease identifiers, paired with the targets
+        Returns:
+            numpy.ndarray: the scores, 0 for associations not in the matrix
+        """
+        values = self.layer(layer)
+        rows = numpy.array([self.target_index.get(i, -1) for i in targets], dtype=numpy.int64)
+        columns = numpy.array([self.disease_index.get(i, -1) for i in diseases], dtype=numpy.int64)
+        if len(rows) != len(columns):
+            raise ValueError('{} targets and {} diseases given, they must be paired'.format(len(rows), len(columns)))
+        keys = rows * self._n_diseases + columns
+        found = (rows >= 0) & (columns >= 0)
+        if not len(self._keys):
+            return numpy.zeros(len(keys), dtype=numpy.float32)
+        positions = numpy.minimum(numpy.searchsorted(self._keys, keys), len(self._keys) - 1)
+        found &= self._keys[positions] == keys
+        return numpy.where(found, values[positions], numpy.float32(0))
+
+    def row(self, target, layer=OVERALL):
+        """
+        Get the diseases associated with a target
+
+        Args:
+            target (str): target identifier
+            layer (str): 'overall' or a datatype
+        Returns:
+            tuple: the columns of the diseases, see ``ScoreMatrix.diseases``, and their scores as numpy arrays
+        """
+        values = self.layer(layer)
+        row = self.target_index.get(target)
+        if row is None:
+            return numpy.empty(0, dtype=numpy.int64), numpy.empty(0, dtype=numpy.float32)
+        start, end = int(self._indptr[row]), int(self._indptr[row + 1])
+        return self._keys[start:end] - row * self._n_diseases, values[start:end]
+
+    def column(self, disease, layer=OVERALL):
+        """
+        Get the targets associated with a disease
+
+        Args:
+            disease (str): disease identifier
+            layer (str): 'overall' or a datatype
+        Returns:
+            tuple: the rows of the targets, see ``ScoreMatrix.targets``, and their scores as numpy arrays
+        """
+        values = self.layer(layer)
+        column = self.disease_index.get(disease)
+        if column is None:
+            return numpy.empty(0, dtype=numpy.int64), numpy.empty(0, dtype=numpy.float32)
+        positions = self._column_order[self._column_indptr[column]:self._column_indptr[column + 1]]
+        return self._keys[positions] // self._n_diseases, values[positions]
@@ -0,0 +1,450 @@
+"""
+This module queries association and evidence dumps saved with ``IterableResult.to_file`` without the REST API.
+Dumps are loaded in a local SQLite database, read through memory mapping, with indexes on target, disease,
+datatype, datasource and score. ``OfflineConnection`` answers the association and evidence filter endpoints like the
+REST API, so that the methods of ``OpenTargetsClient`` and ``IterableResult`` work unchanged.
+"""
+import gzip
+import io
+import logging
+from collections import OrderedDict
+
+from opentargets import OpenTargetsClient
+from opentargets.cache import SQLiteStore
+from opentargets.conn import HTTPMethods, response_info
+from opentargets.json_backend import get_json_backend
+
+try:
+    import zstandard
+    zstandard_available = True
+except ImportError:
+    zstandard_available = False
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.WARNING)
+
+ASSOCIATION = 'association'
+EVIDENCE = 'evidence'
+
+ENDPOINTS = {OpenTargetsClient._filter_associations_endpoint: ASSOCIATION,
+             OpenTargetsClient._filter_evidence_endpoint: EVIDENCE}
+
+LIST_FILTERS = ('target', 'disease', 'datatype', 'datasource', 'fields')
+FILTERS = {ASSOCIATION: LIST_FILTERS + ('direct', 'scorevalue_min', 'scorevalue_max'),
+           EVIDENCE: LIST_FILTERS + ('scorevalue_min', 'scorevalue_max')}
+PAGINATION = ('size', 'from', 'next', 'no_cache', 'format')
+
+
+def open_dump(path):
+    """
+    Open a json lines file, uncompressed or compressed with gzip or zstd
+
+    Args:
+        path (str): path of the file
+    Returns:
+        a binary file object
+    Raises:
+        ImportError: if the file is compressed with zstd but zstandard is not available
+    """
+    with open(path, 'rb') as fh:
+        magic = fh.read(4)
+    if magic[:2] == b'\x1f\x8b':
+        return gzip.open(path, 'rb')
+    if magic == b'\x28\xb5\x2f\xfd':
+        if not zstandard_available:
+            raise ImportError('zstandard library is not installed but is required to read {}'.format(path))
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True)
+        return io.BufferedReader(reader)
+    return open(path, 'rb')
+
+
+def _get(record, *keys):
+    for key in keys:
+        if not isinstance(record, dict):
+            return None
+        record = record.get(key)
+    return record
+
+
+def _positive_keys(scores):
+    if not isinstance(scores, dict):
+        return []
+    return [k for k, v in scores.items() if isinstance(v, (int, float)) and v > 0]
+
+
+def index_fields(record):
+    """
+    Extract the indexed fields of an association or evidence
+
+    Args:
+        record (dict): an association or evidence
+    Returns:
+        tuple: kind, id, target id, disease id, score, direct flag and a list of (facet, value) pairs
+    """
+    if 'association_score' in record:
+        facets = [('datatype', i) for i in _positive_keys(_get(record, 'association_score', 'datatypes'))]
+        facets += [('datasource', i) for i in _positive_keys(_get(record, 'association_score', 'datasources'))]
+        direct = record.get('is_direct')
+        return (ASSOCIATION,
+                record.get('id'),
+                _get(record, 'target', 'id'),
+                _get(record, 'disease', 'id'),
+                _get(record, 'association_score', 'overall') or 0,
+                None if direct is None else int(bool(direct)),
+                facets)
+    facets = []
+    if record.get('type'):
+        facets.append(('datatype', record['type']))
+    if record.get('sourceID'):
+        facets.append(('datasource', record['sourceID']))
+    return (EVIDENCE,
+            record.get('id'),
+            _get(record, 'target', 'id'),
+            _get(record, 'disease', 'id'),
+            _get(record, 'scores', 'association_score') or 0,
+            None,
+            facets)
+
+
+def project(record, fields):
+    """
+    Keep only some fields of a record, as the `fields` parameter of the REST API
+
+    Args:
+        record (dict): a record
+        fields (list): dotted paths of the fields to keep, a path ending with '.*' keeps all the nested fields
+    Returns:
+        dict: the projected record
+    """
+    projected = {}
+    for field in fields:
+        keys = field.split('.')
+        if keys[-1] == '*':
+            keys = keys[:-1]
+        source, target = record, projected
+        for i, key in enumerate(keys):
+            if not isinstance(source, dict) or key not in source:
+                break
+            source = source[key]
+            if i == len(keys) - 1:
+                target[key] = source
+            else:
+                target = target.setdefault(key, {})
+    return projected
+
+
+class OfflineStore(SQLiteStore):
+    """
+    Associations and evidence stored as json lines in a SQLite database, indexed on target, disease, datatype,
+    datasource and score. The database is read through memory mapping.
+    Results are identified by their id, loading the same dump again replaces them.
+    """
+
+    _schema = ('CREATE TABLE IF NOT EXISTS record ('
+               'rowid INTEGER PRIMARY KEY, '
+               'kind TEXT NOT NULL, '
+               'id TEXT NOT NULL, '
+               'target TEXT, '
+               'disease TEXT, '
+               'score REAL NOT NULL, '
+               'direct INTEGER, '
+               'body BLOB NOT NULL)',
+               'CREATE UNIQUE INDEX IF NOT EXISTS record_id ON record (kind, id)',
+               'CREATE INDEX IF NOT EXISTS record_target ON record (kind, target, score DESC)',
+               'CREATE INDEX IF NOT EXISTS record_disease ON record (kind, disease, score DESC)',
+               'CREATE INDEX IF NOT EXISTS record_score ON record (kind, score DESC)',
+               'CREATE TABLE IF NOT EXISTS facet ('
+               'record INTEGER NOT NULL, '
+               'name TEXT NOT NULL, '
+               'value TEXT NOT NULL)',
+               'CREATE INDEX IF NOT EXISTS facet_value ON facet (name, value, record)',
+               'CREATE INDEX IF NOT EXISTS facet_record ON facet (record)')
+
+    def __init__(self, path, mmap_size=4 * 1024 * 1024 * 1024, json_backend='auto', **kwargs):
+        """
+        Args:
+            path (str): path of the SQLite database
+            mmap_size (int): maximum number of bytes of the database read through memory mapping
+            json_backend (str): library used to decode the dumps. See ``opentargets.json_backend``
+        Keyword Args:
+            **kwargs: forwarded to ``SQLiteStore``
+        """
+        super(OfflineStore, self).__init__(path, **kwargs)
+        self._execute('PRAGMA mmap_size={:d}'.format(int(mmap_size)))
+        self.json_backend = get_json_backend(json_backend)
+        self._counts = OrderedDict()
+        self._loads = 0
+
+    def ingest(self, paths, batch_size=10000):
+        """
+        Load json lines files of associations or evidence, as saved by ``IterableResult.to_file``
+
+        Args:
+            paths (list): paths of the files, uncompressed or compressed with gzip or zstd. Accepts a single path
+            batch_size (int): number of records inserted in each transaction
+        Returns:
+            int: number of records loaded
+        """
+        if isinstance(paths, str):
+            paths = [paths]
+        loaded = 0
+        for path in paths:
+            batch = []
+            with open_dump(path) as fh:
+                for line in fh:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    batch.append((line, index_fields(self.json_backend.loads(line))))
+                    if len(batch) >= batch_size:
+                        loaded += self._insert(batch)
+                        batch = []
+            loaded += self._insert(batch)
+            logger.debug('loaded %s, %i records in the store', path, loaded)
+        return loaded
+
+    def _insert(self, batch):
+        if not batch:
+            return 0
+        with self._lock:
+            self._db.execute('BEGIN')
+            try:
+                for body, (kind, record_id, target, disease, score, direct, facets) in batch:
+                    if record_id is None:
+                        raise ValueError('records without id cannot be loaded')
+                    replaced = self._db.execute('SELECT rowid FROM record WHERE kind=? AND id=?',
+                                                (kind, record_id)).fetchall()
+                    if replaced:
+                        self._db.execute('DELETE FROM facet WHERE record=?', (replaced[0][0],))
+                        self._db.execute('DELETE FROM record WHERE rowid=?', (replaced[0][0],))
+                    rowid = self._db.execute('INSERT INTO record (kind, id, target, disease, score, direct, body) '
+                                             'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                             (kind, record_id, target, disease, score, direct,
+                                              bytes(body))).lastrowid
+                    self._db.executemany('INSERT INTO facet VALUES (?, ?, ?)',
+                                         [(rowid, name, value) for name, value in facets])
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            finally:
+                self._loads += 1
+        return len(batch)
+
+    _max_counts = 100
+
+    def _count(self, condition, args):
+        """
+        Count the records matching a condition. Counts are kept until records are loaded, in this process or in
+        another one, so that the pages of a query count its records only once
+        """
+        key = (condition, tuple(args))
+        with self._lock:
+            version = (self._loads, self._db.execute('PRAGMA data_version').fetchone()[0])
+            cached = self._counts.pop(key, None)
+            if cached is None or cached[0] != version:
+                cached = (version, self._db.execute('SELECT COUNT(*) FROM record WHERE ' + condition,
+                                                    args).fetchone()[0])
+            self._counts[key] = cached
+            while len(self._counts) > self._max_counts:
+                self._counts.popitem(last=False)
+        return cached[1]
+
+    def query(self, kind, params):
+        """
+        Find records matching the filters of the REST API, sorted by decreasing score
+
+        Args:
+            kind (str): 'association' or 'evidence'
+            params (dict): filters and pagination parameters: target, disease, datatype, datasource, direct,
+                scorevalue_min, scorevalue_max, size, from and next
+        Returns:
+            tuple: the json bytes of the page of records, the total number of matching records and the search after
+                token of the next page, or None if the page is empty
+        """
+        where = ['kind=?']
+        args = [kind]
+        for key in ('target', 'disease'):
+            values = _as_list(params.get(key))
+            if values:
+                where.append('{} IN ({})'.format(key, ', '.join('?' * len(values))))
+                args.extend(values)
+        for key in ('datatype', 'datasource'):
+            values = _as_list(params.get(key))
+            if values:
+                where.append('rowid IN (SELECT record FROM facet WHERE name=? AND value IN ({}))'.format(
+                    ', '.join('?' * len(values))))
+                args.append(key)
+                args.extend(values)
+        if params.get('direct') is not None:
+            where.append('direct=?')
+            args.append(int(_as_bool(params['direct'])))
+        if params.get('scorevalue_min') is not None:
+            where.append('score>=?')
+            args.append(float(params['scorevalue_min']))
+        if params.get('scorevalue_max') is not None:
+            where.append('score<=?')
+            args.append(float(params['scorevalue_max']))
+        condition = ' AND '.join(where)
+        total = self._count(condition, args)
+        size = int(params.get('size', 10))
+        offset = int(params.get('from', 0))
+        search_after = _as_list(params.get('next'))
+        if search_after:
+            score, rowid = float(search_after[0]), int(search_after[1])
+            condition += ' AND (score<? OR (score=? AND rowid>?))'
+            args.extend([score, score, rowid])
+        rows = self._execute('SELECT rowid, score, body FROM record WHERE {} ORDER BY score DESC, rowid '
+                             'LIMIT ? OFFSET ?'.format(condition), args + [size, offset])
+        next_token = [rows[-1][1], rows[-1][0]] if rows else None
+        return [bytes(i[2]) for i in rows], total, next_token
+
+    def __len__(self):
+        return self._execute('SELECT COUNT(*) FROM record')[0][0]
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+
+def _as_bool(value):
+    if isinstance(value, str):
+        return value.lower() == 'true'
+    return bool(value)
+
+
+class OfflineResponse(object):
+    """
+    A page of results from an ``OfflineStore``, with the same ``data`` and ``info`` as a ``Response``
+    """
+
+    def __init__(self, data, info):
+        self.data = data
+        self.info = info
+
+    @property
+    def count(self):
+        return len(self.data)
+
+    def __len__(self):
+        return self.info.total
+
+
+class OfflineConnection(object):
+    """
+    Stand-in for ``opentargets.conn.Connection`` answering the association and evidence filter endpoints from an
+    ``OfflineStore``.
+
+    Notes:
+        filters match the identifiers stored in each record, E.g. a disease filter does not match the
+        associations of its descendant diseases as the REST API does. Results are sorted by decreasing score.
+    """
+
+    def __init__(self, store, json_backend='auto', **kwargs):
+        """
+        Args:
+            store: an OfflineStore or the path of its database
+            json_backend (str): library used to decode results. See ``opentargets.json_backend``
+        Keyword Args:
+            **kwargs: forwarded to ``OfflineStore`` when a path is given
+        """
+        self._logger = logging.getLogger(__name__)
+        if not isinstance(store, OfflineStore):
+            store = OfflineStore(store, json_backend=json_backend, **kwargs)
+        self.store = store
+        self.json_backend = get_json_backend(json_backend)
+
+    def _kind(self, endpoint):
+        if endpoint not in ENDPOINTS:
+            raise AttributeError('endpoint {} is not available offline, use one of {}'.format(endpoint,
+                                                                                             sorted(ENDPOINTS)))
+        return ENDPOINTS[endpoint]
+
+    def get(self, endpoint, params=None, stream=False, raw=False):
+        """
+        Get a page of results
+        Args:
+            endpoint (str): REST API endpoint to answer
+            params (dict): filters and pagination parameters
+            stream (bool): ignored, pages are read from the local database
+            raw (bool): if True keep the results as json bytes
+
+        Returns:
+            OfflineResponse: a page of results
+        Raises:
+            AttributeError: if the endpoint is not available offline
+        """
+        params = dict(params or {})
+        kind = self._kind(endpoint)
+        for key in params:
+            if key not in FILTERS[kind] and key not in PAGINATION:
+                self._logger.warning('parameter %s is not supported offline and is ignored', key)
+        bodies, total, next_token = self.store.query(kind, params)
+        fields = _as_list(params.get('fields'))
+        if fields:
+            data = [project(self.json_backend.loads(i), fields) for i in bodies]
+            if raw:
+                data = [self.json_backend.dumpb(i) for i in data]
+        elif raw:
+            data = bodies
+        else:
+            data = [self.json_backend.loads(i) for i in bodies]
+        metadata = {'total': total, 'size': len(data), 'from': int(params.get('from', 0))}
+        if next_token is not None:
+            metadata['next'] = next_token
+        return OfflineResponse(data, response_info(metadata))
+
+    def post(self, endpoint, data=None, stream=False, raw=False):
+        """
+        Same as ``OfflineConnection.get``, with parameters sent as body
+        """
+        return self.get(endpoint, params=data, stream=stream, raw=raw)
+
+    def validate_parameter(self, endpoint, filter_type, value, method=HTTPMethods.GET):
+        """
+        Raises:
+            AttributeError: if the filter is not supported offline for the endpoint
+        """
+        if filter_type not in FILTERS[self._kind(endpoint)]:
+            raise AttributeError('{}={} is not a valid parameter for endpoint {} offline'.format(filter_type, value,
+                                                                                                endpoint))
+
+    def get_api_endpoints(self):
+        return sorted(ENDPOINTS)
+
+    def get_remote_version(self):
+        return 'offline'
+
+    def ping(self):
+        return True
+
+    def close(self):
+        self.store.close()
+
+
+class OfflineClient(OpenTargetsClient):
+    """
+    ``OpenTargetsClient`` answering ``filter_associations`` and ``filter_evidence`` from an ``OfflineStore``.
+    Target and disease names are not resolved, filters need identifiers.
+    """
+
+    def __init__(self, path, json_backend='auto', **kwargs):
+        """
+        Args:
+            path (str): path of the database of an ``OfflineStore``
+            json_backend (str): library used to decode results. See ``opentargets.json_backend``
+        Keyword Args:
+            **kwargs: forwarded to ``OfflineStore``
+        """
+        super(OfflineClient, self).__init__(resolution_cache=False,
+                                            conn=OfflineConnection(path, json_backend=json_backend, **kwargs))
+
+    def ingest(self, paths, batch_size=10000):
+        """
+        Load json lines files in the store. See ``OfflineStore.ingest``
+        """
+        return self.conn.store.ingest(paths, batch_size=batch_size)
@@ -0,0 +1,330 @@
+"""
+This module splits a query to the REST API in independent partitions on a filter key (E.g. datasource, datatype,
+target or therapeutic area). Each partition paginates on its own, so partitions can be fetched in parallel and merged
+in a single stream, or serialised and sent to other machines to distribute a full export.
+"""
+import json
+import logging
+import queue
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import addict
+
+from opentargets.conn import IterableResult, HTTPMethods
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.WARNING)
+
+DATATYPES = ('genetic_association',
+             'somatic_mutation',
+             'known_drug',
+             'affected_pathway',
+             'rna_expression',
+             'literature',
+             'animal_model')
+
+Page = namedtuple('Page', ['data', 'info'])
+
+
+class Partition(object):
+    """
+    A self contained unit of work: a REST API endpoint and the parameters selecting one partition of a query
+    """
+
+    def __init__(self, endpoint, params, key=None, value=None, method=HTTPMethods.GET):
+        """
+        Args:
+            endpoint (str): REST API endpoint to call
+            params (dict): parameters of the query, including the partition filter
+            key (str): filter the query is partitioned on
+            value: value (or list of values) of the filter selecting this partition
+            method (HTTPMethods): HTTP method to use for the calls
+        """
+        self.endpoint = endpoint
+        self.params = params
+        self.key = key
+        self.value = value
+        self.method = method
+
+    def fetch(self, conn):
+        """
+        Start the query for this partition
+
+        Args:
+            conn (Connection): a Connection instance
+        Returns:
+            IterableResult: Result of the query
+        """
+        result = IterableResult(conn, method=self.method)
+        result(self.endpoint, **dict(self.params))
+        return result
+
+    def to_dict(self):
+        return dict(endpoint=self.endpoint,
+                    params=self.params,
+                    key=self.key,
+                    value=self.value,
+                    method=self.method)
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(**d)
+
+    def to_json(self):
+        """
+        Returns:
+            str: json serialisation of the partition
+        """
+        return json.dumps(self.to_dict(), sort_keys=True)
+
+    @classmethod
+    def from_json(cls, s):
+        """
+        Args:
+            s (str): json string produced by ``Partition.to_json``
+        Returns:
+            Partition: the deserialised partition
+        """
+        return cls.from_dict(json.loads(s))
+
+    def __eq__(self, other):
+        return isinstance(other, Partition) and self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return 'Partition({}, {}={})'.format(self.endpoint, self.key, self.value)
+
+
+def make_partitions(endpoint, key, values=None, chunk_size=None, method=HTTPMethods.GET, **kwargs):
+    """
+    Split a query in partitions, one for each value (or chunk of values) of a filter
+
+    Args:
+        endpoint (str): REST API endpoint to call
+        key (str): filter to partition the query on. E.g. 'datasource', 'datatype', 'target', 'therapeutic_area'
+        values (list): values of the filter, one partition is created for each of them. If None the values passed
+            for the filter in kwargs are used, or all the datatypes if partitioning on 'datatype'
+        chunk_size (int): if set, each partition filters on a list of up to chunk_size values instead of a single one
+        method (HTTPMethods): HTTP method to use for the calls
+    Keyword Args:
+        **kwargs: other parameters of the query, shared by all the partitions
+    Returns:
+        list: a list of Partition
+    Raises:
+        AttributeError: if no value is available for the filter
+    """
+    if values is None:
+        values = kwargs.get(key)
+        if values is None and key == 'datatype':
+            values = DATATYPES
+    if values is None:
+        raise AttributeError('values are needed to partition a query on {}'.format(key))
+    if isinstance(values, str):
+        values = [values]
+    values = list(values)
+    if chunk_size:
+        values = [values[i:i + chunk_size] for i in range(0, len(values), chunk_size)]
+    partitions = []
+    for value in values:
+        params = dict(kwargs)
+        params[key] = value
+        partitions.append(Partition(endpoint, params, key=key, value=value, method=method))
+    return partitions
+
+
+class PartitionedResult(IterableResult):
+    '''
+    Merges the results of many partitions of a query in a single stream.
+    Each partition paginates independently in a pool of threads, pages are returned as soon as they are fetched.
+
+    Notes:
+        partitions on association datatypes or therapeutic areas can overlap, use ``unique=True`` to skip results
+        already returned by another partition. The number of unique results is not known before they are all
+        fetched, ``len`` then counts the ids of all the partitions first
+    '''
+
+    _resumable = False
+
+    def __init__(self, conn, partitions, workers=4, unique=False, buffer=None):
+        """
+        Args:
+            conn (Connection): a Connection instance
+            partitions (list): a list of Partition to fetch
+            workers (int): number of partitions fetched at the same time
+            unique (bool): if True skip results with an id already returned
+            buffer (int): maximum number of pages waiting to be consumed. Defaults to two pages per worker
+        """
+        super(PartitionedResult, self).__init__(conn)
+        self.partitions = list(partitions)
+        self.workers = workers
+        self.unique = unique
+        self.buffer = buffer
+        self._args = ()
+        self._kwargs = {}
+        self._counted = False
+
+    def __call__(self):
+        """
+        Start the query for all the partitions, fetching their first page
+
+        Returns:
+            PartitionedResult: returns itself
+        """
+        self._close_pages()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            self._results = list(executor.map(lambda p: p.fetch(self.conn), self.partitions))
+        # with unique results this is an upper bound until all the results are fetched or counted
+        self.total = sum(len(r) for r in self._results)
+        self._counted = not self.unique
+        self.info = addict.Dict(total=self.total, partitions=len(self.partitions))
+        self._data = []
+        self._cursor = 0
+        self.current = 0
+        return self
+
+    def filter(self, **kwargs):
+        """
+        Applies a set of filters to all the partitions
+        Keyword Args
+            **kwargs: passed to the REST API
+        Returns:
+            PartitionedResult: a PartitionedResult with applied filters
+        """
+        if kwargs:
+            for partition in self.partitions:
+                for filter_type, filter_value in kwargs.items():
+                    self.conn.validate_parameter(partition.endpoint, filter_type, filter_value)
+                    partition.params[filter_type] = filter_value
+            self.__call__()
+        return self
+
+    def parallel(self, workers=4, ordered=True):
+        """
+        Set the number of partitions fetched at the same time. Results of the partitions are always returned as soon
+        as they are fetched, ordered is ignored
+
+        Args:
+            workers (int): number of partitions fetched at the same time
+            ordered (bool): ignored
+        Returns:
+            PartitionedResult: returns itself
+        """
+        if workers < 1:
+            raise AttributeError('partitions need at least one worker')
+        self._close_pages()
+        self.workers = workers
+        return self
+
+    def _set_unique_total(self, total):
+        self.total = self.info.total = total
+        self._counted = True
+
+    def _count_unique(self):
+        """
+        Count the unique results fetching only the ids of the results of all the partitions
+
+        Returns:
+            int: number of unique results. Results without id are counted once each
+        """
+        def fetch_ids(partition):
+            params = dict(partition.params)
+            params['fields'] = ['id']
+            result = Partition(partition.endpoint, params, partition.key, partition.value, partition.method)
+            return [i.get('id') for i in result.fetch(self.conn)]
+
+        ids = set()
+        without_id = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for partition_ids in executor.map(fetch_ids, self.partitions):
+                without_id += partition_ids.count(None)
+                ids.update(partition_ids)
+        ids.discard(None)
+        return len(ids) + without_id
+
+    def __len__(self):
+        if not self._counted and hasattr(self, '_results'):
+            self._set_unique_total(self._count_unique())
+        return super(PartitionedResult, self).__len__()
+
+    def _fetch_pages(self, position=None):
+        """
+        Fetch the pages of all the partitions in a pool of threads
+
+        Args:
+            position: ignored, partitions are always fetched from their start
+        Returns:
+            iterator: an iterator of Page objects
+        """
+        pages = queue.Queue(maxsize=self.buffer or self.workers * 2)
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def fetch_partition(result):
+            try:
+                if result._data and not put((result._data, None)):
+                    return
+                for call_output in result._fetch_pages(result._position()):
+                    if not put((call_output.data, None)):
+                        return
+            except Exception as e:
+                put((None, e))
+            finally:
+                put((None, None))
+
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        for result in self._results:
+            executor.submit(fetch_partition, result)
+        seen = set()
+        returned = 0
+        running = len(self._results)
+        try:
+            while running:
+                data, error = pages.get()
+                if error is not None:
+                    raise error
+                if data is None:
+                    running -= 1
+                    continue
+                if self.unique:
+                    data = self._unique(data, seen)
+                returned += len(data)
+                if data:
+                    yield Page(data, addict.Dict())
+            if self.unique and not self._counted:
+                self._set_unique_total(returned)
+        finally:
+            stop.set()
+            executor.shutdown(wait=False)
+
+    @staticmethod
+    def _unique(data, seen):
+        """
+        Skip the results with an id in seen, and add the ids of the others. Results without id are never skipped
+        """
+        unique = []
+        for i in data:
+            key = i.get('id')
+            if key is None:
+                unique.append(i)
+            elif key not in seen:
+                seen.add(key)
+                unique.append(i)
+        return unique
+
+    def __str__(self):
+        try:
+            return '{} Results found | partitions: {}'.format(self.total, self.partitions)
+        except AttributeError:
+            return 'partitions: {}'.format(self.partitions)
@@ -0,0 +1,148 @@
+"""
+This module extracts the records of a REST API response as the bytes they are encoded with, without decoding them.
+Only the position of the structural characters of the json document is computed, vectorised with numpy when
+available, so that results can be saved as they are received.
+"""
+import logging
+import re
+
+try:
+    import numpy
+    numpy_available = True
+except ImportError:
+    numpy_available = False
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.WARNING)
+
+_TOKEN = re.compile(br'"(?:[^"\\]|\\.)*"|[\[\]{},]')
+_WHITESPACE = b' \t\r\n'
+_QUOTE, _BACKSLASH, _COMMA = 34, 92, 44
+_OPEN, _CLOSE = (123, 91), (125, 93)
+
+
+def _skip_whitespace(body, i):
+    while i < len(body) and body[i:i + 1] in (b' ', b'\t', b'\r', b'\n'):
+        i += 1
+    return i
+
+
+def _array_after_key(body, key_end):
+    """
+    Returns the position of the '[' opening the value of a key ending at key_end, or None if the value is not an
+    array or the string is not a key
+    """
+    i = _skip_whitespace(body, key_end)
+    if body[i:i + 1] != b':':
+        return None
+    i = _skip_whitespace(body, i + 1)
+    if body[i:i + 1] != b'[':
+        return None
+    return i
+
+
+def _split_python(body, quoted_key):
+    depth = 0
+    start = None
+    separators = []
+    for m in _TOKEN.finditer(body):
+        token = m.group()
+        if token[:1] == b'"':
+            if start is None and depth == 1 and token == quoted_key:
+                start = _array_after_key(body, m.end())
+            continue
+        if token in (b'{', b'['):
+            depth += 1
+        elif token in (b'}', b']'):
+            depth -= 1
+            if start is not None and m.start() > start and depth == 1:
+                separators.append(m.start())
+                return start, separators
+        elif start is not None and depth == 2 and m.start() > start:
+            separators.append(m.start())
+    return None
+
+
+def _split_numpy(body, quoted_key):
+    chars = numpy.frombuffer(body, dtype=numpy.uint8)
+    mask = chars == _QUOTE
+    backslashes = numpy.flatnonzero(chars == _BACKSLASH)
+    if len(backslashes):
+        # a quote is escaped if preceded by an odd number of backslashes
+        quotes = numpy.flatnonzero(mask)
+        quotes = quotes[(quotes > 0) & (chars[quotes - 1] == _BACKSLASH)]
+        run_start = numpy.zeros(len(backslashes), dtype=numpy.int64)
+        breaks = numpy.flatnonzero(numpy.diff(backslashes) != 1) + 1
+        run_start[breaks] = breaks
+        run_start = numpy.maximum.accumulate(run_start)
+        last = numpy.searchsorted(backslashes, quotes - 1)
+        mask[quotes[(last - run_start[last]) % 2 == 0]] = False
+    for char in _OPEN + _CLOSE + (_COMMA,):
+        mask |= chars == char
+    events = numpy.flatnonzero(mask)
+    kinds = chars[events]
+    is_quote = kinds == _QUOTE
+    # characters preceded by an odd number of quotes are inside a string. The count can wrap, only its parity is used
+    outside = ~is_quote & ((numpy.cumsum(is_quote, dtype=numpy.uint8) & 1) == 0)
+    quotes = events[is_quote]
+    structural = events[outside]
+    kinds = kinds[outside]
+    delta = ((kinds == _OPEN[0]) | (kinds == _OPEN[1])).astype(numpy.int32) - \
+        ((kinds == _CLOSE[0]) | (kinds == _CLOSE[1]))
+    depth = numpy.cumsum(delta)
+    search_from = 0
+    while True:
+        key_start = body.find(quoted_key, search_from)
+        if key_start < 0:
+            return None
+        search_from = key_start + 1
+        preceding_quotes = numpy.searchsorted(quotes, key_start)
+        if preceding_quotes % 2 or preceding_quotes >= len(quotes) or quotes[preceding_quotes] != key_start:
+            continue
+        previous = numpy.searchsorted(structural, key_start) - 1
+        if previous < 0 or depth[previous] != 1:
+            continue
+        start = _array_after_key(body, key_start + len(quoted_key))
+        if start is not None:
+            break
+    first = numpy.searchsorted(structural, start)
+    after = depth[first:]
+    ends = numpy.flatnonzero(after == 1)
+    if not len(ends):
+        return None
+    end = first + ends[0]
+    inner = numpy.arange(first + 1, end)
+    separators = structural[inner[(delta[inner] == 0) & (depth[inner] == 2)]]
+    return start, [int(i) for i in separators] + [int(structural[end])]
+
+
+def split_records(body, key='data'):
+    """
+    Find the records of the array value of a key of the top level object of a json document
+
+    Args:
+        body (bytes): json document, encoded as utf-8
+        key (str): key of the array
+
+    Returns:
+        tuple: a list with the bytes of each record, with no whitespace around them or newlines, and the document
+            without the array elements, or None if the document has no such key
+    """
+    quoted_key = b'"' + key.encode('utf-8') + b'"'
+    if quoted_key not in body:
+        return None
+    split = _split_numpy(body, quoted_key) if numpy_available else _split_python(body, quoted_key)
+    if split is None:
+        return None
+    start, separators = split
+    records = []
+    previous = start
+    for separator in separators:
+        record = body[previous + 1:separator].strip(_WHITESPACE)
+        if record:
+            records.append(record)
+        previous = separator
+    if b'\n' in body or b'\r' in body:
+        # raw newlines are never part of json strings
+        records = [i.translate(None, b'\r\n') for i in records]
+    return records, body[:start + 1] + body[separators[-1]:]
@@ -0,0 +1,199 @@
+"""
+This module recomputes association scores from evidence, E.g. the results of ``OpenTargetsClient.filter_evidence``,
+with custom datasource weights.
+
+Evidence scores are collected in a ``HarmonicSumScorer`` per target, disease and datatype. When too many scorers are
+held in memory they are written to disk in sorted runs, which are merged when the associations are produced, so that
+any number of evidence can be scored with bounded memory.
+"""
+import heapq
+import logging
+import os
+import shutil
+import struct
+import tempfile
+from itertools import groupby
+
+from opentargets.statistics import HarmonicSumScorer
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.WARNING)
+
+_LENGTHS = struct.Struct('<HHHI')
+
+
+def _get(record, *keys):
+    for key in keys:
+        if not isinstance(record, dict):
+            return None
+        record = record.get(key)
+    return record
+
+
+def _write_run(path, items):
+    with open(path, 'wb') as fh:
+        for (target, disease, datatype), scorer in items:
+            key = [target.encode('utf-8'), disease.encode('utf-8'), datatype.encode('utf-8')]
+            state = scorer.to_bytes()
+            fh.write(_LENGTHS.pack(len(key[0]), len(key[1]), len(key[2]), len(state)))
+            fh.write(b''.join(key) + state)
+
+
+def _read_run(path):
+    with open(path, 'rb') as fh:
+        while True:
+            lengths = fh.read(_LENGTHS.size)
+            if not lengths:
+                return
+            target, disease, datatype, state = _LENGTHS.unpack(lengths)
+            record = fh.read(target + disease + datatype + state)
+            key = (record[:target].decode('utf-8'),
+                   record[target:target + disease].decode('utf-8'),
+                   record[target + disease:target + disease + datatype].decode('utf-8'))
+            yield key, record[target + disease + datatype:]
+
+
+class AssociationScoreEngine(object):
+    """
+    Computes association scores from a stream of evidence.
+    The score of an evidence is multiplied by the weight of its datasource, or of its datatype, and the datatype score
+    of an association is the harmonic sum of the top `buffer` weighted evidence scores of that datatype.
+    The overall score is the harmonic sum of the datatype scores.
+    """
+
+    def __init__(self,
+                 weights=None,
+                 buffer=100,
+                 scale_factor=1,
+                 cap=1.,
+                 max_scorers=500000,
+                 spill_directory=None):
+        """
+        Args:
+            weights (dict): weight of each datasource (E.g. 'europepmc') or datatype (E.g. 'literature'),
+                datasource weights are used first. Defaults to 1, evidence with a weight of 0 are ignored
+            buffer (int): number of evidence scores kept for each target, disease and datatype
+            scale_factor (float): scaling factor of the harmonic sums. See ``HarmonicSumScorer.harmonic_sum``
+            cap (float): maximum of the datatype and overall scores, None to not cap them
+            max_scorers (int): number of scorers held in memory before writing them to disk
+            spill_directory (str): directory of the temporary files. Defaults to the system temporary directory
+        """
+        self.weights = weights or {}
+        self.buffer = buffer
+        self.scale_factor = scale_factor
+        self.cap = cap
+        self.max_scorers = max_scorers
+        self.spill_directory = spill_directory
+        self.evidence_count = 0
+        self.skipped = 0
+        self._scorers = {}
+        self._runs = []
+        self._directory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def _weight(self, datasource, datatype):
+        if datasource in self.weights:
+            return self.weights[datasource]
+        return self.weights.get(datatype, 1.)
+
+    def add(self, evidence):
+        """
+        Add the score of an evidence
+
+        Args:
+            evidence (dict): an evidence as returned by ``OpenTargetsClient.filter_evidence``, with target.id,
+                disease.id, type, sourceID and scores.association_score
+        """
+        target = _get(evidence, 'target', 'id')
+        disease = _get(evidence, 'disease', 'id')
+        datatype = evidence.get('type')
+        score = _get(evidence, 'scores', 'association_score')
+        if not (target and disease and datatype) or score is None:
+            self.skipped += 1
+            return
+        weight = self._weight(evidence.get('sourceID'), datatype)
+        if not weight:
+            return
+        key = (target, disease, datatype)
+        scorer = self._scorers.get(key)
+        if scorer is None:
+            if len(self._scorers) >= self.max_scorers:
+                self._spill()
+            scorer = self._scorers[key] = HarmonicSumScorer(buffer=self.buffer)
+        scorer.add(float(score) * weight)
+        self.evidence_count += 1
+
+    def add_all(self, evidence):
+        """
+        Add the scores of many evidence
+
+        Args:
+            evidence: an iterable of evidence, E.g. the result of ``OpenTargetsClient.filter_evidence``
+        Returns:
+            AssociationScoreEngine: returns itself
+        """
+        for i in evidence:
+            self.add(i)
+        return self
+
+    def _spill(self):
+        """
+        Write the scorers held in memory to a run sorted by target, disease and datatype
+        """
+        if self._directory is None:
+            self._directory = tempfile.mkdtemp(prefix='opentargets-scoring-', dir=self.spill_directory)
+        path = os.path.join(self._directory, 'run-{:06d}'.format(len(self._runs)))
+        _write_run(path, sorted(self._scorers.items(), key=lambda i: i[0]))
+        logger.debug('%i scorers written to %s', len(self._scorers), path)
+        self._runs.append(path)
+        self._scorers = {}
+
+    def _merged_scorers(self):
+        """
+        Yield a scorer per target, disease and datatype in order, merging the runs and the scorers in memory
+        """
+        sources = [_read_run(i) for i in self._runs]
+        sources.append(sorted(self._scorers.items(), key=lambda i: i[0]))
+        for key, group in groupby(heapq.merge(*sources, key=lambda i: i[0]), key=lambda i: i[0]):
+            scorer = None
+            for _, state in group:
+                if isinstance(state, bytes):
+                    state = HarmonicSumScorer.from_bytes(state)
+                scorer = state if scorer is None else scorer.merge(state)
+            yield key, scorer
+
+    def associations(self):
+        """
+        Yield the associations, sorted by target and disease, with the same layout of the associations returned by
+        ``OpenTargetsClient.filter_associations``. They can be saved, E.g. with
+        ``opentargets.matrix.build_score_matrix``
+
+        Returns:
+            an iterator of dict with id, target.id, disease.id and association_score.overall and datatypes
+        """
+        for (target, disease), group in groupby(self._merged_scorers(), key=lambda i: i[0][:2]):
+            datatypes = dict((key[2], scorer.score(scale_factor=self.scale_factor, cap=self.cap))
+                             for key, scorer in group)
+            overall = HarmonicSumScorer.harmonic_sum(list(datatypes.values()), scale_factor=self.scale_factor,
+                                                     cap=self.cap)
+            yield {'id': '{}-{}'.format(target, disease),
+                   'target': {'id': target},
+                   'disease': {'id': disease},
+                   'association_score': {'overall': overall, 'datatypes': datatypes}}
+
+    def __iter__(self):
+        return self.associations()
+
+    def close(self):
+        """
+        Remove the temporary files
+        """
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+            self._runs = []
@@ -1,15 +1,38 @@
+import heapq
+import struct
+
+try:
+    import numpy
+    numpy_available = True
+except ImportError:
+    numpy_available = False
+
+
 class HarmonicSumScorer():
 
+    _header = struct.Struct('<4sII')
+    _magic = b'HSS1'
+
     def __init__(self, buffer = 100):
         """
         An HarmonicSumScorer will ingest any number of numeric score, keep in memory the top max number
-        defined by the buffer and calculate an harmonic sum of those
+        defined by the buffer and calculate an harmonic sum of those.
+        The pool of values is a min heap, so that adding a score costs O(log buffer)
         Args:
             buffer: number of element to keep in memory to compute the harmonic sum
         """
         self.buffer = buffer
         self.data = []
-        self.refresh()
+        self._sorted = None
+
+    @property
+    def min(self):
+        """
+        The minimum value of the pool, 0 if the pool is empty
+        """
+        if self.data:
+            return self.data[0]
+        return 0.
 
     def add(self, score):
         """
@@ -19,24 +42,74 @@ class HarmonicSumScorer():
 
         """
         score = float(score)
-        if len(self.data)>= self.buffer:
-            if score >self.min:
-                self.data[self.data.index(self.min)] = score
-                self.refresh()
-        else:
-            self.data.append(score)
-            self.refresh()
-
+        if len(self.data) < self.buffer:
+            heapq.heappush(self.data, score)
+            self._sorted = None
+        elif self.data and score > self.data[0]:
+            heapq.heapreplace(self.data, score)
+            self._sorted = None
 
     def refresh(self):
         """
-        Store the minimum value of the pool
+        Restore the order of the pool of values after `data` is changed directly
 
         """
-        if self.data:
-            self.min = min(self.data)
-        else:
-            self.min = 0.
+        heapq.heapify(self.data)
+        self._sorted = None
+
+    def merge(self, other):
+        """
+        Add the pool of values of another scorer, keeping the top values of both. Scorers filled with parts of the
+        same scores merge to a scorer with the same pool as if it got all the scores, as long as the other scorer
+        keeps at least as many values. Scorers can be merged in any order, E.g. with ``functools.reduce``
+        Args:
+            other (HarmonicSumScorer): the scorer to merge
+        Returns:
+            HarmonicSumScorer: this scorer
+        Raises:
+            ValueError: if the other scorer keeps fewer values than this scorer
+        """
+        if other.buffer < self.buffer:
+            raise ValueError('cannot merge a scorer with buffer {} in a scorer with buffer {}'.format(other.buffer,
+                                                                                                   self.buffer))
+        if other.data:
+            self.data = heapq.nlargest(self.buffer, self.data + other.data)
+            self.data.reverse()
+            self._sorted = None
+        return self
+
+    def to_bytes(self):
+        """
+        Serialise the buffer size and the pool of values, as little endian doubles sorted in descending order
+        Returns:
+            bytes: the state of the scorer
+        """
+        if self._sorted is None:
+            self._sorted = sorted(self.data, reverse=True)
+        return self._header.pack(self._magic, self.buffer, len(self._sorted)) + \
+            struct.pack('<{:d}d'.format(len(self._sorted)), *self._sorted)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Create a scorer from the output of ``HarmonicSumScorer.to_bytes``
+        Args:
+            data (bytes): the state of a scorer
+        Returns:
+            HarmonicSumScorer: the scorer
+        Raises:
+            ValueError: if data is not the state of a scorer
+        """
+        if len(data) < cls._header.size:
+            raise ValueError('{} bytes are not the state of a HarmonicSumScorer'.format(len(data)))
+        magic, buffer, count = cls._header.unpack_from(data)
+        if magic != cls._magic or len(data) != cls._header.size + 8 * count:
+            raise ValueError('{} bytes are not the state of a HarmonicSumScorer'.format(len(data)))
+        scorer = cls(buffer=buffer)
+        scorer._sorted = list(struct.unpack_from('<{:d}d'.format(count), data, cls._header.size))
+        # a list in ascending order is a min heap
+        scorer.data = scorer._sorted[::-1]
+        return scorer
 
     def score(self, *args,**kwargs):
         """
@@ -48,7 +121,9 @@ class HarmonicSumScorer():
         Returns:
             harmonic_sum (float): the harmonic sum of the pool of values
         """
-        return self.harmonic_sum(self.data, *args, **kwargs)
+        if self._sorted is None:
+            self._sorted = sorted(self.data, reverse=True)
+        return self._harmonic_sum_sorted(self._sorted, *args, **kwargs)
 
     @staticmethod
     def harmonic_sum(data,
@@ -65,8 +140,56 @@ class HarmonicSumScorer():
             harmonic_sum (float): the harmonic sum of the data passed
         """
         data.sort(reverse=True)
+        return HarmonicSumScorer._harmonic_sum_sorted(data, scale_factor=scale_factor, cap=cap)
+
+    @staticmethod
+    def _harmonic_sum_sorted(data,
+                             scale_factor = 1,
+                             cap = None):
         harmonic_sum = sum(s / ((i+1) ** scale_factor) for i, s in enumerate(data))
         if cap is not None and \
                         harmonic_sum > cap:
             return cap
-        return harmonic_sum
\ No newline at end of file
+        return harmonic_sum
+
+
+def harmonic_sums(scores,
+                  weights = None,
+                  scale_factor = 1,
+                  cap = None):
+    """
+    Returns the harmonic sums of many sets of scores at once, E.g. of the datatype scores of many associations.
+    Each row gives the same result as ``HarmonicSumScorer.harmonic_sum`` of its weighted values, without changing
+    the scores passed
+    Args:
+        scores (numpy.ndarray): 2-D array with a row per set of scores, E.g. a row per association and a column per
+            datatype. Missing values can be 0 or NaN
+        weights (list): if not None, weights multiplied to each column before sorting the scores
+        scale_factor (float): a scaling factor to multiply to each datapoint. Defaults to 1
+        cap (float): if not None, never return an harmonic sum higher than the cap value.
+
+    Returns:
+        numpy.ndarray: the harmonic sum of each row
+    Raises:
+        ImportError: if numpy is not available
+        ValueError: if scores are not 2-D or weights do not match the columns
+    """
+    if not numpy_available:
+        raise ImportError('numpy library is not installed but is required to compute harmonic sums in batch, '
+                          'install opentargets[numpy]')
+    scores = numpy.array(scores, dtype=numpy.float64)
+    if scores.ndim != 2:
+        raise ValueError('scores must be a 2-D array, got {} dimensions'.format(scores.ndim))
+    numpy.nan_to_num(scores, copy=False)
+    if weights is not None:
+        weights = numpy.asarray(weights, dtype=numpy.float64)
+        if weights.shape != (scores.shape[1],):
+            raise ValueError('{} weights given for {} columns'.format(weights.size, scores.shape[1]))
+        scores *= weights
+    # sorted in ascending order, the ranks run backwards
+    scores.sort(axis=1)
+    factors = 1. / numpy.arange(scores.shape[1], 0, -1, dtype=numpy.float64) ** scale_factor
+    sums = scores.dot(factors)
+    if cap is not None:
+        numpy.minimum(sums, cap, out=sums)
+    return sums
@@ -31,10 +31,27 @@ setup(name=__pkgname__,
         'cachecontrol==0.11.6',
         'future==0.16.0',
         'PyYAML',
-        'addict'],
+        'addict',
+        'futures; python_version < "3"'],
     extras_require={
+        'async': [
+            'aiohttp'
+            ],
+        'fast': [
+            'orjson'
+            ],
+        'zstd': [
+            'zstandard'
+            ],
+        'arrow': [
+            'pyarrow>=14'
+            ],
+        'numpy': [
+            'numpy'
+            ],
         'tests': [
             'nose',
+            'numpy',
             'pandas',
             'xlwt',
             'tqdm'
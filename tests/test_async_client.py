@@ -0,0 +1,45 @@
+import asyncio
+import unittest
+
+try:
+    from opentargets.async_client import AsyncOpenTargetsClient
+    from opentargets.async_conn import aiohttp_available
+except ImportError:
+    aiohttp_available = False
+
+
+@unittest.skipUnless(aiohttp_available, 'aiohttp is not installed')
+class AsyncOpenTargetClientTest(unittest.TestCase):
+
+    def run_async(self, coroutine):
+        async def wrapped():
+            async with AsyncOpenTargetsClient() as client:
+                return await coroutine(client)
+        return asyncio.run(wrapped())
+
+    def testSearchTargetCorrectResult(self):
+        async def search(client):
+            response = await client.search('BRAF')
+            self.assertGreater(len(response), 0)
+            return await response.__anext__()
+        result = self.run_async(search)
+        self.assertEqual(result['type'], 'search-object-target')
+        self.assertEqual(result['id'], 'ENSG00000157764')
+
+    def testGetAssociationsForTargetConcurrently(self):
+        target_symbols = ['BRAF', 'KRAS', 'PIK3CA']
+
+        async def fetch(client):
+            responses = await asyncio.gather(*[client.get_associations_for_target(t, size=10)
+                                               for t in target_symbols])
+            return [await r.__anext__() for r in responses]
+        results = self.run_async(fetch)
+        for target_symbol, result in zip(target_symbols, results):
+            self.assertEqual(result['target']['gene_info']['symbol'], target_symbol)
+
+    def testFetchAllResults(self):
+        async def fetch(client):
+            response = await client.search('BRAF')
+            return len(response), len(await response.to_list())
+        total_results, fetched = self.run_async(fetch)
+        self.assertEqual(total_results, fetched)
@@ -0,0 +1,135 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+
+from opentargets.cache import JSONFileCache, PickleFileCache, ResolutionCache, SQLiteHTTPCache
+
+
+class ResolutionCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.cache_dir, 'resolution.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def testPersistAcrossInstances(self):
+        cache = ResolutionCache(self.path, '3.0.0')
+        cache.set('target', 'BRAF', 'ENSG00000157764')
+        cache.close()
+        cache = ResolutionCache(self.path, '3.0.0')
+        self.assertEqual(cache.get('target', 'BRAF'), 'ENSG00000157764')
+        self.assertIsNone(cache.get('disease', 'BRAF'))
+        cache.close()
+
+    def testKeyedByApiVersion(self):
+        cache = ResolutionCache(self.path, '3.0.0')
+        cache.set('target', 'BRAF', 'ENSG00000157764')
+        other_version = ResolutionCache(self.path, '3.1.0')
+        self.assertIsNone(other_version.get('target', 'BRAF'))
+        self.assertEqual(cache.get('target', 'BRAF'), 'ENSG00000157764')
+
+    def testExpiredEntries(self):
+        cache = ResolutionCache(self.path, '3.0.0', ttl=0.01)
+        cache.set('target', 'BRAF', 'ENSG00000157764')
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('target', 'BRAF'))
+        self.assertEqual(len(cache), 0)
+
+    def testEvictLeastRecentlyUsed(self):
+        cache = ResolutionCache(self.path, '3.0.0', max_entries=2)
+        cache.set('target', 'BRAF', 'ENSG00000157764')
+        time.sleep(0.01)
+        cache.set('target', 'KRAS', 'ENSG00000133703')
+        time.sleep(0.01)
+        cache.get('target', 'BRAF')
+        cache.set('target', 'PIK3CA', 'ENSG00000121879')
+        cache.evict()
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('target', 'KRAS'))
+        self.assertEqual(cache.get('target', 'BRAF'), 'ENSG00000157764')
+
+
+class JSONFileCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def testSetAndGet(self):
+        cache = JSONFileCache(os.path.join(self.cache_dir, 'api_specs'))
+        self.assertIsNone(cache.get('https://platform-api.opentargets.io:443|3.0.0'))
+        specs = {'paths': {'/public/search': {'get': {'parameters': [{'name': 'q'}]}}}}
+        cache.set('https://platform-api.opentargets.io:443|3.0.0', specs)
+        self.assertEqual(cache.get('https://platform-api.opentargets.io:443|3.0.0'), specs)
+        self.assertIsNone(cache.get('https://platform-api.opentargets.io:443|3.1.0'))
+        self.assertEqual(len(os.listdir(cache.directory)), 1)
+
+    def testPickleKeepsTypes(self):
+        cache = PickleFileCache(os.path.join(self.cache_dir, 'api_specs'))
+        specs = {'responses': {200: {'description': 'ok'}}, 'released': datetime(2018, 2, 1)}
+        cache.set('https://platform-api.opentargets.io:443|3.0.0', specs)
+        self.assertEqual(cache.get('https://platform-api.opentargets.io:443|3.0.0'), specs)
+        with open(cache._path('corrupted'), 'wb') as fh:
+            fh.write(b'\x80\x02}q')
+        self.assertIsNone(cache.get('corrupted'))
+
+
+class SQLiteHTTPCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.cache_dir, 'http_cache.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def testSharedBetweenInstances(self):
+        cache = SQLiteHTTPCache(self.path)
+        cache.set('https://platform-api.opentargets.io/v3/platform/public/utils/stats', b'{"total": 1}')
+        other_process_cache = SQLiteHTTPCache(self.path)
+        self.assertEqual(other_process_cache.get('https://platform-api.opentargets.io/v3/platform/public/utils/stats'),
+                         b'{"total": 1}')
+        other_process_cache.delete('https://platform-api.opentargets.io/v3/platform/public/utils/stats')
+        self.assertIsNone(cache.get('https://platform-api.opentargets.io/v3/platform/public/utils/stats'))
+
+    def testBoundedSize(self):
+        cache = SQLiteHTTPCache(self.path, max_bytes=1000)
+        for i in range(20):
+            cache.set(str(i), b'x' * 100)
+            time.sleep(0.001)
+        self.assertLessEqual(cache.size, 1000)
+        self.assertIsNone(cache.get('0'))
+        self.assertIsNotNone(cache.get('19'))
+
+    def testExpires(self):
+        cache = SQLiteHTTPCache(self.path)
+        cache.set('expired', b'x', expires=-1)
+        cache.set('fresh', b'x', expires=60)
+        self.assertIsNone(cache.get('expired'))
+        self.assertEqual(cache.get('fresh'), b'x')
+
+    def testExpiresDatetimeInUTC(self):
+        cache = SQLiteHTTPCache(self.path)
+        cache.set('fresh', b'x', expires=datetime.utcnow() + timedelta(seconds=60))
+        cache.set('expired', b'x', expires=datetime.utcnow() - timedelta(seconds=60))
+        expires = cache._execute('SELECT expires FROM http_cache WHERE key=?', ('fresh',))[0][0]
+        self.assertAlmostEqual(expires, time.time() + 60, delta=5)
+        self.assertEqual(cache.get('fresh'), b'x')
+        self.assertIsNone(cache.get('expired'))
+
+    def testSizeKeptByTriggers(self):
+        cache = SQLiteHTTPCache(self.path)
+        cache.set('a', b'x' * 10)
+        cache.set('b', b'x' * 20)
+        cache.set('a', b'x' * 5)
+        self.assertEqual(cache.size, 25)
+        other_process_cache = SQLiteHTTPCache(self.path)
+        other_process_cache.delete('b')
+        self.assertEqual(cache.size, 5)
+        cache.clear()
+        self.assertEqual(cache.size, 0)
+        self.assertEqual(cache._execute('SELECT COALESCE(SUM(size), 0) FROM http_cache')[0][0], cache.size)
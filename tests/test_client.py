@@ -4,7 +4,9 @@ import os
 import unittest
 
 from opentargets import Connection
+from opentargets.conn import request_key
 from opentargets import OpenTargetsClient
+from opentargets import Partition
 from opentargets.statistics import HarmonicSumScorer
 
 logger = logging.getLogger(__name__)
@@ -46,6 +48,44 @@ class OpenTargetClientTest(unittest.TestCase):
         self.assertEqual(result['type'], 'search-object-disease')
         self.assertEqual(result['id'], 'EFO_0000311')
 
+    def testPrefetchFetchAllResults(self):
+        response = self.client.get_associations_for_target('BRAF', size=100)
+        total_results = len(response)
+        self.assertGreater(total_results, 0)
+        ids = [i['id'] for i in response.prefetch(2)]
+        self.assertEqual(total_results, len(ids))
+        self.assertEqual(total_results, len(set(ids)))
+
+    def testStreamFetchAllResults(self):
+        response = self.client.get_associations_for_target('BRAF', size=100)
+        ids = [i['id'] for i in response]
+        streamed_ids = [i['id'] for i in self.client.get_associations_for_target('BRAF', size=100).stream()]
+        self.assertEqual(ids, streamed_ids)
+
+    def testParallelFetchAllResults(self):
+        response = self.client.filter_associations(target='ENSG00000157764')
+        total_results = len(response)
+        ids = [i['id'] for i in self.client.filter_associations(target='ENSG00000157764').parallel(4)]
+        self.assertEqual(total_results, len(ids))
+        unordered_ids = [i['id'] for i in self.client.filter_associations(target='ENSG00000157764').parallel(4, ordered=False)]
+        self.assertEqual(sorted(ids), sorted(unordered_ids))
+
+    def testPartitionedFilterEvidence(self):
+        target_ids = ['ENSG00000157764', 'ENSG00000133703', 'ENSG00000121879']
+        response = self.client.filter_evidence(target=target_ids)
+        partitioned = self.client.filter_evidence(partition_by='target',
+                                                  partition_values=target_ids,
+                                                  workers=3)
+        self.assertEqual(len(partitioned.partitions), 1)
+        self.assertEqual(len(response), len(partitioned))
+
+    def testPartitionSerialisation(self):
+        partitions = self.client.partition(self.client._filter_associations_endpoint, 'datatype', scorevalue_min=0.2)
+        self.assertEqual(len(partitions), 7)
+        self.assertEqual([Partition.from_json(p.to_json()) for p in partitions], partitions)
+        response = self.client.fetch_partitions(partitions[:1])
+        self.assertEqual(len(response), len(partitions[0].fetch(self.client.conn)))
+
     # #this takes a lot to run
     # def testSearchDiseaseFetchAllResults(self):
     #     disease_label = 'cancer'
@@ -104,6 +144,16 @@ class OpenTargetClientTest(unittest.TestCase):
             if i>90:
                 break
 
+    def testGetAssociationsForTargets(self):
+        target_symbols = ['BRAF', 'KRAS', 'ENSG00000121879']
+        resolved = self.client.resolve_targets(target_symbols)
+        self.assertEqual(resolved['BRAF'], 'ENSG00000157764')
+        self.assertEqual(resolved['ENSG00000121879'], 'ENSG00000121879')
+        response = self.client.get_associations_for_targets(target_symbols, size=100)
+        self.assertGreater(len(response), 0)
+        symbols = set(result['target']['gene_info']['symbol'] for result in response)
+        self.assertEqual(symbols, {'BRAF', 'KRAS', 'PIK3CA'})
+
     def testGetAssociationsForDisease(self):
         disease_label = 'cancer'
         response = self.client.get_associations_for_disease(disease_label)
@@ -224,6 +274,22 @@ class OpenTargetClientTest(unittest.TestCase):
         self.assertTrue(os.path.isfile(filename))
         os.remove(filename)
 
+    def testResumeResultToFile(self):
+        filename = 'braf_associations_resumed.json'
+        ids = [i['id'] for i in self.client.filter_associations(target='ENSG00000157764')]
+        self.assertGreater(len(ids), 1000)
+        response = self.client.filter_associations(target='ENSG00000157764')
+        with open(filename, 'wb') as fh:
+            fh.write(b'{"interrupted":')
+        with open(filename + '.checkpoint', 'w') as fh:
+            json.dump({'query': response._query_key(), 'current': 1000, 'next': None, 'position': 0}, fh)
+        response.to_file(filename, compress=False, resume=True)
+        with open(filename, 'rb') as fh:
+            saved_ids = [json.loads(line.decode('utf-8'))['id'] for line in fh]
+        self.assertEqual(saved_ids, ids[1000:])
+        self.assertFalse(os.path.exists(filename + '.checkpoint'))
+        os.remove(filename)
+
 
     def testSerialiseToObject(self):
         target_symbol = 'BRAF'
@@ -248,6 +314,26 @@ class OpenTargetClientTest(unittest.TestCase):
                                                                  'ENSG00000139618',
                                                                  ]}))
 
+    def testCanonicalRequestKey(self):
+        target_ids = ['ENSG00000157764', 'ENSG00000171862', 'ENSG00000136997', 'ENSG00000012048']
+        self.assertEqual(request_key('/platform/public/association/filter', {'target': target_ids, 'direct': True}),
+                         request_key('/platform/public/association/filter', {'target': target_ids[::-1],
+                                                                             'direct': 'true'}))
+        self.assertEqual(request_key('/platform/public/association/filter', {'target': ['ENSG00000157764']}),
+                         request_key('/platform/public/association/filter', {'target': 'ENSG00000157764'}))
+        self.assertNotEqual(request_key('/platform/public/association/filter', {'sort': ['a', 'b']}),
+                            request_key('/platform/public/association/filter', {'sort': ['b', 'a']}))
+
+    def testResponseCacheGetAndPost(self):
+        client = OpenTargetsClient(response_cache_size=10)
+        target_ids = ['ENSG00000157764', 'ENSG00000171862', 'ENSG00000136997', 'ENSG00000012048']
+        response = client.filter_associations(target=target_ids)
+        self.assertEqual(len(client.conn._response_cache), 1)
+        response_reversed = client.filter_associations(target=target_ids[::-1])
+        self.assertEqual(len(client.conn._response_cache), 1)
+        self.assertEqual(len(response), len(response_reversed))
+        client.close()
+
     def testGetToPost(self):
         response = self.client.conn.get('/platform/public/association/filter', params={'target': ['ENSG00000157764',
                                                                                          'ENSG00000171862',
@@ -0,0 +1,311 @@
+import gc
+import json
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import weakref
+from itertools import islice
+
+from opentargets.conn import BufferedResponse, Connection, IterableResult, SingleFlight, StreamingResponse
+
+
+class FakeStreamedResponse(object):
+    """
+    Mimics a requests response opened with stream=True, returning the body in chunks of a fixed size
+    """
+
+    def __init__(self, body, chunk_size):
+        self.content = body.encode('utf-8')
+        self.chunk_size = chunk_size
+        self.headers = {}
+        self.encoding = 'utf-8'
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.content), self.chunk_size):
+            yield self.content[i:i + self.chunk_size]
+
+    def close(self):
+        pass
+
+
+class StreamingResponseTest(unittest.TestCase):
+    page = {'total': 3,
+            'data': [{'id': 'ENSG00000157764-EFO_0005803', 'label': u'café "au lait"'},
+                     {'id': 'ENSG00000157764-EFO_0000311', 'score': 12345},
+                     {'id': 'ENSG00000157764-EFO_0000616', 'scores': [1, 0.5, {'value': None}]}],
+            'next': [0.25, 'ENSG00000157764-EFO_0000616'],
+            'from': 0,
+            'took': 1e-07}
+
+    def testParseInAnyChunkSize(self):
+        body = json.dumps(self.page, indent=1, ensure_ascii=False)
+        for chunk_size in (1, 2, 7, 64, 100000):
+            response = StreamingResponse(FakeStreamedResponse(body, chunk_size))
+            self.assertEqual(list(response.iter_data()), self.page['data'])
+            self.assertEqual(response.count, 3)
+            self.assertEqual(response.info.total, 3)
+            self.assertEqual(response.info.next_, self.page['next'])
+            self.assertEqual(response.info.from_, 0)
+            self.assertEqual(response.info.took, 1e-07)
+
+    def testInfoBeforeData(self):
+        response = StreamingResponse(FakeStreamedResponse(json.dumps(self.page), 5))
+        self.assertEqual(len(response), 3)
+        self.assertEqual(response.data, self.page['data'])
+
+    def testResponseWithoutData(self):
+        response = StreamingResponse(FakeStreamedResponse('{"id": "ENSG00000157764"}', 3))
+        self.assertEqual(response.data, [{'id': 'ENSG00000157764'}])
+
+    def testTruncatedResponse(self):
+        response = StreamingResponse(FakeStreamedResponse('{"data": [{"id": 1}, {"id"', 3))
+        with self.assertRaises(ValueError):
+            list(response.iter_data())
+
+
+def run_threads(n, target):
+    started = threading.Barrier(n + 1)
+    results = [None] * n
+
+    def run(i):
+        started.wait()
+        try:
+            results[i] = target(i)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    started.wait()
+    return threads, results
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def testConcurrentCallsShareResult(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def function(value):
+            calls.append(value)
+            release.wait(5)
+            return object()
+
+        threads, results = run_threads(8, lambda i: flight.do('key', function, i))
+        time.sleep(.2)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(i is results[0] for i in results))
+        self.assertEqual(len(flight), 0)
+        self.assertIsNot(flight.do('key', function, 0), results[0])
+        self.assertEqual(len(calls), 2)
+
+    def testConcurrentCallsShareException(self):
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def function():
+            release.wait(5)
+            raise ValueError('failed')
+
+        threads, results = run_threads(4, lambda i: flight.do('key', function))
+        time.sleep(.2)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(all(isinstance(i, ValueError) for i in results))
+        self.assertEqual(len(flight), 0)
+
+    def testDifferentKeys(self):
+        flight = SingleFlight()
+        self.assertEqual([flight.do(i, lambda i: i * 2, i) for i in range(3)], [0, 2, 4])
+
+
+class CoalescedRequestsTest(unittest.TestCase):
+
+    def _connection(self, coalesce_requests=True):
+        conn = Connection(coalesce_requests=coalesce_requests)
+        conn.requests = []
+
+        def make_request(endpoint, params=None, data=None, method=None, **kwargs):
+            conn.requests.append((method, endpoint, params, data))
+            time.sleep(.2)
+            return BufferedResponse(json.dumps({'data': [{'id': endpoint}], 'total': 1}).encode('utf-8'))
+
+        conn._make_request = make_request
+        return conn
+
+    def testIdenticalQueriesShareRequest(self):
+        conn = self._connection()
+        params = [{'target': ['ENSG2', 'ENSG1'], 'direct': True},
+                  {'direct': True, 'target': ('ENSG1', 'ENSG2', 'ENSG1')}]
+        threads, results = run_threads(6, lambda i: conn.get('/platform/public/association/filter',
+                                                             params=params[i % 2]))
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(conn.requests), 1)
+        self.assertTrue(all(i is results[0] for i in results))
+        self.assertEqual(results[0].data, [{'id': '/platform/public/association/filter'}])
+
+    def testDifferentQueriesAreNotShared(self):
+        conn = self._connection()
+        queries = [lambda: conn.get('/platform/public/association/filter', params={'target': 'ENSG1'}),
+                   lambda: conn.get('/platform/public/association/filter', params={'target': 'ENSG2'}),
+                   lambda: conn.post('/platform/public/association/filter', data={'target': 'ENSG1'}),
+                   lambda: conn.get('/platform/public/association/filter', params={'target': 'ENSG1'}, raw=True)]
+        threads, results = run_threads(len(queries), lambda i: queries[i]())
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(conn.requests), len(queries))
+
+    def testCoalescingDisabled(self):
+        self.assertFalse(Connection().coalesce_requests)
+        conn = self._connection(coalesce_requests=False)
+        threads, results = run_threads(3, lambda i: conn.get('/platform/public/association/filter',
+                                                             params={'target': 'ENSG1'}))
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(conn.requests), 3)
+
+
+class PrefetchTest(unittest.TestCase):
+
+    def _result(self, total=100000):
+        conn = Connection()
+
+        def make_request(endpoint, params=None, data=None, method=None, **kwargs):
+            params = dict(params or [])
+            start = int(params.get('from', 0))
+            page = [{'id': i} for i in range(start, min(start + int(params.get('size', 10)), total))]
+            return BufferedResponse(json.dumps({'data': page, 'total': total, 'size': len(page),
+                                                'from': start}).encode('utf-8'))
+
+        conn._make_request = make_request
+        result = IterableResult(conn)
+        result('/platform/public/association/filter')
+        return result.prefetch(2)
+
+    def _wait_stopped(self, thread):
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+    def testAbandonedIterationIsCollected(self):
+        result = self._result()
+        for i in result:
+            if i['id'] == 1500:
+                break
+        thread = result._pages._thread
+        self.assertTrue(thread.is_alive())
+        collected = weakref.ref(result)
+        del result
+        # a page being fetched refers to the result until the fetch ends
+        for _ in range(50):
+            gc.collect()
+            if collected() is None:
+                break
+            time.sleep(.1)
+        self.assertIsNone(collected())
+        self._wait_stopped(thread)
+
+    def testClose(self):
+        result = self._result()
+        self.assertEqual([i['id'] for i in islice(result, 1200)], list(range(1200)))
+        thread = result._pages._thread
+        result.close()
+        self._wait_stopped(thread)
+        self.assertIsNone(result._pages)
+
+    def testFetchAll(self):
+        result = self._result(total=2500)
+        self.assertEqual([i['id'] for i in result], list(range(2500)))
+
+    def testPositionTakenByConsumer(self):
+        result = self._result(total=2500)
+        pages = result._fetch_pages(result._position())
+        # the consumer moved its cursor but did not count the result yet when the pages start being fetched
+        result._cursor += 1
+        self.assertEqual(next(pages).data[0]['id'], 10)
+        pages.close()
+
+    def testCloseStopsParallelFetching(self):
+        result = self._result().parallel(2)
+        closed = []
+        fetch_pages_parallel = result._fetch_pages_parallel
+
+        def tracked(position):
+            try:
+                for page in fetch_pages_parallel(position):
+                    yield page
+            finally:
+                closed.append(True)
+
+        result._fetch_pages_parallel = tracked
+        self.assertEqual([i['id'] for i in islice(result, 1200)], list(range(1200)))
+        thread = result._pages._thread
+        result.close()
+        self._wait_stopped(thread)
+        self.assertEqual(closed, [True])
+
+
+SWAGGER = """
+swagger: '2.0'
+info:
+  version: 3.0.0
+paths:
+  /public/association/filter:
+    get:
+      parameters:
+        - name: target
+          type: string
+        - name: size
+          type: integer
+      responses:
+        200:
+          description: associations
+        404:
+          description: not found
+"""
+
+
+class ApiSpecsCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def _connection(self, swagger):
+        conn = Connection(cache_dir=self.cache_dir)
+        conn._remote_version = '3.0.0'
+        conn.requests = []
+
+        class SwaggerResponse(object):
+            text = swagger
+
+            def raise_for_status(self):
+                pass
+
+        def get(url, **kwargs):
+            conn.requests.append(url)
+            return SwaggerResponse()
+
+        conn.session.get = get
+        return conn
+
+    def testCachedSpecsEqualFreshSpecs(self):
+        fresh = self._connection(SWAGGER)
+        docs = fresh.api_endpoint_docs('/public/association/filter')
+        self.assertEqual(sorted(docs['get']['responses']), [200, 404])
+        cached = self._connection(None)
+        self.assertEqual(cached.api_specs, fresh.api_specs)
+        self.assertEqual(cached.endpoint_validation_data, fresh.endpoint_validation_data)
+        self.assertEqual(cached.api_endpoint_docs('/public/association/filter'), docs)
+        self.assertEqual((len(fresh.requests), len(cached.requests)), (1, 0))
+
@@ -0,0 +1,319 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from opentargets.conn import flatten, compress_list_values, pandas_available
+from opentargets.export import Checkpoint, Flattener, ParallelGzipWriter, ShardedWriter, open_output, \
+    pyarrow_available, zstandard_available
+
+if pandas_available:
+    import pandas
+    from opentargets.export import DataFrameBuilder
+
+RECORDS = [{'id': 'a', 'target': {'id': 'ENSG1', 'symbol': 'BRAF'}, 'score': 1.0},
+           {'id': 'b', 'target': {'id': 'ENSG2'}, 'score': 0.5, 'areas': ['x', 'y']},
+           {'id': 'c', 'disease': {'id': 'EFO1'}},
+           {'id': 'd', 'target': {'id': 'ENSG3', 'symbol': 'KRAS'}, 'score': 0.1, 'areas': ['z']},
+           {'id': 'e', 'score': 0.2}]
+
+
+class FlattenerTest(unittest.TestCase):
+
+    def testSameAsFlatten(self):
+        flattener = Flattener()
+        records = RECORDS + [{'id': 'f', 'target': None},
+                             {'id': 'g', 'target': {}},
+                             {'id': 'h', 'score': {'overall': 1}},
+                             {'id': 'i', 'target': {'id': 'ENSG4', 'symbol': 'TP53', 'extra': {'a': [1]}}}]
+        for record in records * 2:
+            self.assertEqual(flattener.flatten(record), flatten(record))
+
+    def testCompiledOnce(self):
+        flattener = Flattener()
+        for record in [RECORDS[0]] * 10 + [RECORDS[4]] * 10:
+            flattener(record)
+        self.assertEqual(flattener.compilations, 1)
+
+    def testMaxPaths(self):
+        flattener = Flattener(max_paths=10)
+        for i in range(20):
+            record = {'scores': {'ENSG{}'.format(i): i}}
+            self.assertEqual(flattener(record), flatten(record))
+        self.assertIsNone(flattener._extract)
+
+    def testSeparator(self):
+        self.assertEqual(Flattener(separator='/')(RECORDS[0]), flatten(RECORDS[0], separator='/'))
+
+
+@unittest.skipUnless(pandas_available, 'pandas is not installed')
+class DataFrameBuilderTest(unittest.TestCase):
+
+    def _expected(self, compress_lists=False):
+        data = [flatten(i) for i in RECORDS]
+        if compress_lists:
+            data = [compress_list_values(i) for i in data]
+        return pandas.DataFrame.from_dict(data)
+
+    def testSameAsFromDict(self):
+        for chunk_size in (1, 2, 3, 10):
+            builder = DataFrameBuilder(chunk_size=chunk_size)
+            for record in RECORDS:
+                builder.add(record)
+            df = builder.to_dataframe()
+            expected = self._expected()
+            self.assertEqual(sorted(df.columns), sorted(expected.columns))
+            pandas.testing.assert_frame_equal(df[expected.columns], expected)
+
+    def testCompressLists(self):
+        builder = DataFrameBuilder(chunk_size=2, compress_lists=True)
+        for record in RECORDS:
+            builder.add(record)
+        df = builder.to_dataframe()
+        self.assertEqual(list(df['areas'].fillna('')), ['', 'x|y', '', 'z', ''])
+
+    def testIterDataframes(self):
+        chunks = list(DataFrameBuilder(chunk_size=2).iter_dataframes(RECORDS))
+        self.assertEqual([len(i) for i in chunks], [2, 2, 1])
+        self.assertEqual(list(chunks[-1].columns), ['id', 'score'])
+
+    def testEmpty(self):
+        self.assertEqual(DataFrameBuilder().to_dataframe().shape, (0, 0))
+        self.assertEqual(list(DataFrameBuilder().iter_dataframes([])), [])
+
+
+@unittest.skipUnless(pyarrow_available, 'pyarrow is not installed')
+class ArrowExportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testParquet(self):
+        import pyarrow.parquet
+        from opentargets.export import write_parquet
+        records = [{'id': str(i), 'score': {'overall': i / 10., 'datatypes': {'literature': 0.5}}, 'codes': ['a', 'b']}
+                   for i in range(10)]
+        path = os.path.join(self.directory, 'results.parquet')
+        self.assertEqual(write_parquet(iter(records), path, row_group_size=4), 10)
+        parquet_file = pyarrow.parquet.ParquetFile(path)
+        self.assertEqual(parquet_file.metadata.num_row_groups, 3)
+        self.assertEqual(str(parquet_file.schema_arrow.field('score').type),
+                         'struct<overall: double, datatypes: struct<literature: double>>')
+        self.assertEqual(parquet_file.read().to_pylist(), records)
+
+    def testIpc(self):
+        import pyarrow.ipc
+        from opentargets.export import write_ipc
+        path = os.path.join(self.directory, 'results.arrow')
+        records = [{'id': str(i), 'target': {'id': 'ENSG{}'.format(i)}} for i in range(5)]
+        self.assertEqual(write_ipc(records, path, batch_size=2), 5)
+        reader = pyarrow.ipc.open_file(path)
+        self.assertEqual(reader.num_record_batches, 3)
+        self.assertEqual(reader.read_all().to_pylist(), records)
+        write_ipc(records, path, stream=True)
+        self.assertEqual(pyarrow.ipc.open_stream(path).read_all().to_pylist(), records)
+
+    def testSchemaMismatch(self):
+        import pyarrow
+        from opentargets.export import write_parquet
+        path = os.path.join(self.directory, 'results.parquet')
+        records = [{'score': 1}, {'score': 0.5}]
+        with self.assertRaises(ValueError):
+            write_parquet(records, path, row_group_size=1)
+        schema = pyarrow.schema([('score', pyarrow.float64())])
+        self.assertEqual(write_parquet(records, path, row_group_size=1, schema=schema), 2)
+
+    def testNullFieldsInFirstRows(self):
+        import pyarrow.ipc
+        import pyarrow.parquet
+        from opentargets.export import write_ipc, write_parquet
+        records = [{'id': '1', 'target': {'id': 'ENSG1', 'symbol': None}, 'drug': None},
+                   {'id': '2', 'target': {'id': 'ENSG2', 'symbol': None}},
+                   {'id': '3', 'target': {'id': 'ENSG3', 'symbol': 'BRAF'}, 'drug': None},
+                   {'id': '4', 'target': {'id': 'ENSG4', 'symbol': None}, 'drug': {'molecule_name': 'X'}},
+                   {'id': '5', 'target': {'id': 'ENSG5', 'symbol': 'KRAS'}, 'drug': None, 'literature': [1]}]
+        path = os.path.join(self.directory, 'results.parquet')
+        self.assertEqual(write_parquet(records, path, row_group_size=1), 5)
+        parquet_file = pyarrow.parquet.ParquetFile(path)
+        self.assertEqual(parquet_file.metadata.num_row_groups, 5)
+        self.assertEqual(str(parquet_file.schema_arrow.field('drug').type), 'struct<molecule_name: string>')
+        rows = parquet_file.read().to_pylist()
+        self.assertEqual([i['target']['symbol'] for i in rows], [None, None, 'BRAF', None, 'KRAS'])
+        self.assertEqual(rows[1]['drug'], None)
+        self.assertEqual(rows[3]['drug'], {'molecule_name': 'X'})
+        self.assertEqual(rows[4]['literature'], [1])
+        path = os.path.join(self.directory, 'results.arrow')
+        self.assertEqual(write_ipc(records, path, batch_size=2), 5)
+        self.assertEqual(pyarrow.ipc.open_file(path).read_all().to_pylist(), rows)
+
+    def testFieldsFoundAfterWriting(self):
+        import pyarrow.ipc
+        import pyarrow.parquet
+        from opentargets.export import write_ipc, write_parquet
+        records = [{'id': '1', 'drug': None}, {'id': '2', 'drug': {'id': 'X'}, 'score': 0.5},
+                   {'id': '3', 'drug': {'id': 'Y', 'phase': 4}}]
+        path = os.path.join(self.directory, 'results.parquet')
+        self.assertEqual(write_parquet(records, path, row_group_size=1, infer_rows=1), 3)
+        parquet_file = pyarrow.parquet.ParquetFile(path)
+        self.assertEqual(parquet_file.metadata.num_row_groups, 3)
+        rows = parquet_file.read().to_pylist()
+        self.assertEqual(rows[0], {'id': '1', 'drug': None, 'score': None})
+        self.assertEqual(rows[1]['drug'], {'id': 'X', 'phase': None})
+        self.assertEqual(rows[2], {'id': '3', 'drug': {'id': 'Y', 'phase': 4}, 'score': None})
+        for stream in (False, True):
+            path = os.path.join(self.directory, 'results.arrow')
+            self.assertEqual(write_ipc(records, path, batch_size=1, infer_rows=1, stream=stream), 3)
+            reader = pyarrow.ipc.open_stream(path) if stream else pyarrow.ipc.open_file(path)
+            self.assertEqual(reader.read_all().to_pylist(), rows)
+        self.assertEqual(sorted(os.listdir(self.directory)), ['results.arrow', 'results.parquet'])
+
+    def testPartialFileRemoved(self):
+        from opentargets.export import write_ipc, write_parquet
+        records = [{'drug': 'X'}, {'drug': 1}]
+        for write, name in ((write_parquet, 'results.parquet'), (write_ipc, 'results.arrow')):
+            path = os.path.join(self.directory, name)
+            with self.assertRaises(ValueError):
+                write(records, path, 1)
+            self.assertEqual(os.listdir(self.directory), [])
+
+
+class OutputTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'output')
+        self.data = b''.join('{{"id":"{}","score":{}}}\n'.format(i, i / 7.).encode('utf-8') for i in range(20000))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, fh):
+        for i in range(0, len(self.data), 1000):
+            fh.write(self.data[i:i + 1000])
+        fh.close()
+
+    def testParallelGzip(self):
+        writer = ParallelGzipWriter(open(self.path, 'wb'), level=1, threads=3, block_size=10000)
+        self._write(writer)
+        with gzip.open(self.path, 'rb') as fh:
+            self.assertEqual(fh.read(), self.data)
+
+    def testOpenOutput(self):
+        for compress, threads in [(False, 1), (True, 1), ('gzip', 4)]:
+            self._write(open_output(self.path, compress=compress, level=1, threads=threads))
+            with (gzip.open(self.path, 'rb') if compress else open(self.path, 'rb')) as fh:
+                self.assertEqual(fh.read(), self.data)
+        with self.assertRaises(AttributeError):
+            open_output(self.path, compress='lzma')
+
+    @unittest.skipUnless(zstandard_available, 'zstandard is not installed')
+    def testZstd(self):
+        import zstandard
+        for threads in (1, 2):
+            self._write(open_output(self.path, compress='zstd', threads=threads))
+            with open(self.path, 'rb') as fh:
+                self.assertEqual(zstandard.ZstdDecompressor().stream_reader(fh).read(), self.data)
+
+    def _read(self, compress):
+        with open(self.path, 'rb') as fh:
+            if compress == 'zstd':
+                import zstandard
+                return zstandard.ZstdDecompressor().stream_reader(fh, read_across_frames=True).read()
+            data = fh.read()
+        return gzip.decompress(data) if compress else data
+
+    def testResumeAfterSync(self):
+        compressions = [False, 'gzip'] + (['zstd'] if zstandard_available else [])
+        first, second = self.data[:50000], self.data[50000:]
+        for compress in compressions:
+            fh = open_output(self.path, compress=compress, resumable=True)
+            fh.write(first)
+            position = fh.sync()
+            fh.write(b'lost after the checkpoint')
+            fh.close()
+            fh = open_output(self.path, compress=compress, position=position)
+            fh.write(second)
+            fh.close()
+            self.assertEqual(self._read(compress), self.data)
+
+    def testCheckpoint(self):
+        checkpoint = Checkpoint(self.path + '.checkpoint')
+        self.assertIsNone(checkpoint.load())
+        checkpoint.save({'current': 1000, 'next': ['a', 1]})
+        checkpoint.save({'current': 2000, 'next': ['b', 2]})
+        self.assertEqual(checkpoint.load(), {'current': 2000, 'next': ['b', 2]})
+        checkpoint.remove()
+        self.assertIsNone(checkpoint.load())
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+class ShardedWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.lines = ['{{"id":"{}"}}\n'.format(i).encode('utf-8') for i in range(1000)]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _read_shards(self, manifest):
+        lines = []
+        for shard in manifest['shards']:
+            with open(os.path.join(self.directory, shard['path']), 'rb') as fh:
+                data = fh.read()
+            self.assertEqual(hashlib.sha256(data).hexdigest(), shard['sha256'])
+            self.assertEqual(len(data), shard['bytes'])
+            if manifest['compression'] == 'gzip':
+                data = gzip.decompress(data)
+            self.assertEqual(len(data), shard['uncompressed_bytes'])
+            self.assertEqual(data.count(b'\n'), shard['records'])
+            lines.extend(data.splitlines(True))
+        return lines
+
+    def testMaxRecords(self):
+        with ShardedWriter(self.directory, max_records=300, workers=2, metadata={'total': 1000}) as writer:
+            for line in self.lines:
+                writer.write(line)
+        manifest = writer.manifest
+        self.assertTrue(manifest['complete'])
+        self.assertEqual(manifest['total'], 1000)
+        self.assertEqual([i['records'] for i in manifest['shards']], [300, 300, 300, 100])
+        self.assertEqual([i['path'] for i in manifest['shards']],
+                         ['part-0000{}.json.gz'.format(i) for i in range(4)])
+        self.assertEqual(self._read_shards(manifest), self.lines)
+
+    def testMaxBytes(self):
+        writer = ShardedWriter(self.directory, max_bytes=1000, compress=False)
+        for i in range(0, len(self.lines), 10):
+            writer.write(b''.join(self.lines[i:i + 10]), records=10)
+        writer.close()
+        manifest = writer.manifest
+        self.assertEqual(manifest['records'], 1000)
+        self.assertTrue(all(i['uncompressed_bytes'] < 1000 + 200 for i in manifest['shards']))
+        self.assertEqual(self._read_shards(manifest), self.lines)
+
+    def testIncomplete(self):
+        with self.assertRaises(ValueError):
+            with ShardedWriter(self.directory, max_records=300) as writer:
+                for line in self.lines[:500]:
+                    writer.write(line)
+                raise ValueError()
+        with open(os.path.join(self.directory, 'manifest.json')) as fh:
+            manifest = json.load(fh)
+        self.assertFalse(manifest['complete'])
+        self.assertEqual(manifest['records'], 300)
+        self.assertEqual(sorted(os.listdir(self.directory)), ['manifest.json', 'part-00000.json.gz'])
+
+    def testShardSizeRequired(self):
+        with self.assertRaises(AttributeError):
+            ShardedWriter(self.directory, max_records=None, max_bytes=None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import json
+import random
+import unittest
+
+from opentargets.conn import BufferedResponse, Response
+from opentargets.json_backend import get_json_backend, orjson_available, StdlibJSONBackend
+
+ASSOCIATIONS = [
+    {'id': 'ENSG00000157764-EFO_0000756',
+     'is_direct': True,
+     'target': {'id': 'ENSG00000157764',
+                'gene_info': {'symbol': 'BRAF', 'name': 'B-Raf proto-oncogene, serine/threonine kinase'}},
+     'disease': {'id': 'EFO_0000756',
+                 'efo_info': {'label': 'melanoma',
+                              'therapeutic_area': {'codes': ['EFO_0000616', 'OTAR_0000018'],
+                                                   'labels': ['neoplasm', u'genetic, familial or congenital disease']},
+                              'path': [['EFO_0000311', 'EFO_0000756']]}},
+     'association_score': {'overall': 1.0,
+                           'datatypes': {'genetic_association': 0.9061212301254272,
+                                         'somatic_mutation': 0.9999999999999999,
+                                         'known_drug': 1,
+                                         'literature': 0.0003499999999999999,
+                                         'animal_model': 0}},
+     'evidence_count': {'total': 3145, 'datatypes': {'literature': 2811}},
+     'label': u'Sjögren syndrome – “quoted” ✓',
+     'missing': None},
+]
+
+
+def scored_associations(count=2000, seed=0):
+    """
+    Associations with scores spread as in the REST API, many of them small enough to be written with an exponent
+    """
+    generator = random.Random(seed)
+    datatypes = ['genetic_association', 'somatic_mutation', 'known_drug', 'affected_pathway', 'rna_expression',
+                 'literature', 'animal_model']
+    associations = []
+    for i in range(count):
+        scores = dict((k, generator.random() ** generator.choice([1, 4, 12])) for k in datatypes
+                      if generator.random() < 0.5)
+        associations.append({'id': 'ENSG{:011d}-EFO_{:07d}'.format(i, i % 97),
+                             'association_score': {'overall': max(list(scores.values()) + [0.]),
+                                                   'datatypes': scores},
+                             'evidence_count': {'total': generator.randint(1, 5000)},
+                             'target': {'gene_info': {'symbol': generator.choice(['BRAF', u'Sjögren', None])}}})
+    return associations
+
+
+class JSONBackendTest(unittest.TestCase):
+
+    def testGetBackend(self):
+        self.assertIsInstance(get_json_backend('stdlib'), StdlibJSONBackend)
+        backend = get_json_backend('stdlib')
+        self.assertIs(get_json_backend(backend), backend)
+        with self.assertRaises(AttributeError):
+            get_json_backend('simplejson')
+
+    def testStdlibRoundTrip(self):
+        backend = get_json_backend('stdlib')
+        for record in ASSOCIATIONS:
+            self.assertEqual(backend.loads(backend.dumpb(record)), record)
+            self.assertEqual(backend.loads(backend.dumps(record)), record)
+
+    def testDefaultOutput(self):
+        for record in ASSOCIATIONS + scored_associations(100):
+            self.assertEqual(get_json_backend('stdlib').dumps(record), json.dumps(record))
+            self.assertEqual(get_json_backend('auto').dumps(record), json.dumps(record))
+            self.assertEqual(get_json_backend('auto').dumpb(record), json.dumps(record).encode('utf-8'))
+        compact = get_json_backend('stdlib', compact=True)
+        self.assertEqual(compact.dumps({'a': [1, u'ö']}), u'{"a":[1,"ö"]}')
+
+    @unittest.skipUnless(orjson_available, 'orjson is not installed')
+    def testByteIdenticalOutput(self):
+        records = ASSOCIATIONS + scored_associations()
+        for compact in (False, True):
+            stdlib = get_json_backend('stdlib', compact=compact)
+            fast = get_json_backend('orjson', compact=compact)
+            for record in records:
+                self.assertEqual(stdlib.dumpb(record), fast.dumpb(record))
+                self.assertEqual(stdlib.dumps(record), fast.dumps(record))
+
+    @unittest.skipUnless(orjson_available, 'orjson is not installed')
+    def testSameDecodedResponse(self):
+        body = get_json_backend('stdlib').dumpb({'data': ASSOCIATIONS, 'total': 1, 'from': 0, 'next': [1.0, 'x']})
+        stdlib_response = Response(BufferedResponse(body), json_backend=get_json_backend('stdlib'))
+        fast_response = Response(BufferedResponse(body), json_backend=get_json_backend('orjson'))
+        self.assertEqual(stdlib_response.data, fast_response.data)
+        self.assertEqual(stdlib_response.info, fast_response.info)
+        self.assertEqual(fast_response.info.next_, [1.0, 'x'])
+
+    @unittest.skipUnless(orjson_available, 'orjson is not installed')
+    def testExponentFloatsDecodeToSameValue(self):
+        stdlib = get_json_backend('stdlib')
+        fast = get_json_backend('orjson')
+        values = [1e-07, 1e+16, 2.5e-300]
+        self.assertEqual(stdlib.loads(fast.dumpb(values)), values)
+        self.assertEqual(fast.loads(stdlib.dumpb(values)), values)
+
+    @unittest.skipUnless(orjson_available, 'orjson is not installed')
+    def testFloatsWrittenAsStdlib(self):
+        stdlib = get_json_backend('stdlib', compact=True)
+        fast = get_json_backend('orjson', compact=True)
+        values = [3.5e-05, 9.99e-05, 0.0001, 1e+16, 1.2345678901234568e+17, 5e-324, -2.5e-300, 0.5, None]
+        self.assertEqual(fast.dumpb(values), b'[3.5e-05,9.99e-05,0.0001,1e+16,1.2345678901234568e+17,5e-324,'
+                                             b'-2.5e-300,0.5,null]')
+        values = [float('nan'), float('inf'), -float('inf'), 0.5]
+        self.assertEqual(fast.dumpb(values), b'[NaN,Infinity,-Infinity,0.5]')
+        self.assertEqual(fast.dumpb(values), stdlib.dumpb(values))
+        self.assertEqual(fast.dumpb({1: 2 ** 70}), stdlib.dumpb({1: 2 ** 70}))
+        self.assertEqual(fast.dumpb([1, 'x']), b'[1,"x"]')
+
+    def testNonJSONResponse(self):
+        for backend in ('stdlib', 'auto'):
+            response = Response(BufferedResponse(b'pong'), json_backend=get_json_backend(backend))
+            self.assertEqual(response.data, 'pong')
@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from opentargets.matrix import numpy_available
+
+if numpy_available:
+    import numpy
+    from opentargets.matrix import ScoreMatrix, ScoreMatrixBuilder, build_score_matrix
+
+
+def association(target, disease, overall, **datatypes):
+    return {'target': {'id': target}, 'disease': {'id': disease},
+            'association_score': {'overall': overall, 'datatypes': datatypes}}
+
+
+ASSOCIATIONS = [association('ENSG2', 'EFO_1', 0.5, literature=0.2),
+                association('ENSG1', 'EFO_2', 0.25, known_drug=0.75),
+                association('ENSG1', 'EFO_1', 1.0, literature=0.5, known_drug=1.0),
+                association('ENSG3', 'EFO_3', 0.125),
+                association('ENSG2', 'EFO_1', 0.625, literature=0.25)]
+
+
+@unittest.skipUnless(numpy_available, 'numpy is not installed')
+class ScoreMatrixTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.matrix = build_score_matrix(ASSOCIATIONS, self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testMetadata(self):
+        matrix = ScoreMatrix(self.directory)
+        self.assertEqual(matrix.shape, (3, 3))
+        self.assertEqual(len(matrix), 4)
+        self.assertEqual(matrix.targets, ['ENSG1', 'ENSG2', 'ENSG3'])
+        self.assertEqual(matrix.diseases, ['EFO_1', 'EFO_2', 'EFO_3'])
+        self.assertEqual(matrix.layers, ['overall', 'literature', 'known_drug'])
+        self.assertIsInstance(matrix.layer(), numpy.memmap)
+
+    def testScore(self):
+        self.assertEqual(self.matrix.score('ENSG1', 'EFO_1'), 1.0)
+        self.assertEqual(self.matrix.score('ENSG2', 'EFO_1'), 0.625)
+        self.assertEqual(self.matrix.score('ENSG2', 'EFO_1', layer='literature'), 0.25)
+        self.assertEqual(self.matrix.score('ENSG1', 'EFO_2', layer='literature'), 0.)
+        self.assertEqual(self.matrix.score('ENSG3', 'EFO_1'), 0.)
+        self.assertEqual(self.matrix.score('ENSG4', 'EFO_1'), 0.)
+        self.assertRaises(AttributeError, self.matrix.score, 'ENSG1', 'EFO_1', layer='animal_model')
+
+    def testScores(self):
+        scores = self.matrix.scores(['ENSG1', 'ENSG3', 'ENSG4', 'ENSG1'], ['EFO_2', 'EFO_3', 'EFO_3', 'EFO_3'],
+                                    layer='overall')
+        self.assertEqual(scores.tolist(), [0.25, 0.125, 0., 0.])
+        self.assertRaises(ValueError, self.matrix.scores, ['ENSG1'], [])
+
+    def testRowAndColumn(self):
+        columns, scores = self.matrix.row('ENSG1', layer='known_drug')
+        self.assertEqual([self.matrix.diseases[i] for i in columns], ['EFO_1', 'EFO_2'])
+        self.assertEqual(scores.tolist(), [1.0, 0.75])
+        rows, scores = self.matrix.column('EFO_1')
+        self.assertEqual([self.matrix.targets[i] for i in rows], ['ENSG1', 'ENSG2'])
+        self.assertEqual(scores.tolist(), [1.0, 0.625])
+        self.assertEqual(len(self.matrix.row('ENSG4')[0]), 0)
+        self.assertEqual(len(self.matrix.column('EFO_4')[1]), 0)
+
+    def testSelectedDatatypes(self):
+        with ScoreMatrixBuilder(self.directory, datatypes=['known_drug']) as builder:
+            for i in ASSOCIATIONS:
+                builder.add(i)
+        matrix = ScoreMatrix(self.directory)
+        self.assertEqual(matrix.layers, ['overall', 'known_drug'])
+        self.assertEqual(matrix.score('ENSG1', 'EFO_2', layer='known_drug'), 0.75)
+
+    def testRebuildOverOpenMatrix(self):
+        old = ScoreMatrix(self.directory)
+        self.assertEqual(old.score('ENSG1', 'EFO_1', layer='literature'), 0.5)
+        new = build_score_matrix([association('ENSG1', 'EFO_1', 0.75, animal_model=0.5),
+                                  association('ENSG9', 'EFO_9', 0.5)], self.directory)
+        self.assertEqual(old.score('ENSG1', 'EFO_1'), 1.0)
+        self.assertEqual(old.score('ENSG1', 'EFO_1', layer='literature'), 0.5)
+        self.assertEqual(old.row('ENSG2')[1].tolist(), [0.625])
+        self.assertEqual(old.column('EFO_1')[1].tolist(), [1.0, 0.625])
+        for matrix in (new, ScoreMatrix(self.directory)):
+            self.assertEqual(matrix.layers, ['overall', 'animal_model'])
+            self.assertEqual(matrix.score('ENSG1', 'EFO_1'), 0.75)
+            self.assertEqual(matrix.score('ENSG2', 'EFO_1'), 0.)
+        files = sorted(os.listdir(self.directory))
+        self.assertEqual(len(files), 7)
+        self.assertIn('metadata.json', files)
+        self.assertFalse(any('literature' in i or i.startswith('.') for i in files))
+
+    def testRebuildKeepsOtherFiles(self):
+        other = os.path.join(self.directory, 'other.npy')
+        numpy.save(other, numpy.arange(3))
+        build_score_matrix(ASSOCIATIONS, self.directory)
+        self.assertEqual(numpy.load(other).tolist(), [0, 1, 2])
+        self.assertEqual(len(os.listdir(self.directory)), 9)
+
+    def testEmpty(self):
+        matrix = build_score_matrix([], self.directory)
+        self.assertEqual(matrix.shape, (0, 0))
+        self.assertEqual(matrix.scores(['ENSG1'], ['EFO_1']).tolist(), [0.])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from opentargets.offline import OfflineClient, index_fields, project
+
+
+def association(i):
+    return {'id': 'ENSG{:d}-EFO_{:d}'.format(i % 3, i),
+            'target': {'id': 'ENSG{:d}'.format(i % 3)},
+            'disease': {'id': 'EFO_{:d}'.format(i)},
+            'is_direct': bool(i % 2),
+            'association_score': {'overall': round(1.0 / (i + 1), 6),
+                                  'datatypes': {'literature': 0.1, 'known_drug': (i % 4) / 10.0},
+                                  'datasources': {'europepmc': 0.1, 'chembl': (i % 4) / 10.0}}}
+
+
+ASSOCIATIONS = [association(i) for i in range(40)]
+EVIDENCE = [{'id': 'ev{:d}'.format(i), 'type': 'literature', 'sourceID': 'europepmc',
+             'target': {'id': 'ENSG1'}, 'disease': {'id': 'EFO_{:d}'.format(i)},
+             'scores': {'association_score': i / 10.0}} for i in range(5)]
+
+
+class OfflineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.dump = os.path.join(self.directory, 'associations.json.gz')
+        with gzip.open(self.dump, 'wb') as fh:
+            for i in ASSOCIATIONS:
+                fh.write(json.dumps(i).encode('utf-8') + b'\n')
+        evidence_dump = os.path.join(self.directory, 'evidence.json')
+        with open(evidence_dump, 'wb') as fh:
+            for i in EVIDENCE:
+                fh.write(json.dumps(i).encode('utf-8') + b'\n')
+        self.client = OfflineClient(os.path.join(self.directory, 'store.db'))
+        self.assertEqual(self.client.ingest([self.dump, evidence_dump], batch_size=7), 45)
+
+    def tearDown(self):
+        self.client.close()
+        shutil.rmtree(self.directory)
+
+    def _expected(self, match):
+        return [i['id'] for i in sorted(ASSOCIATIONS, key=lambda i: -i['association_score']['overall'])
+                if match(i)]
+
+    def testIndexFields(self):
+        self.assertEqual(index_fields(ASSOCIATIONS[1])[:6], ('association', 'ENSG1-EFO_1', 'ENSG1', 'EFO_1', 0.5, 1))
+        self.assertEqual(sorted(index_fields(ASSOCIATIONS[1])[6]),
+                         [('datasource', 'chembl'), ('datasource', 'europepmc'),
+                          ('datatype', 'known_drug'), ('datatype', 'literature')])
+        self.assertEqual(index_fields(EVIDENCE[2]),
+                         ('evidence', 'ev2', 'ENSG1', 'EFO_2', 0.2, None,
+                          [('datatype', 'literature'), ('datasource', 'europepmc')]))
+
+    def testProject(self):
+        self.assertEqual(project(ASSOCIATIONS[0], ['target.id', 'association_score.overall', 'missing.field']),
+                         {'target': {'id': 'ENSG0'}, 'association_score': {'overall': 1.0}})
+        self.assertEqual(project(ASSOCIATIONS[0], ['disease.*']), {'disease': {'id': 'EFO_0'}})
+
+    def testIngestReplaces(self):
+        self.client.ingest(self.dump)
+        self.assertEqual(len(self.client.conn.store), 45)
+
+    def testFilterAssociations(self):
+        result = self.client.filter_associations(target='ENSG1', size=4)
+        self.assertEqual(len(result), len(self._expected(lambda i: i['target']['id'] == 'ENSG1')))
+        self.assertEqual([i['id'] for i in result], self._expected(lambda i: i['target']['id'] == 'ENSG1'))
+        result = self.client.filter_associations(datatype='known_drug', direct=True, scorevalue_min=0.05)
+        self.assertEqual([i['id'] for i in result],
+                         self._expected(lambda i: i['is_direct'] and i['association_score']['overall'] >= 0.05 and
+                                        i['association_score']['datatypes']['known_drug'] > 0))
+        result = self.client.filter_associations(disease=['EFO_3', 'EFO_5'], fields=['id'])
+        self.assertEqual(list(result), [{'id': 'ENSG0-EFO_3'}, {'id': 'ENSG2-EFO_5'}])
+
+    def testFilterAssociationsPartitioned(self):
+        result = self.client.filter_associations(partition_by='target', partition_values=['ENSG0', 'ENSG2'])
+        self.assertEqual(sorted(i['id'] for i in result),
+                         sorted(self._expected(lambda i: i['target']['id'] in ('ENSG0', 'ENSG2'))))
+
+    def testPartitionedUnique(self):
+        partitions = self.client.partition(self.client._filter_associations_endpoint, 'datatype',
+                                           ['literature', 'known_drug'])
+        expected = self._expected(lambda i: True)
+        result = self.client.fetch_partitions(partitions, unique=True)
+        self.assertEqual(len(result), len(expected))
+        self.assertEqual(sorted(i['id'] for i in result), sorted(expected))
+        result = self.client.fetch_partitions(partitions, unique=True)
+        self.assertEqual(result.total, 70)
+        self.assertEqual(len(list(result)), len(expected))
+        self.assertEqual(len(result), len(expected))
+        self.assertEqual(len(self.client.fetch_partitions(partitions)), 70)
+
+    def testPartitionedParallel(self):
+        partitions = self.client.partition(self.client._filter_associations_endpoint, 'target',
+                                           ['ENSG0', 'ENSG1', 'ENSG2'], size=4)
+        result = self.client.fetch_partitions(partitions).parallel(2)
+        self.assertEqual(result.workers, 2)
+        self.assertEqual(sorted(i['id'] for i in result), sorted(self._expected(lambda i: True)))
+        self.assertRaises(AttributeError, result.parallel, 0)
+
+    def testUniqueKeepsResultsWithoutId(self):
+        from opentargets.partition import PartitionedResult
+        seen = set()
+        data = [{'id': 'a'}, {'score': 1}, {'id': 'a'}, {'score': 2}]
+        self.assertEqual(PartitionedResult._unique(data, seen), [{'id': 'a'}, {'score': 1}, {'score': 2}])
+        self.assertEqual(PartitionedResult._unique([{'id': 'a'}, {'id': 'b'}], seen), [{'id': 'b'}])
+
+    def testFilterAssociationsRaw(self):
+        result = self.client.filter_associations(target='ENSG2')
+        result.raw()
+        self.assertEqual([json.loads(i.decode('utf-8'))['id'] for i in result],
+                         self._expected(lambda i: i['target']['id'] == 'ENSG2'))
+
+    def testRawExportKeepsMode(self):
+        result = self.client.filter_associations(target='ENSG2')
+        expected = self._expected(lambda i: i['target']['id'] == 'ENSG2')
+        path = os.path.join(self.directory, 'export.json')
+        result.to_file(path, compress=False, raw=True)
+        with open(path, 'rb') as fh:
+            self.assertEqual([json.loads(i.decode('utf-8'))['id'] for i in fh], expected)
+        result.to_shards(os.path.join(self.directory, 'shards'), compress=False, raw=True)
+        result._seek(0)
+        self.assertEqual([i['id'] for i in result], expected)
+        result = self.client.filter_associations(target='ENSG2').stream()
+        result.to_file(path, compress=False, raw=True)
+        self.assertTrue(result._stream)
+
+    def testFilterEvidence(self):
+        result = self.client.filter_evidence(datasource='europepmc', scorevalue_max=0.3)
+        self.assertEqual([i['id'] for i in result], ['ev3', 'ev2', 'ev1', 'ev0'])
+        self.assertEqual(len(self.client.filter_evidence(target='ENSG2')), 0)
+
+    def testUnsupportedParameter(self):
+        result = self.client.filter_associations()
+        self.assertRaises(AttributeError, result.filter, therapeutic_area='EFO_1')
+        self.assertRaises(AttributeError, self.client.conn.get, '/platform/public/search')
+
+    def testCountedOncePerQuery(self):
+        store = self.client.conn.store
+        statements = []
+        store._db.set_trace_callback(statements.append)
+        result = self.client.filter_associations(target='ENSG1', size=2)
+        self.assertEqual(len(list(result)), 13)
+        self.assertEqual(len([i for i in statements if 'COUNT(*)' in i]), 1)
+        other = OfflineClient(store.path)
+        other.ingest(self.dump)
+        other.close()
+        self.assertEqual(store.query('association', {'target': 'ENSG1'})[1], 13)
+        self.assertEqual(len([i for i in statements if 'COUNT(*)' in i]), 2)
+        store._db.set_trace_callback(None)
+
+    def testStoreReopened(self):
+        self.client.close()
+        self.client = OfflineClient(os.path.join(self.directory, 'store.db'))
+        self.assertEqual(len(self.client.filter_associations()), 40)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import json
+import unittest
+
+import opentargets.raw
+from opentargets.conn import BufferedResponse, RawResponse, Response
+from opentargets.raw import split_records
+
+DOCUMENTS = [
+    {'data': [], 'total': 0},
+    {'total': 3,
+     'data': [1, 'a,]"}', {'data': [1, 2]}, [[]], None, {'text': u'Sjögren – “quoted” \\ \\"'}],
+     'next': ['x', 1]},
+    {'x': 'data', 'y': {'data': [9]}, 'data': [{'q': '\\'}, {'q': '\\\\"'}, '\\\\', {'"data"': '[,]'}]},
+]
+
+
+class SplitRecordsTest(unittest.TestCase):
+
+    def _check(self):
+        for document in DOCUMENTS:
+            for kwargs in ({}, {'indent': 2}, {'separators': (',', ':'), 'ensure_ascii': False}):
+                body = json.dumps(document, **kwargs).encode('utf-8')
+                records, metadata = split_records(body)
+                self.assertEqual([json.loads(i.decode('utf-8')) for i in records], document['data'])
+                self.assertFalse(any(b'\n' in i for i in records))
+                metadata = json.loads(metadata.decode('utf-8'))
+                self.assertEqual(metadata.pop('data'), [])
+                self.assertEqual(metadata, dict((k, v) for k, v in document.items() if k != 'data'))
+        self.assertIsNone(split_records(b'{"data": {"not": "an array"}}'))
+        self.assertIsNone(split_records(b'{"other": ["data"]}'))
+        self.assertIsNone(split_records(b'"data"'))
+
+    def testSplitRecords(self):
+        self._check()
+
+    def testSplitRecordsWithoutNumpy(self):
+        numpy_available = opentargets.raw.numpy_available
+        opentargets.raw.numpy_available = False
+        try:
+            self._check()
+        finally:
+            opentargets.raw.numpy_available = numpy_available
+
+
+class RawResponseTest(unittest.TestCase):
+
+    def testRawResponse(self):
+        body = json.dumps(DOCUMENTS[1]).encode('utf-8')
+        response = RawResponse(BufferedResponse(body))
+        decoded = Response(BufferedResponse(body))
+        self.assertEqual([json.loads(i.decode('utf-8')) for i in response.data], decoded.data)
+        self.assertEqual(response.info, decoded.info)
+        self.assertEqual(response.info.next_, ['x', 1])
+
+    def testRawResponseWithoutData(self):
+        response = RawResponse(BufferedResponse(b'{"id": "ENSG00000157764"}'))
+        self.assertEqual(response.data, [b'{"id": "ENSG00000157764"}'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from opentargets.scoring import AssociationScoreEngine
+from opentargets.statistics import HarmonicSumScorer
+
+
+def evidence(target, disease, datatype, datasource, score):
+    return {'target': {'id': target}, 'disease': {'id': disease}, 'type': datatype, 'sourceID': datasource,
+            'scores': {'association_score': score}}
+
+
+def random_evidence(n, seed=0):
+    rnd = random.Random(seed)
+    sources = [('literature', 'europepmc'), ('known_drug', 'chembl'), ('genetic_association', 'gwas_catalog'),
+               ('genetic_association', 'uniprot')]
+    return [evidence('ENSG{}'.format(rnd.randint(0, 9)), 'EFO_{}'.format(rnd.randint(0, 9)),
+                     *rnd.choice(sources), score=rnd.random()) for _ in range(n)]
+
+
+class AssociationScoreEngineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testScores(self):
+        engine = AssociationScoreEngine(weights={'chembl': 0.5, 'literature': 0.2, 'uniprot': 0}, cap=None)
+        engine.add_all([evidence('ENSG1', 'EFO_1', 'known_drug', 'chembl', 1.),
+                        evidence('ENSG1', 'EFO_1', 'known_drug', 'chembl', 1.),
+                        evidence('ENSG1', 'EFO_1', 'literature', 'europepmc', 1.),
+                        evidence('ENSG1', 'EFO_1', 'genetic_association', 'uniprot', 1.),
+                        evidence('ENSG0', 'EFO_2', 'genetic_association', 'gwas_catalog', 0.5),
+                        {'target': {'id': 'ENSG1'}, 'type': 'literature'}])
+        self.assertEqual(engine.evidence_count, 4)
+        self.assertEqual(engine.skipped, 1)
+        associations = list(engine)
+        self.assertEqual([i['id'] for i in associations], ['ENSG0-EFO_2', 'ENSG1-EFO_1'])
+        self.assertEqual(associations[0]['association_score'], {'overall': 0.5,
+                                                                'datatypes': {'genetic_association': 0.5}})
+        self.assertEqual(associations[1]['association_score']['datatypes'], {'known_drug': 0.75, 'literature': 0.2})
+        self.assertAlmostEqual(associations[1]['association_score']['overall'], 0.75 + 0.2 / 2)
+
+    def testCap(self):
+        engine = AssociationScoreEngine(buffer=2)
+        engine.add_all([evidence('ENSG1', 'EFO_1', 'known_drug', 'chembl', 1.)] * 3)
+        self.assertEqual(list(engine)[0]['association_score'], {'overall': 1., 'datatypes': {'known_drug': 1.}})
+
+    def testSpill(self):
+        records = random_evidence(2000)
+        expected = list(AssociationScoreEngine(buffer=5).add_all(records))
+        with AssociationScoreEngine(buffer=5, max_scorers=7, spill_directory=self.directory) as engine:
+            engine.add_all(records)
+            self.assertGreater(len(engine._runs), 10)
+            associations = list(engine)
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertEqual([i['id'] for i in associations], [i['id'] for i in expected])
+        for association, expected_association in zip(associations, expected):
+            self.assertEqual(association['association_score'], expected_association['association_score'])
+
+    def testSameAsScorer(self):
+        records = random_evidence(500, seed=1)
+        scorers = {}
+        for i in records:
+            key = (i['target']['id'], i['disease']['id'], i['type'])
+            scorers.setdefault(key, HarmonicSumScorer(buffer=10)).add(i['scores']['association_score'])
+        for association in AssociationScoreEngine(buffer=10, cap=None, max_scorers=20).add_all(records):
+            for datatype, score in association['association_score']['datatypes'].items():
+                key = (association['target']['id'], association['disease']['id'], datatype)
+                self.assertAlmostEqual(score, scorers[key].score())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import functools
+import pickle
+import random
+import unittest
+
+from opentargets.statistics import HarmonicSumScorer, harmonic_sums, numpy_available
+
+if numpy_available:
+    import numpy
+
+
+class HarmonicSumScorerTest(unittest.TestCase):
+
+    def testHarmonicSum(self):
+        data = [0.5, 1., 0.25]
+        self.assertAlmostEqual(HarmonicSumScorer.harmonic_sum(data), 1. + 0.5 / 2 + 0.25 / 3)
+        self.assertEqual(data, [1., 0.5, 0.25])
+        self.assertAlmostEqual(HarmonicSumScorer.harmonic_sum([1., 1.], scale_factor=2), 1.25)
+        self.assertEqual(HarmonicSumScorer.harmonic_sum([1., 1.], cap=1.), 1.)
+        self.assertEqual(HarmonicSumScorer.harmonic_sum([]), 0)
+
+    def testKeepsTopScores(self):
+        rnd = random.Random(0)
+        for buffer in (1, 10, 100):
+            scorer = HarmonicSumScorer(buffer=buffer)
+            scores = [rnd.random() for _ in range(1000)]
+            for i in scores:
+                scorer.add(i)
+            top = sorted(scores, reverse=True)[:buffer]
+            self.assertEqual(sorted(scorer.data, reverse=True), top)
+            self.assertEqual(scorer.min, top[-1])
+            self.assertAlmostEqual(scorer.score(), HarmonicSumScorer.harmonic_sum(list(top)))
+            self.assertAlmostEqual(scorer.score(scale_factor=2, cap=0.5), min(0.5, sum(s / (i + 1) ** 2
+                                                                                      for i, s in enumerate(top))))
+
+    def testScoreAfterAdd(self):
+        scorer = HarmonicSumScorer(buffer=2)
+        self.assertEqual(scorer.min, 0.)
+        self.assertEqual(scorer.score(), 0)
+        scorer.add('0.5')
+        self.assertEqual(scorer.score(), 0.5)
+        scorer.add(1)
+        scorer.add(0.1)
+        self.assertEqual(scorer.score(), 1.25)
+        scorer.add(0.75)
+        self.assertEqual(scorer.score(), 1.375)
+        self.assertEqual(scorer.min, 0.75)
+
+    def testRefresh(self):
+        scorer = HarmonicSumScorer(buffer=3)
+        for i in (0.1, 0.2, 0.3):
+            scorer.add(i)
+        self.assertAlmostEqual(scorer.score(), 0.3 + 0.1 + 0.1 / 3)
+        scorer.data[0] = 0.9
+        scorer.refresh()
+        self.assertEqual(scorer.min, 0.2)
+        self.assertAlmostEqual(scorer.score(), 0.9 + 0.15 + 0.2 / 3)
+
+    def testMerge(self):
+        rnd = random.Random(1)
+        scores = [rnd.random() for _ in range(1000)]
+        expected = HarmonicSumScorer(buffer=50)
+        partials = [HarmonicSumScorer(buffer=50) for _ in range(7)]
+        for i, score in enumerate(scores):
+            expected.add(score)
+            partials[i % len(partials)].add(score)
+        merged = functools.reduce(lambda a, b: a.merge(b), partials[1:], partials[0])
+        self.assertIs(merged, partials[0])
+        self.assertEqual(sorted(merged.data), sorted(expected.data))
+        self.assertEqual(merged.min, expected.min)
+        self.assertAlmostEqual(merged.score(), expected.score())
+        merged.add(2.)
+        self.assertEqual(max(merged.data), 2.)
+        self.assertEqual(len(merged.data), 50)
+        self.assertEqual(HarmonicSumScorer(buffer=3).merge(HarmonicSumScorer()).data, [])
+        self.assertRaises(ValueError, HarmonicSumScorer().merge, HarmonicSumScorer(buffer=10))
+
+    def testSerialise(self):
+        scorer = HarmonicSumScorer(buffer=5)
+        for i in (0.3, 0.9, 0.1, 0.5, 0.7, 0.2, 0.8):
+            scorer.add(i)
+        data = scorer.to_bytes()
+        self.assertEqual(len(data), 12 + 5 * 8)
+        restored = HarmonicSumScorer.from_bytes(data)
+        self.assertEqual(restored.buffer, 5)
+        self.assertEqual(sorted(restored.data), sorted(scorer.data))
+        self.assertEqual(restored.score(), scorer.score())
+        restored.add(0.6)
+        self.assertEqual(sorted(restored.data), [0.5, 0.6, 0.7, 0.8, 0.9])
+        self.assertEqual(HarmonicSumScorer.from_bytes(HarmonicSumScorer(buffer=2).to_bytes()).data, [])
+        self.assertEqual(pickle.loads(pickle.dumps(scorer)).score(), scorer.score())
+        self.assertRaises(ValueError, HarmonicSumScorer.from_bytes, data[:-1])
+        self.assertRaises(ValueError, HarmonicSumScorer.from_bytes, b'xxxx' + data[4:])
+
+
+@unittest.skipUnless(numpy_available, 'numpy is not installed')
+class HarmonicSumsTest(unittest.TestCase):
+
+    def testSameAsHarmonicSum(self):
+        rnd = random.Random(0)
+        rows = [[rnd.choice([0., 1., rnd.random()]) for _ in range(7)] for _ in range(200)]
+        weights = [rnd.random() for _ in range(7)]
+        for kwargs in ({}, {'scale_factor': 2}, {'cap': 1.2}, {'scale_factor': 0.5, 'cap': 2}):
+            sums = harmonic_sums(numpy.array(rows), **kwargs)
+            for row, result in zip(rows, sums):
+                self.assertAlmostEqual(result, HarmonicSumScorer.harmonic_sum(list(row), **kwargs))
+            sums = harmonic_sums(rows, weights=weights, **kwargs)
+            for row, result in zip(rows, sums):
+                self.assertAlmostEqual(result, HarmonicSumScorer.harmonic_sum([s * w for s, w in zip(row, weights)],
+                                                                              **kwargs))
+
+    def testInputUnchanged(self):
+        scores = numpy.array([[0.5, numpy.nan, 1.]])
+        self.assertEqual(harmonic_sums(scores).tolist(), [1.25])
+        self.assertEqual(scores[0, 0], 0.5)
+        self.assertTrue(numpy.isnan(scores[0, 1]))
+
+    def testInvalid(self):
+        self.assertRaises(ValueError, harmonic_sums, [1., 2.])
+        self.assertRaises(ValueError, harmonic_sums, [[1., 2.]], weights=[1.])
+        self.assertEqual(harmonic_sums(numpy.zeros((0, 3))).shape, (0,))
+
+
+if __name__ == '__main__':
+    unittest.main()